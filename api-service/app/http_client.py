@@ -0,0 +1,90 @@
+# api-service/http_client.py
+
+import httpx
+import os
+from collections import Counter
+from loguru import logger
+
+# Connection pool shared by every downstream call (text-parser, OCR, rag-service)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+# HTTP/2 is negotiated over TLS (ALPN), plain http:// downstreams keep using HTTP/1.1 keep-alive
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+
+
+def route_timeout(read: float) -> httpx.Timeout:
+    # Connect and pool waits stay short, read/write follow what the downstream route needs
+    return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_CONNECT_TIMEOUT)
+
+
+'''
+SharedHTTPClient: one pooled httpx.AsyncClient for all downstream calls of the process
+start: creates the client (at startup), close: closes it and its connections (at shutdown)
+client: the httpx.AsyncClient, callers pass their route's timeout (route_timeout)
+stats: pool occupancy plus requests/errors per downstream host, for /metrics
+'''
+class SharedHTTPClient:
+    def __init__(self):
+        self.client = None
+        self.transport = None
+        self.http2 = False
+        self.requests = Counter()
+        self.errors = Counter()
+
+    def start(self):
+        self.http2 = HTTP2_ENABLED
+        if self.http2:
+            try:
+                import h2  # noqa: F401  installed by httpx[http2]
+            except ImportError:
+                logger.warning("HTTP2_ENABLED but the h2 package is missing, using HTTP/1.1")
+                self.http2 = False
+
+        self.transport = httpx.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.client = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=route_timeout(30),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+        logger.success(f"HTTP client ready (max {HTTP_MAX_CONNECTIONS} connections, http2={self.http2})")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _on_request(self, request: httpx.Request):
+        self.requests[request.url.host] += 1
+
+    async def _on_response(self, response: httpx.Response):
+        if response.status_code >= 500:
+            self.errors[response.request.url.host] += 1
+
+    def stats(self) -> dict:
+        stats = {
+            "http2": self.http2,
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "requests": dict(self.requests),
+            "server_errors": dict(self.errors),
+        }
+        # httpcore pool behind the transport (not part of httpx's public API, hence the guard)
+        pool = getattr(self.transport, "_pool", None)
+        if pool is not None:
+            connections = pool.connections
+            stats.update(
+                connections=len(connections),
+                idle=sum(connection.is_idle() for connection in connections),
+                http2_connections=sum("HTTP/2" in connection.info() for connection in connections),
+                waiting_requests=sum(request.is_queued() for request in getattr(pool, "_requests", [])),
+            )
+        return stats
@@ -0,0 +1,212 @@
+# api-service/jobs.py
+
+import aio_pika
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from loguru import logger
+
+# Topic exchange for ingestion progress, routing key job.<job_id>.<stage>; subscribe to job.<job_id>.# for one job
+INGESTION_PROGRESS_EXCHANGE = "ingestion_progress"
+# Jobs are forgotten this long after their last event, and beyond JOB_MAX_JOBS (oldest first)
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", 24 * 3600))
+JOB_MAX_JOBS = int(os.getenv("JOB_MAX_JOBS", 10000))
+
+# Per-part stages published by the ingestion service, a file is "stored" once all of its parts are
+PART_STAGES = ("chunked", "embedded", "stored")
+# Parts of a file dispatched whole have no leg, a mixed PDF's are split between text-parser and OCR
+DEFAULT_LEG = "document"
+MIXED_LEGS = ("text", "ocr")
+
+
+def _new_file(name: str = None) -> dict:
+    return {"filename": name, "doc_id": None, "legs": None, "total_parts": {}, "failed_chunks": {}, "error": None,
+            "missing": None, "parsed": False, "skipped": None, **{stage: set() for stage in PART_STAGES}}
+
+
+def _is_stored(state: dict) -> bool:
+    # Every leg the file was dispatched in has all of its parts stored: parts are (leg, part)
+    legs = state["legs"] or list(state["total_parts"])
+    return bool(legs) and all(
+        state["total_parts"].get(leg) and sum(stored_leg == leg for stored_leg, _ in state["stored"])
+        >= state["total_parts"][leg]
+        for leg in legs
+    )
+
+
+def _file_view(state: dict) -> dict:
+    done_parts = {stage: len(state[stage]) for stage in PART_STAGES}
+    total = sum(state["total_parts"].values()) or None
+    if state["error"]:
+        stage = "failed"
+    elif state["skipped"]:
+        stage = "skipped"
+    elif _is_stored(state):
+        stage = "stored"
+    else:
+        # Until every part is stored the file is at the furthest stage some part reached before that
+        reached = [s for s in PART_STAGES[:-1] if state[s] or state["stored"]]
+        stage = reached[-1] if reached else ("parsed" if state["parsed"] else "accepted")
+    return {"filename": state["filename"], "stage": stage, "doc_id": state["doc_id"], "total_parts": total,
+            **done_parts, "failed_chunks": sum(state["failed_chunks"].values()),
+            "error": state["error"] or state["missing"], "skipped": state["skipped"]}
+
+
+'''
+JobStore: ingestion jobs and the progress of each of their files, built from progress events
+apply: folds one progress event {"job_id", "file", "file_index", "stage", ...} into its job; events may
+       arrive in any order or twice, the "accepted" event lists the job's files. Files are keyed by their
+       index in the upload (file_index travels with the job_id to text-parser, OCR and ingestion), two
+       uploaded files of the same name are two files.
+get: job snapshot for GET /jobs/{id}, None if unknown
+wait_for_change: resolves at the next event of the job (for the SSE feed)
+
+Stages of a file: accepted -> parsed -> chunked -> embedded -> stored (each part), or failed, or skipped
+(the registry already knows the file's bytes). A mixed PDF's parts carry their leg ("text" / "ocr"): it is
+stored once the parts of both legs are, or only those of the leg that got through ("legs" of its parsed
+event, the other leg's error is kept in "missing" and makes the job partial).
+'''
+class JobStore:
+    def __init__(self, ttl_seconds: float = JOB_TTL_SECONDS, max_jobs: int = JOB_MAX_JOBS, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.clock = clock
+        self._jobs = OrderedDict()
+        self._changed = {}
+
+    def _job(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job is None:
+            self._prune()
+            job = self._jobs[job_id] = {"created_at": self.clock(), "updated_at": None, "files": {}}
+        self._jobs.move_to_end(job_id)
+        return job
+
+    def _prune(self):
+        now = self.clock()
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            if len(self._jobs) < self.max_jobs and now - job["updated_at"] < self.ttl_seconds:
+                break
+            del self._jobs[job_id]
+            self._changed.pop(job_id, None)
+
+    def apply(self, event: dict):
+        job_id, stage = event.get("job_id"), event.get("stage")
+        if not job_id or not stage:
+            return
+        job = self._job(job_id)
+        job["updated_at"] = self.clock()
+
+        if stage == "accepted":
+            for index, name in enumerate(event.get("files", [])):
+                job["files"].setdefault(index, _new_file(name))["filename"] = name
+        else:
+            state = self._file(job, event)
+            state["doc_id"] = event.get("doc_id") or state["doc_id"]
+            leg = event.get("leg") or DEFAULT_LEG
+            if event.get("total_parts"):
+                state["total_parts"][leg] = event["total_parts"]
+            # Until api-service says which legs got through, a leg's parts mean both legs are coming
+            if leg in MIXED_LEGS and state["legs"] is None:
+                state["legs"] = list(MIXED_LEGS)
+            if stage == "parsed":
+                state["parsed"] = True
+                if event.get("legs"):
+                    state["legs"] = event["legs"]
+                    state["missing"] = event.get("error")
+            elif stage in PART_STAGES:
+                state[stage].add((leg, event.get("part", 0)))
+                if stage == "stored":
+                    state["failed_chunks"][(leg, event.get("part", 0))] = event.get("failed", 0)
+            elif stage == "failed":
+                state["error"] = event.get("error") or "failed"
+            elif stage == "skipped":
+                state["skipped"] = event.get("reason") or "Already ingested"
+
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    def _file(self, job: dict, event: dict) -> dict:
+        index = event.get("file_index")
+        if index is None:
+            # Publishers that do not forward file_index: the first file of that name
+            index = next((key for key, state in job["files"].items() if state["filename"] == event.get("file")),
+                         event.get("file"))
+        state = job["files"].setdefault(index, _new_file(event.get("file")))
+        state["filename"] = state["filename"] or event.get("file")
+        return state
+
+    def get(self, job_id: str) -> dict | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        files = [_file_view(state) for state in job["files"].values()]
+        stages = [f["stage"] for f in files]
+        if any(stage not in ("stored", "skipped", "failed") for stage in stages):
+            status = "running"
+        elif "failed" not in stages and not any(state["missing"] for state in job["files"].values()):
+            status = "completed"
+        else:
+            status = "failed" if all(stage == "failed" for stage in stages) else "partial"
+        return {"job_id": job_id, "status": status, "created_at": job["created_at"],
+                "updated_at": job["updated_at"], "files": files}
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        changed = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+'''
+JobProgress: publishes and consumes ingestion progress events on the ingestion_progress exchange
+connect: declares the exchange and binds a private queue to job.#, so every replica's JobStore sees every job
+publish: sends one progress event (best effort, progress must never fail an upload)
+'''
+class JobProgress:
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.rabbitmq_url = os.getenv("RABBITMQ_URL")
+        self.connection = None
+        self.exchange = None
+
+    async def connect(self):
+        self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        channel = await self.connection.channel()
+        self.exchange = await channel.declare_exchange(
+            INGESTION_PROGRESS_EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True
+        )
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(self.exchange, routing_key="job.#")
+        await queue.consume(self._on_message, no_ack=True)
+        logger.success(f"Subscribed to {INGESTION_PROGRESS_EXCHANGE}")
+
+    async def _on_message(self, message: aio_pika.IncomingMessage):
+        try:
+            self.store.apply(json.loads(message.body.decode()))
+        except ValueError as e:
+            logger.error(f"Invalid progress event: {e}")
+
+    async def publish(self, event: dict):
+        # Applied locally right away, the broker copy updates the other replicas (applying twice is harmless)
+        self.store.apply(event)
+        if self.exchange is None:
+            return
+        try:
+            await self.exchange.publish(
+                aio_pika.Message(body=json.dumps(event).encode()),
+                routing_key=f"job.{event['job_id']}.{event['stage']}",
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish progress for job {event['job_id']}: {e}")
+
+    async def close(self):
+        if self.connection:
+            await self.connection.close()
+            self.connection = None
+            self.exchange = None
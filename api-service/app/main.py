@@ -2,12 +2,23 @@
 
 from fastapi import FastAPI, Depends, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from .publisher import AsyncRabbitMQPublisher, MessageModel
+from .http_client import SharedHTTPClient, route_timeout
+from .uploads import UPLOAD_MAX_FILE_BYTES, FileTooLarge, HashingReader, UploadSizeLimit
+from .jobs import JobProgress, JobStore
+from .registry import DocumentRegistryClient, hash_file
+from .pdf_routing import PDF_PRECLASSIFY_ENABLED, classify_pdf, extract_pages, format_ranges
 from datetime import datetime
 from loguru import logger
+import asyncio
 import httpx
+import json
 import os
+import shutil
+import tempfile
+import uuid
 
 app = FastAPI()
 
@@ -25,11 +36,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Caps upload bodies while they arrive (UPLOAD_MAX_REQUEST_BYTES)
+app.add_middleware(UploadSizeLimit, paths=("/upload_docs", "/jobs"))
+
 TEXT_PARSER_URL = os.getenv("TEXT_PARSER_URL")
 OCR_SERVICE_URL = os.getenv("OCR_SERVICE_URL")
 RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL")
+# Streaming variant of the RAG reply endpoint (server-sent events), defaults to <RAG_SERVICE_URL>/stream
+RAG_SERVICE_STREAM_URL = os.getenv("RAG_SERVICE_STREAM_URL") or (
+    f"{RAG_SERVICE_URL.rstrip('/')}/stream" if RAG_SERVICE_URL else None
+)
+# Read timeouts per downstream route (connect timeout: HTTP_CONNECT_TIMEOUT)
+RAG_READ_TIMEOUT = float(os.getenv("RAG_READ_TIMEOUT", 60))
+PARSER_READ_TIMEOUT = float(os.getenv("PARSER_READ_TIMEOUT", 120))
+OCR_READ_TIMEOUT = float(os.getenv("OCR_READ_TIMEOUT", 300))
+# Longest pause allowed between two streamed pieces (retrieval runs before the first one)
+RAG_STREAM_READ_TIMEOUT = float(os.getenv("RAG_STREAM_READ_TIMEOUT", 120))
 # INGESTION_URL = "http://injestion-service:8000/ingest_text"
 
+# Files sent to text-parser / OCR at the same time, across all uploads of this process
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))
+upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+OCR_FORMATS = (".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif")
+
+# One pooled client for text-parser, OCR and rag-service calls, opened at startup
+http_client = SharedHTTPClient()
+
+# Uploads already ingested (same bytes) are skipped, see db-service (DB_SERVICE_URL)
+registry = DocumentRegistryClient(http_client)
+
+# Ingestion jobs (POST /jobs), their progress arrives as events on the ingestion_progress exchange
+jobs = JobStore()
+job_progress = JobProgress(jobs)
+# Keeps running job tasks referenced until they finish
+job_tasks = set()
+# Longest wait between two messages of GET /jobs/{id}/events (a keep-alive comment is sent otherwise)
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", 15))
+
 
 class PostRequest(BaseModel):
     query: str
@@ -37,92 +80,323 @@ class PostRequest(BaseModel):
 
 @app.post("/reply")
 async def reply(request: PostRequest):
-    async with httpx.AsyncClient() as client:
+    try:
+        if not RAG_SERVICE_URL:
+            raise HTTPException(
+                status_code=500, detail="RAG_SERVICE_URL not configured"
+            )
+
+        response = await http_client.client.post(
+            RAG_SERVICE_URL, json=request.dict(), timeout=route_timeout(RAG_READ_TIMEOUT)
+        )
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"RAG service error: {response.text}",
+            )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"RAG service error: {str(e)}")
+
+
+@app.post("/reply/stream")
+async def reply_stream(request: PostRequest):
+    if not RAG_SERVICE_STREAM_URL:
+        raise HTTPException(status_code=500, detail="RAG_SERVICE_URL not configured")
+
+    client = http_client.client
+    try:
+        upstream = await client.send(
+            client.build_request(
+                "POST", RAG_SERVICE_STREAM_URL, json=request.dict(), timeout=route_timeout(RAG_STREAM_READ_TIMEOUT)
+            ),
+            stream=True,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"RAG service error: {str(e)}")
+
+    if upstream.status_code != 200:
+        body = await upstream.aread()
+        await upstream.aclose()
+        raise HTTPException(
+            status_code=upstream.status_code,
+            detail=f"RAG service error: {body.decode(errors='replace')}",
+        )
+
+    async def relay():
+        # Forward bytes as they arrive, nothing is buffered here; closing returns the connection to the pool
         try:
-            if not RAG_SERVICE_URL:
-                raise HTTPException(
-                    status_code=500, detail="RAG_SERVICE_URL not configured"
-                )
-
-            response = await client.post(RAG_SERVICE_URL, json=request.dict())
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"RAG service error: {response.text}",
-                )
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    return StreamingResponse(
+        relay(),
+        media_type=upstream.headers.get("content-type", "text/event-stream"),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def post_file(client: httpx.AsyncClient, url: str, files: dict, read_timeout: float, params: dict = None) -> str | None:
+    # None when the service accepted the file, otherwise why it did not
+    try:
+        response = await client.post(url, files=files, params=params, timeout=route_timeout(read_timeout))
+    except httpx.HTTPError as e:
+        return f"{type(e).__name__}: {e}"
+    if response.status_code == 200:
+        return None
+    return f"{response.status_code} - {response.text}"
+
+
+async def dispatch_mixed_pdf(client: httpx.AsyncClient, doc: UploadFile, files: dict, layout: dict,
+                             params: dict, sha256: str) -> dict:
+    # Text pages are extracted by text-parser from the whole file, scanned pages are cut into a sub-PDF for OCR;
+    # "pages" carries the original page numbers to both, "doc_id" / "leg" let their parts report to the same
+    # registry entry. {leg: {"service", "pages", "status", "error"}}, each leg accepted or failed on its own.
+    legs = {
+        "text": {"service": "text-parser", "pages": format_ranges(layout["text_pages"])},
+        "ocr": {"service": "OCR", "pages": format_ranges(layout["scanned_pages"])},
+    }
+    await registry.declare_legs(sha256, list(legs))
+    leg_params = {leg: {**(params or {}), "doc_id": sha256, "leg": leg, "pages": legs[leg]["pages"]} for leg in legs}
+
+    scanned = await asyncio.to_thread(extract_pages, doc.file, layout["scanned_pages"])
+    with scanned:
+        errors = await asyncio.gather(
+            post_file(client, TEXT_PARSER_URL, files, PARSER_READ_TIMEOUT, leg_params["text"]),
+            post_file(
+                client, OCR_SERVICE_URL, {"file": (doc.filename, scanned, "application/pdf")}, OCR_READ_TIMEOUT,
+                leg_params["ocr"],
+            ),
+        )
+
+    for (leg, outcome), error in zip(legs.items(), errors):
+        outcome["status"] = "Failed" if error else "Processed"
+        if error:
+            outcome["error"] = f"{outcome['service']} (pages {outcome['pages']}): {error}"
+            logger.error(f"{leg} leg of {doc.filename} failed: {outcome['error']}")
+            await registry.set_leg_status(sha256, leg, "failed", outcome["error"])
+    return legs
+
+
+def rejection(doc: UploadFile) -> str | None:
+    # Why the file is refused before anything is sent on, None if it is acceptable
+    if not doc.filename.lower().endswith((".pdf",) + OCR_FORMATS):
+        return f"Unsupported file type: {doc.filename}"
+    if doc.size is not None and doc.size > UPLOAD_MAX_FILE_BYTES:
+        return f"{doc.filename} exceeds {UPLOAD_MAX_FILE_BYTES} bytes"
+    return None
+
+
+async def process_doc(client: httpx.AsyncClient, doc: UploadFile, job_id: str = None, force: bool = False,
+                      file_index: int = None) -> dict:
+    error = rejection(doc)
+    if error:
+        return {"filename": doc.filename, "status": "Failed", "error": error}
+
+    async with upload_slots:
+        # With a registry the hash is needed before dispatch: the same bytes already ingested (or being
+        # ingested by another upload) are not parsed again, unless force re-indexes them
+        sha256 = None
+        if registry.enabled:
+            sha256 = await asyncio.to_thread(hash_file, doc.file)
+            claim = await registry.claim(sha256, doc.filename, doc.size, force)
+            if claim is None:
+                sha256 = None
+            elif not claim["claimed"]:
+                known = claim["document"]["status"] == "ingested"
+                return {"filename": doc.filename, "status": "Already ingested" if known else "Already being ingested",
+                        "sha256": sha256}
+
+        try:
+            result = await dispatch_doc(client, doc, job_id, sha256, file_index)
+        except asyncio.CancelledError:
+            # The claim must not outlive an abandoned upload either
+            if sha256:
+                await asyncio.shield(registry.set_status(sha256, "failed", "Upload cancelled"))
+            raise
         except Exception as e:
-            raise HTTPException(status_code=502, detail=f"RAG service error: {str(e)}")
+            logger.exception(f"Dispatching {doc.filename} failed")
+            result = {"filename": doc.filename, "status": "Failed", "error": f"{doc.filename}: {type(e).__name__}: {e}"}
 
+        # Releases the claim, the next upload of these bytes is dispatched again (a mixed PDF with one leg
+        # through is not failed, the registry completes it as incomplete once that leg is stored)
+        if sha256 and result["status"] == "Failed":
+            await registry.set_status(sha256, "failed", result["error"])
+        return result
 
-@app.post("/upload_docs")
-async def upload_docs(docs: list[UploadFile] = File(...)):
-    async with httpx.AsyncClient() as client:
-        results = []
-        print(f"TEXT_PARSER_URL: {TEXT_PARSER_URL}")
-        for doc in docs:
-            filename = doc.filename.lower()
-            file_bytes = await doc.read()
-            text_content = ""
-
-            if filename.endswith(".pdf"):
+
+async def dispatch_doc(client: httpx.AsyncClient, doc: UploadFile, job_id: str = None, sha256: str = None,
+                       file_index: int = None) -> dict:
+    is_pdf = doc.filename.lower().endswith(".pdf")
+    # Downstream services tag their progress events with the job, and the file with its index in the upload
+    params = {"job_id": job_id, "file_index": file_index} if job_id else None
+    result = {"filename": doc.filename}
+
+    # Where the PDF's text layer is: scanned PDFs skip text-parser, mixed ones are split by page range
+    layout = await asyncio.to_thread(classify_pdf, doc.file) if is_pdf and PDF_PRECLASSIFY_ENABLED else None
+
+    # The upload is streamed from its spool (memory up to 1 MB, then a temp file) in 64 KiB chunks,
+    # an OCR fallback rewinds the same spool instead of keeping a copy of the bytes
+    reader = HashingReader(doc.file)
+    files = {"file": (doc.filename, reader, doc.content_type)}
+
+    try:
+        if layout and layout["kind"] == "mixed":
+            # The OCR leg only sees a sub-PDF, it is told the whole file's id
+            sha256 = sha256 or await asyncio.to_thread(hash_file, doc.file)
+            legs = await dispatch_mixed_pdf(client, doc, files, layout, params, sha256)
+            failed = [leg for leg in legs.values() if leg["status"] == "Failed"]
+            result = {**result, "sha256": sha256, "legs": legs}
+            if not failed:
+                return {**result, "status": "Processed by text-parser and OCR"}
+            if len(failed) < len(legs):
+                return {**result, "status": "Partially processed", "error": "; ".join(leg["error"] for leg in failed)}
+            services = "text-parser and OCR"
+        else:
+            use_parser = is_pdf and (layout is None or layout["kind"] == "text")
+            if use_parser:
                 # Try text-parser service first
-                parser_resp = await client.post(
-                    TEXT_PARSER_URL,
-                    files={"file": (doc.filename, file_bytes, doc.content_type)},
-                )
-                if parser_resp.status_code == 200:
-                    results.append(
-                        {"filename": doc.filename, "status": "Processed by text-parser"}
-                    )
-                else:
-                    print(
-                        f"[ERROR] text-parser failed: {parser_resp.status_code} - {parser_resp.text}"
-                    )
-                    # Fallback to OCR
-                    ocr_resp = await client.post(
-                        OCR_SERVICE_URL,
-                        files={"file": (doc.filename, file_bytes, doc.content_type)},
-                    )
-                    if ocr_resp.status_code == 200:
-                        results.append(
-                            {
-                                "filename": doc.filename,
-                                "status": "Processed by OCR",
-                            }
-                        )
-                    else:
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Failed to process {doc.filename} using both services.",
-                        )
-            else:
-                # Non-PDF files handled by OCR
-                allowed_ocr_formats = [".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"]
-                if any(filename.endswith(ext) for ext in allowed_ocr_formats):
-                    ocr_resp = await client.post(
-                        OCR_SERVICE_URL,
-                        files={"file": (doc.filename, file_bytes, doc.content_type)},
-                    )
-                    if ocr_resp.status_code == 200:
-                        results.append(
-                            {
-                                "filename": doc.filename,
-                                "status": "Processed by OCR",
-                            }
-                        )
-                    else:
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Failed to process {doc.filename} using OCR.",
-                        )
-                else:
-                    raise HTTPException(
-                        status_code=400, detail=f"Unsupported file type: {doc.filename}"
-                    )
-
-        return {"results": results}
+                error = await post_file(client, TEXT_PARSER_URL, files, PARSER_READ_TIMEOUT, params)
+                if error is None:
+                    return {**result, "status": "Processed by text-parser", "sha256": reader.sha256}
+                logger.error(f"text-parser failed for {doc.filename}: {error}")
+
+            # Non-PDF files, scanned PDFs and PDFs the text-parser could not handle go to OCR
+            error = await post_file(client, OCR_SERVICE_URL, files, OCR_READ_TIMEOUT, params)
+            if error is None:
+                return {**result, "status": "Processed by OCR", "sha256": reader.sha256}
+            logger.error(f"OCR failed for {doc.filename}: {error}")
+            services = "both services" if use_parser else "OCR"
+
+        return {**result, "status": "Failed", "error": f"Failed to process {doc.filename} using {services}."}
+    except FileTooLarge as e:
+        return {**result, "status": "Failed", "error": f"{doc.filename}: {e}"}
+
+
+@app.post("/upload_docs")
+async def upload_docs(docs: list[UploadFile] = File(...), allow_partial: bool = False, force: bool = False):
+    # Without allow_partial an unsupported or oversized file rejects the upload before anything is sent on,
+    # force re-indexes files the registry already knows
+    if not allow_partial:
+        unsupported = [doc.filename for doc in docs if not doc.filename.lower().endswith((".pdf",) + OCR_FORMATS)]
+        if unsupported:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {', '.join(unsupported)}")
+        oversized = [doc.filename for doc in docs if rejection(doc)]
+        if oversized:
+            raise HTTPException(
+                status_code=413, detail=f"Files over {UPLOAD_MAX_FILE_BYTES} bytes: {', '.join(oversized)}"
+            )
+
+    outcomes = await asyncio.gather(*(process_doc(http_client.client, doc, force=force) for doc in docs), return_exceptions=True)
+
+    results = [
+        outcome if not isinstance(outcome, BaseException)
+        else {"filename": doc.filename, "status": "Failed", "error": str(outcome)}
+        for doc, outcome in zip(docs, outcomes)
+    ]
+    failed = sum(result["status"] == "Failed" for result in results)
+    skipped = sum(result["status"].startswith("Already") for result in results)
+    # Mixed PDFs with one leg through count as processed, their "legs" say which pages are missing
+    partial = sum(result["status"] == "Partially processed" for result in results)
+    body = {"results": results, "processed": len(results) - failed, "failed": failed, "skipped": skipped,
+            "partial": partial}
+
+    # Files that did get through are already queued for ingestion, the results say which
+    if failed and not allow_partial:
+        return JSONResponse(status_code=500, content={"detail": f"{failed} of {len(results)} files failed", **body})
+    return body
+
+
+async def run_job(job_id: str, docs: list[UploadFile], force: bool = False):
+    async def run(index, doc):
+        try:
+            result = await process_doc(http_client.client, doc, job_id, force, index)
+        except Exception as e:
+            result = {"filename": doc.filename, "status": "Failed", "error": str(e)}
+        finally:
+            doc.file.close()
+        # text-parser reports "parsed" itself (with the part count), OCR results are reported from here
+        event = {"job_id": job_id, "file": doc.filename, "file_index": index}
+        if result["status"] == "Failed":
+            await job_progress.publish({**event, "stage": "failed", "error": result["error"]})
+        elif result["status"] == "Processed by OCR":
+            await job_progress.publish({**event, "stage": "parsed"})
+        elif "legs" in result:
+            # A mixed PDF is stored once the legs that got through are, a failed leg is not waited for
+            legs = [leg for leg, outcome in result["legs"].items() if outcome["status"] == "Processed"]
+            await job_progress.publish(
+                {**event, "stage": "parsed", "doc_id": result["sha256"], "legs": legs, "error": result.get("error")}
+            )
+        elif result["status"].startswith("Already"):
+            await job_progress.publish(
+                {**event, "stage": "skipped", "doc_id": result["sha256"], "reason": result["status"]}
+            )
+
+    await asyncio.gather(*(run(index, doc) for index, doc in enumerate(docs)))
+    logger.info(f"Job {job_id}: {len(docs)} files dispatched")
+
+
+def spool_copy(doc: UploadFile) -> UploadFile:
+    # The request's own spools are closed once the response is sent, the job keeps an anonymous temp file
+    doc.file.seek(0)
+    copy = tempfile.TemporaryFile()
+    shutil.copyfileobj(doc.file, copy)
+    copy.seek(0)
+    return UploadFile(copy, size=doc.size, filename=doc.filename, headers=doc.headers)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(docs: list[UploadFile] = File(...), allow_partial: bool = False, force: bool = False):
+    # Same admission rules as /upload_docs, then parsing and ingestion continue in the background
+    if not allow_partial:
+        refused = [error for error in map(rejection, docs) if error]
+        if refused:
+            raise HTTPException(status_code=400, detail="; ".join(refused))
+
+    job_id = uuid.uuid4().hex
+    copies = [await asyncio.to_thread(spool_copy, doc) for doc in docs]
+    await job_progress.publish({"job_id": job_id, "stage": "accepted", "files": [doc.filename for doc in docs]})
+
+    task = asyncio.create_task(run_job(job_id, copies, force))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return {"job_id": job_id, "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+    async def feed():
+        # One "progress" message per change, the last one once every file is stored or failed
+        while True:
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+            if job["status"] != "running":
+                return
+            updated_at = job["updated_at"]
+            while (jobs.get(job_id) or {}).get("updated_at") == updated_at:
+                await jobs.wait_for_change(job_id, JOB_EVENTS_KEEPALIVE_SECONDS)
+                if (jobs.get(job_id) or {}).get("updated_at") == updated_at:
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        feed(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 class PostRequest(BaseModel):
@@ -150,12 +424,21 @@ publisher = AsyncRabbitMQPublisher()
 
 @app.on_event("startup")
 async def startup_event():
+    http_client.start()
     await publisher.connect()
+    await job_progress.connect()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     await publisher.close()
+    await job_progress.close()
+    await http_client.close()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {"http_pool": http_client.stats()}
 
 
 @app.get("/")
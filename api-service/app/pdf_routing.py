@@ -0,0 +1,98 @@
+# api-service/pdf_routing.py
+
+import os
+import tempfile
+from loguru import logger
+from pypdf import PdfReader, PdfWriter
+
+# Classify PDFs before dispatch, so scanned pages go straight to OCR instead of failing in text-parser first
+PDF_PRECLASSIFY_ENABLED = os.getenv("PDF_PRECLASSIFY_ENABLED", "true").lower() == "true"
+# Pages sampled (spread over the document) to decide text / scanned / mixed
+PDF_SAMPLE_PAGES = int(os.getenv("PDF_SAMPLE_PAGES", 5))
+# Fewer extracted characters than this and a page counts as an image (scan, blank or a stray page number)
+PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", 16))
+
+
+def page_has_text(page) -> bool:
+    try:
+        return len((page.extract_text() or "").strip()) >= PDF_MIN_PAGE_CHARS
+    except Exception:
+        return False
+
+
+def page_ranges(flags: list[bool], value: bool = True) -> list[tuple[int, int]]:
+    # (first, last) 1-based runs of pages whose flag equals value
+    ranges = []
+    for number, flag in enumerate(flags, start=1):
+        if flag != value:
+            continue
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
+
+
+def format_ranges(ranges: list[tuple[int, int]]) -> str:
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+'''
+classify_pdf: where a PDF's text layer is, from its spooled upload (blocking, run in a thread)
+Returns {"kind": "text" | "scanned" | "mixed", "pages": n, "text_pages": [(first, last)], "scanned_pages": [...]}
+or None when the file cannot be read (it is then dispatched as before: text-parser, then OCR).
+
+Only PDF_SAMPLE_PAGES pages are extracted when the samples agree. Between two neighbouring samples that
+disagree the switch from one kind to the other is bisected, a few more pages rather than the whole document
+(text-parser extracts the text pages again). Pages between samples are assumed to switch kind at most once:
+a mostly-text PDF with a scanned page between two agreeing samples is treated as text.
+'''
+def classify_pdf(file, sample_pages: int = PDF_SAMPLE_PAGES) -> dict | None:
+    file.seek(0)
+    try:
+        pages = PdfReader(file).pages
+        count = len(pages)
+        if count == 0:
+            return None
+        step = (count - 1) / max(min(sample_pages, count) - 1, 1)
+        # The first and the last page are always sampled
+        indices = sorted({round(i * step) for i in range(min(sample_pages, count))})
+        sampled = [page_has_text(pages[index]) for index in indices]
+
+        flags = [sampled[-1]] * count
+        for (left, left_flag), (right, right_flag) in zip(zip(indices, sampled), zip(indices[1:], sampled[1:])):
+            # Smallest page from which on the right-hand sample's kind holds
+            low, high = left, right
+            while left_flag != right_flag and high - low > 1:
+                middle = (low + high) // 2
+                if page_has_text(pages[middle]) == left_flag:
+                    low = middle
+                else:
+                    high = middle
+            flags[left:high] = [left_flag] * (high - left)
+            flags[high:right] = [right_flag] * (right - high)
+    except Exception as e:
+        logger.warning(f"Could not classify PDF, dispatching it unclassified: {e}")
+        return None
+    finally:
+        file.seek(0)
+
+    kind = "mixed" if len(set(flags)) == 2 else ("text" if flags[0] else "scanned")
+    return {"kind": kind, "pages": count, "text_pages": page_ranges(flags, True), "scanned_pages": page_ranges(flags, False)}
+
+
+def extract_pages(file, ranges: list[tuple[int, int]]):
+    # Sub-PDF of the given 1-based page ranges, in an anonymous spool (blocking, run in a thread)
+    file.seek(0)
+    try:
+        reader = PdfReader(file)
+        writer = PdfWriter()
+        for first, last in ranges:
+            for index in range(first - 1, last):
+                writer.add_page(reader.pages[index])
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        writer.write(spool)
+    finally:
+        file.seek(0)
+    spool.seek(0)
+    return spool
@@ -0,0 +1,78 @@
+# api-service/registry.py
+
+import hashlib
+import os
+import httpx
+from loguru import logger
+from .http_client import SharedHTTPClient, route_timeout
+
+# db-service document registry, unset disables deduplication
+DB_SERVICE_URL = os.getenv("DB_SERVICE_URL")
+REGISTRY_READ_TIMEOUT = float(os.getenv("REGISTRY_READ_TIMEOUT", 5))
+
+
+def hash_file(file, chunk_size: int = 1024 * 1024) -> str:
+    # SHA-256 of a spooled upload, rewound afterwards so it can still be streamed on (blocking, run in a thread)
+    file.seek(0)
+    digest = hashlib.sha256()
+    while chunk := file.read(chunk_size):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+'''
+DocumentRegistryClient: api-service side of the db-service registry, over the shared pooled client
+claim: registers an upload by content hash; {"claimed": False, "document": ...} means the same bytes are
+       already ingested (or being ingested) and must not be dispatched again. None when the registry is
+       unset or unreachable: deduplication is best effort and never blocks an upload.
+set_status: records a dispatch failure, so the document is not reported as being ingested
+declare_legs / set_leg_status: a PDF split between text-parser and OCR, the registry completes it only once
+       both legs have an outcome; a leg whose dispatch failed is recorded as such
+'''
+class DocumentRegistryClient:
+    def __init__(self, http_client: SharedHTTPClient, base_url: str = DB_SERVICE_URL):
+        self.http_client = http_client
+        self.base_url = base_url.rstrip("/") if base_url else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.base_url is not None
+
+    async def claim(self, sha256: str, filename: str, size: int = None, force: bool = False) -> dict | None:
+        if not self.enabled:
+            return None
+        try:
+            response = await self.http_client.client.post(
+                f"{self.base_url}/documents/{sha256}/claim",
+                json={"filename": filename, "size": size, "force": force},
+                timeout=route_timeout(REGISTRY_READ_TIMEOUT),
+            )
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Registry claim failed for {filename}, ingesting without deduplication: {e}")
+            return None
+
+    async def _post(self, path: str, body: dict, action: str):
+        # Best effort: a registry error is logged, never raised
+        if not self.enabled:
+            return
+        try:
+            response = await self.http_client.client.post(
+                f"{self.base_url}{path}", json=body, timeout=route_timeout(REGISTRY_READ_TIMEOUT)
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to record {action} in the registry: {e}")
+
+    async def set_status(self, sha256: str, status: str, error: str = None):
+        await self._post(f"/documents/{sha256}/status", {"status": status, "error": error}, f"status {status} for {sha256}")
+
+    async def declare_legs(self, sha256: str, legs: list[str]):
+        await self._post(f"/documents/{sha256}/legs", {"legs": legs}, f"legs {', '.join(legs)} of {sha256}")
+
+    async def set_leg_status(self, sha256: str, leg: str, status: str, error: str = None):
+        await self._post(
+            f"/documents/{sha256}/legs/{leg}", {"status": status, "error": error}, f"{leg} leg {status} for {sha256}"
+        )
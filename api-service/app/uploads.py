@@ -0,0 +1,84 @@
+# api-service/uploads.py
+
+import hashlib
+import os
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Largest single file and largest whole upload request accepted by /upload_docs
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", 100 * 1024 * 1024))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", 500 * 1024 * 1024))
+
+
+class FileTooLarge(ValueError):
+    pass
+
+
+'''
+UploadSizeLimit: ASGI middleware capping the request body of the upload routes while it is received
+A declared Content-Length over the cap is refused before any byte is read, a chunked body is cut off
+(413) as soon as it passes the cap, so an oversized upload never fills the spool on disk.
+'''
+class UploadSizeLimit:
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_REQUEST_BYTES, paths: tuple = ("/upload_docs",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        detail = f"Upload exceeds {self.max_bytes} bytes"
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and int(declared) > self.max_bytes:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+'''
+HashingReader: file-like view of an uploaded file that httpx streams into a multipart body
+read: passes chunks through, hashing and counting them, FileTooLarge once more than max_bytes went by
+seek: rewinding to the start (httpx does so before sending, again on a fallback) restarts the hash
+sha256: hex digest of the last complete pass, None before the file was read to the end
+'''
+class HashingReader:
+    def __init__(self, file, max_bytes: int = UPLOAD_MAX_FILE_BYTES):
+        self.file = file
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file.read(size)
+        if not chunk:
+            self.sha256 = self._hash.hexdigest()
+            return chunk
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise FileTooLarge(f"File exceeds {self.max_bytes} bytes")
+        self._hash.update(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self.file.seek(offset, whence)
+        if position == 0:
+            self.size = 0
+            self._hash = hashlib.sha256()
+        return position
+
+    def tell(self) -> int:
+        return self.file.tell()
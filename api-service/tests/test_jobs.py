@@ -0,0 +1,99 @@
+import asyncio
+import io
+
+import httpx
+from fastapi import UploadFile
+
+from app import main
+from app.jobs import JobStore
+
+
+def test_job_progress_folds_events_in_any_order():
+    store = JobStore()
+    events = [
+        {"job_id": "j", "stage": "accepted", "files": ["a.pdf", "b.png"]},
+        {"job_id": "j", "file": "a.pdf", "stage": "chunked", "part": 1, "total_parts": 2},
+        {"job_id": "j", "file": "a.pdf", "stage": "parsed", "doc_id": "d1", "total_parts": 2},
+        {"job_id": "j", "file": "a.pdf", "stage": "stored", "part": 1, "total_parts": 2, "failed": 1},
+        {"job_id": "j", "file": "a.pdf", "stage": "stored", "part": 1, "total_parts": 2, "failed": 1},
+    ]
+    for event in events:
+        store.apply(event)
+
+    job = store.get("j")
+    a, b = job["files"]
+    assert job["status"] == "running"
+    # One of two parts stored: not done yet, duplicates counted once
+    assert (a["stage"], a["doc_id"], a["stored"], a["failed_chunks"]) == ("embedded", "d1", 1, 1)
+    assert b["stage"] == "accepted"
+
+    store.apply({"job_id": "j", "file": "a.pdf", "stage": "stored", "part": 0, "total_parts": 2})
+    store.apply({"job_id": "j", "file": "b.png", "stage": "failed", "error": "OCR down"})
+    job = store.get("j")
+    assert [f["stage"] for f in job["files"]] == ["stored", "failed"]
+    assert job["status"] == "partial"
+    assert store.get("unknown") is None
+
+    store.apply({"job_id": "k", "stage": "accepted", "files": ["a.pdf"]})
+    store.apply({"job_id": "k", "file": "a.pdf", "stage": "skipped", "reason": "Already ingested"})
+    assert store.get("k")["status"] == "completed"
+    assert store.get("k")["files"][0]["stage"] == "skipped"
+
+
+def test_files_are_keyed_by_upload_index_and_mixed_pdfs_wait_for_both_legs():
+    store = JobStore()
+    store.apply({"job_id": "j", "stage": "accepted", "files": ["report.pdf", "report.pdf", "mixed.pdf"]})
+    # Two different files of the same name
+    store.apply({"job_id": "j", "file": "report.pdf", "file_index": 0, "stage": "stored", "part": 0, "total_parts": 1})
+    store.apply({"job_id": "j", "file": "report.pdf", "file_index": 1, "stage": "failed", "error": "OCR down"})
+
+    # Every text page of the mixed PDF stored, nothing from its OCR leg yet
+    text = {"job_id": "j", "file": "mixed.pdf", "file_index": 2, "leg": "text", "total_parts": 1}
+    store.apply({**text, "stage": "parsed", "doc_id": "m"})
+    store.apply({**text, "stage": "stored", "part": 0})
+    assert [f["stage"] for f in store.get("j")["files"]] == ["stored", "failed", "embedded"]
+
+    ocr = {"job_id": "j", "file": "mixed.pdf", "file_index": 2, "leg": "ocr", "total_parts": 2}
+    store.apply({**ocr, "stage": "stored", "part": 0})
+    assert store.get("j")["files"][2]["stage"] == "embedded"
+    store.apply({**ocr, "stage": "stored", "part": 1})
+    mixed = store.get("j")["files"][2]
+    assert (mixed["stage"], mixed["total_parts"], mixed["stored"]) == ("stored", 3, 3)
+
+    # The OCR leg of another mixed PDF could not be dispatched: stored with its text pages, the job is partial
+    store.apply({"job_id": "k", "stage": "accepted", "files": ["mixed.pdf"]})
+    store.apply({"job_id": "k", "file": "mixed.pdf", "file_index": 0, "leg": "text", "stage": "stored", "part": 0,
+                 "total_parts": 1})
+    assert store.get("k")["status"] == "running"
+    store.apply({"job_id": "k", "file": "mixed.pdf", "file_index": 0, "stage": "parsed", "legs": ["text"],
+                 "error": "OCR (pages 3-4): 503"})
+    job = store.get("k")
+    assert (job["status"], job["files"][0]["stage"], job["files"][0]["error"]) == ("partial", "stored", "OCR (pages 3-4): 503")
+
+
+def test_create_job_returns_at_once_and_reports_dispatch(monkeypatch):
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(500 if str(request.url).startswith("http://parser/parse") else 200)
+
+    monkeypatch.setattr(main, "TEXT_PARSER_URL", "http://parser/parse")
+    monkeypatch.setattr(main, "OCR_SERVICE_URL", "http://ocr/ocr")
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def scenario():
+        doc = UploadFile(io.BytesIO(b"%PDF scanned"), filename="scan.pdf", size=12)
+        created = await main.create_job([doc])
+        before = main.jobs.get(created["job_id"])
+        release.set()
+        await asyncio.gather(*main.job_tasks)
+        return created, before, main.jobs.get(created["job_id"])
+
+    created, before, after = asyncio.run(scenario())
+
+    assert created["status_url"] == f"/jobs/{created['job_id']}"
+    assert before["files"][0]["stage"] == "accepted"
+    # Parsed by the OCR fallback, ingestion stages follow from the ingestion service's events
+    assert after["files"][0]["stage"] == "parsed"
+    assert after["status"] == "running"
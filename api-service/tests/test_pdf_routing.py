@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import io
+import json
+
+import httpx
+from fastapi import UploadFile
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from app import main, pdf_routing
+from app.pdf_routing import classify_pdf
+from app.registry import DocumentRegistryClient
+
+
+def make_pdf(layout: str) -> bytes:
+    # "t" pages carry a text layer, "s" pages are blank like a scan without OCR text
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for number, kind in enumerate(layout, start=1):
+        page = writer.add_blank_page(612, 792)
+        if kind == "t":
+            page[NameObject("/Resources")] = DictionaryObject(
+                {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+            )
+            content = DecodedStreamObject()
+            content.set_data(f"BT /F1 12 Tf 72 720 Td (Text layer of page {number}) Tj ET".encode())
+            page[NameObject("/Contents")] = writer._add_object(content)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_classify_pdf_samples_pages_and_finds_ranges():
+    assert classify_pdf(io.BytesIO(make_pdf("tttttttt")))["kind"] == "text"
+    assert classify_pdf(io.BytesIO(make_pdf("ssssssss")))["kind"] == "scanned"
+    assert classify_pdf(io.BytesIO(b"not a pdf")) is None
+
+    mixed = classify_pdf(io.BytesIO(make_pdf("ttsssttts")), sample_pages=5)
+    assert mixed["kind"] == "mixed"
+    assert (mixed["text_pages"], mixed["scanned_pages"]) == ([(1, 2), (6, 8)], [(3, 5), (9, 9)])
+
+
+def test_mixed_pdf_ranges_are_bisected_between_samples(monkeypatch):
+    checked = []
+
+    def page_has_text(page):
+        checked.append(page)
+        return page.extract_text() != ""
+
+    monkeypatch.setattr(pdf_routing, "page_has_text", page_has_text)
+    layout = classify_pdf(io.BytesIO(make_pdf("t" * 123 + "s" * 77)), sample_pages=5)
+    assert (layout["text_pages"], layout["scanned_pages"]) == ([(1, 123)], [(124, 200)])
+    # 5 samples, then only the gap where the kind changes is bisected
+    assert len(checked) <= 5 + 6
+
+
+def test_pdfs_go_straight_to_the_right_engine(monkeypatch):
+    sent = []
+
+    async def handler(request):
+        body = request.read()
+        pages = request.url.params.get("pages")
+        ocr_pages = len(PdfReader(io.BytesIO(body[body.index(b"%PDF"):])).pages) if "ocr" in str(request.url) else None
+        sent.append((request.url.host, pages, ocr_pages, request.url.params.get("leg")))
+        return httpx.Response(200)
+
+    monkeypatch.setattr(main, "TEXT_PARSER_URL", "http://parser/parse")
+    monkeypatch.setattr(main, "OCR_SERVICE_URL", "http://ocr/ocr")
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    def upload(name, layout):
+        return asyncio.run(main.upload_docs([UploadFile(io.BytesIO(make_pdf(layout)), filename=name)]))["results"][0]
+
+    assert upload("scan.pdf", "sss")["status"] == "Processed by OCR"
+    assert sent == [("ocr", None, 3, None)]
+
+    sent.clear()
+    result = upload("mixed.pdf", "ttsst")
+    assert result["status"] == "Processed by text-parser and OCR"
+    # text-parser gets the whole file with its text pages, OCR only the scanned pages
+    assert sorted(sent, key=str) == [("ocr", "3-4", 2, "ocr"), ("parser", "1-2,5", None, "text")]
+
+
+def test_mixed_pdf_outcome_is_reported_per_leg(monkeypatch):
+    registry_calls, doc_ids = [], set()
+
+    async def handler(request):
+        if request.url.host == "db":
+            registry_calls.append((request.url.path.split("/", 2)[-1], json.loads(request.read())))
+            if request.url.path.endswith("/claim"):
+                return httpx.Response(200, json={"claimed": True, "document": {"status": "ingesting"}})
+            return httpx.Response(200, json={})
+        doc_ids.add(request.url.params.get("doc_id"))
+        return httpx.Response(503 if request.url.host == "ocr" else 200)
+
+    monkeypatch.setattr(main, "TEXT_PARSER_URL", "http://parser/parse")
+    monkeypatch.setattr(main, "OCR_SERVICE_URL", "http://ocr/ocr")
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "registry", DocumentRegistryClient(main.http_client, "http://db"))
+
+    content = make_pdf("ttsst")
+    body = asyncio.run(main.upload_docs([UploadFile(io.BytesIO(content), filename="mixed.pdf")]))
+    # Not a failed upload: the text pages are on their way, the result says which pages are missing
+    result = body["results"][0]
+    assert (result["status"], body["processed"], body["failed"], body["partial"]) == ("Partially processed", 1, 0, 1)
+    assert (result["legs"]["text"]["status"], result["legs"]["ocr"]["status"]) == ("Processed", "Failed")
+    assert result["legs"]["ocr"]["error"].startswith("OCR (pages 3-4): 503")
+
+    # Both legs report to the whole file's entry, the registry gets the OCR leg's failure, not the document's
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert doc_ids == {sha256}
+    assert [call for call, _ in registry_calls] == [f"{sha256}/claim", f"{sha256}/legs", f"{sha256}/legs/ocr"]
+    assert registry_calls[1][1] == {"legs": ["text", "ocr"]}
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import io
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app import main
+from app.registry import DocumentRegistryClient
+from app.uploads import UploadSizeLimit
+
+
+def make_docs(*names):
+    return [UploadFile(io.BytesIO(name.encode()), filename=name) for name in names]
+
+
+def test_files_run_concurrently_and_fail_individually(monkeypatch):
+    active, peak = 0, 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        body = request.read()
+        if str(request.url) == "http://parser/parse":
+            return httpx.Response(500 if b"scanned.pdf" in body else 200)
+        return httpx.Response(500 if b"broken.png" in body else 200)
+
+    monkeypatch.setattr(main, "TEXT_PARSER_URL", "http://parser/parse")
+    monkeypatch.setattr(main, "OCR_SERVICE_URL", "http://ocr/ocr")
+    monkeypatch.setattr(main, "upload_slots", asyncio.Semaphore(2))
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    names = ("a.pdf", "scanned.pdf", "b.png", "broken.png", "notes.txt")
+    partial_result = asyncio.run(main.upload_docs(make_docs(*names), allow_partial=True))
+    assert [r["status"] for r in partial_result["results"]] == [
+        "Processed by text-parser", "Processed by OCR", "Processed by OCR", "Failed", "Failed",
+    ]
+    assert partial_result["processed"] == 3 and partial_result["failed"] == 2
+    assert peak == 2
+
+    # All-or-nothing: the error response still lists what went through
+    response = asyncio.run(main.upload_docs(make_docs("a.pdf", "broken.png"), allow_partial=False))
+    assert response.status_code == 500
+    assert [r["status"] for r in json.loads(response.body)["results"]] == ["Processed by text-parser", "Failed"]
+
+
+def test_uploads_are_hashed_while_streamed_and_capped(monkeypatch):
+    content = b"%PDF-1.4 scanned page" * 5000
+    sent = []
+
+    async def handler(request):
+        sent.append(content in request.read())
+        return httpx.Response(500 if str(request.url) == "http://parser/parse" else 200)
+
+    monkeypatch.setattr(main, "TEXT_PARSER_URL", "http://parser/parse")
+    monkeypatch.setattr(main, "OCR_SERVICE_URL", "http://ocr/ocr")
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    doc = UploadFile(io.BytesIO(content), filename="scan.pdf", size=len(content))
+    result = asyncio.run(main.upload_docs([doc]))
+    # The OCR fallback re-sent the whole file from the spool and hashed it again
+    assert sent == [True, True]
+    assert result["results"][0]["status"] == "Processed by OCR"
+    assert result["results"][0]["sha256"] == hashlib.sha256(content).hexdigest()
+
+    monkeypatch.setattr(main, "UPLOAD_MAX_FILE_BYTES", 1000)
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(main.upload_docs([UploadFile(io.BytesIO(content), filename="scan.pdf", size=len(content))]))
+    assert rejected.value.status_code == 413
+
+    async def post_oversized_request():
+        limited = UploadSizeLimit(main.app, max_bytes=1000)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=limited), base_url="http://api") as client:
+            return await client.post("/upload_docs", files={"docs": ("scan.pdf", content, "application/pdf")})
+
+    assert asyncio.run(post_oversized_request()).status_code == 413
+
+
+def test_known_documents_are_not_dispatched_again(monkeypatch):
+    documents, dispatched = {}, []
+
+    async def handler(request):
+        url = str(request.url)
+        if url.startswith("http://db/documents/"):
+            sha256, action = url.split("/")[-2:]
+            body = json.loads(request.read())
+            known = documents.get(sha256)
+            if action == "status":
+                documents[sha256] = body["status"]
+                return httpx.Response(200, json={})
+            if known in ("ingesting", "ingested") and not body["force"]:
+                return httpx.Response(200, json={"claimed": False, "document": {"status": known}})
+            documents[sha256] = "ingesting"
+            return httpx.Response(200, json={"claimed": True, "document": {"status": "ingesting"}})
+        dispatched.append(url)
+        return httpx.Response(500 if b"broken" in request.read() else 200)
+
+    monkeypatch.setattr(main, "TEXT_PARSER_URL", "http://parser/parse")
+    monkeypatch.setattr(main, "OCR_SERVICE_URL", "http://ocr/ocr")
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "registry", DocumentRegistryClient(main.http_client, "http://db"))
+
+    first = asyncio.run(main.upload_docs(make_docs("a.pdf", "broken.png"), allow_partial=True))
+    sha256 = hashlib.sha256(b"a.pdf").hexdigest()
+    assert first["results"][0] == {"filename": "a.pdf", "status": "Processed by text-parser", "sha256": sha256}
+    # A failed dispatch releases its claim
+    assert documents[hashlib.sha256(b"broken.png").hexdigest()] == "failed"
+
+    documents[sha256] = "ingested"
+    again = asyncio.run(main.upload_docs(make_docs("a.pdf", "broken.png"), allow_partial=True))
+    assert [r["status"] for r in again["results"]] == ["Already ingested", "Failed"]
+    assert (again["processed"], again["skipped"]) == (1, 1)
+    assert dispatched.count("http://parser/parse") == 1
+
+    forced = asyncio.run(main.upload_docs(make_docs("a.pdf"), force=True))
+    assert forced["results"][0]["status"] == "Processed by text-parser"
+    assert dispatched.count("http://parser/parse") == 2
+
+
+def test_claim_is_released_when_dispatch_raises(monkeypatch):
+    statuses = []
+
+    async def handler(request):
+        if request.url.path.endswith("/claim"):
+            return httpx.Response(200, json={"claimed": True, "document": {"status": "ingesting"}})
+        statuses.append(json.loads(request.read()))
+        return httpx.Response(200, json={})
+
+    def broken_classifier(file):
+        raise RuntimeError("classifier crashed")
+
+    monkeypatch.setattr(main, "classify_pdf", broken_classifier)
+    monkeypatch.setattr(main.http_client, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "registry", DocumentRegistryClient(main.http_client, "http://db"))
+
+    result = asyncio.run(main.upload_docs(make_docs("a.pdf"), allow_partial=True))
+    assert result["results"][0]["status"] == "Failed"
+    assert "classifier crashed" in result["results"][0]["error"]
+    assert [status["status"] for status in statuses] == ["failed"]
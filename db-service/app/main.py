@@ -0,0 +1,143 @@
+# db-service/main.py (FastAPI app)
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from loguru import logger
+from .registry import DocumentRegistry
+import asyncio
+import os
+
+app = FastAPI()
+
+# Document registry: content hash -> ingestion status, plus cached parsed text
+registry = DocumentRegistry()
+
+# How often documents with lost parts are looked for (REGISTRY_PARTS_TIMEOUT_SECONDS decides when)
+REGISTRY_SWEEP_SECONDS = float(os.getenv("REGISTRY_SWEEP_SECONDS", 60))
+sweeper = None
+
+
+class ClaimRequest(BaseModel):
+    filename: str | None = None
+    size: int | None = None
+    force: bool = False
+
+
+class StatusRequest(BaseModel):
+    status: str
+    filename: str | None = None
+    parts: int | None = None
+    failed_chunks: int | None = None
+    error: str | None = None
+
+
+class PartRequest(BaseModel):
+    part: int
+    total_parts: int
+    failed_chunks: int = 0
+    filename: str | None = None
+    leg: str | None = None
+
+
+class LegsRequest(BaseModel):
+    legs: list[str]
+
+
+class LegStatusRequest(BaseModel):
+    status: str
+    error: str | None = None
+
+
+class TextRequest(BaseModel):
+    pages: list[str]
+
+
+@app.get("/documents/{sha256}")
+def get_document(sha256: str):
+    document = registry.get(sha256)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document {sha256}")
+    return document
+
+
+@app.post("/documents/{sha256}/claim")
+def claim_document(sha256: str, request: ClaimRequest):
+    # claimed=False: already ingested or another upload is ingesting it, the caller should not dispatch it
+    claimed, document = registry.claim(sha256, request.filename, request.size, request.force)
+    return {"claimed": claimed, "document": document}
+
+
+@app.post("/documents/{sha256}/status")
+def set_document_status(sha256: str, request: StatusRequest):
+    try:
+        return registry.set_status(
+            sha256, request.status, request.filename, request.parts, request.failed_chunks, request.error
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/documents/{sha256}/parts")
+def record_document_part(sha256: str, request: PartRequest):
+    # completed=True for the one report that completes the document
+    completed, document = registry.record_part(
+        sha256, request.part, request.total_parts, request.failed_chunks, request.filename, request.leg
+    )
+    return {"completed": completed, "document": document}
+
+
+@app.post("/documents/{sha256}/legs")
+def declare_document_legs(sha256: str, request: LegsRequest):
+    return registry.declare_legs(sha256, request.legs)
+
+
+@app.post("/documents/{sha256}/legs/{leg}")
+def set_document_leg_status(sha256: str, leg: str, request: LegStatusRequest):
+    try:
+        return registry.set_leg_status(sha256, leg, request.status, request.error)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/documents/{sha256}/text")
+def get_document_text(sha256: str):
+    pages = registry.get_text(sha256)
+    if pages is None:
+        raise HTTPException(status_code=404, detail=f"No parsed text for {sha256}")
+    return {"pages": pages}
+
+
+@app.put("/documents/{sha256}/text", status_code=204)
+def put_document_text(sha256: str, request: TextRequest):
+    registry.put_text(sha256, request.pages)
+
+
+@app.get("/stats")
+def get_stats():
+    return registry.stats()
+
+
+async def sweep_stalled():
+    while True:
+        await asyncio.sleep(REGISTRY_SWEEP_SECONDS)
+        try:
+            await asyncio.to_thread(registry.expire_stalled)
+        except Exception as e:
+            logger.error(f"Stalled document sweep failed: {e}")
+
+
+@app.on_event("startup")
+async def startup_event():
+    global sweeper
+    sweeper = asyncio.create_task(sweep_stalled())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if sweeper:
+        sweeper.cancel()
+
+
+@app.get("/")
+async def root():
+    return {"message": "DB Service"}
@@ -0,0 +1,300 @@
+# db-service/registry.py
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from loguru import logger
+
+REGISTRY_DB_PATH = os.getenv("REGISTRY_DB_PATH", "/data/registry.sqlite3")
+# A claim not confirmed (ingested / failed) within this time is considered abandoned and can be taken over
+REGISTRY_CLAIM_TTL_SECONDS = float(os.getenv("REGISTRY_CLAIM_TTL_SECONDS", 3600))
+# A document whose stored parts stopped arriving this long ago (a part was lost) is marked incomplete
+REGISTRY_PARTS_TIMEOUT_SECONDS = float(os.getenv("REGISTRY_PARTS_TIMEOUT_SECONDS", 1800))
+
+# ingesting: claimed by an upload, ingested: every chunk stored, incomplete: stored with failed chunks,
+# failed: parsing or dispatch failed. Only "ingested" documents are skipped on re-upload.
+STATUSES = ("ingesting", "ingested", "incomplete", "failed")
+# Parts reported without a leg belong to the document as a whole (it was dispatched to one service)
+DEFAULT_LEG = "document"
+
+COLUMNS = ("sha256", "filename", "size", "status", "parts", "failed_chunks", "error",
+           "created_at", "updated_at", "ingested_at")
+
+
+'''
+DocumentRegistry: uploaded documents keyed by the SHA-256 of their bytes, plus their parsed text
+claim: registers an upload; claimed is False when the document is already ingested (or being ingested)
+       unless force is set, so identical re-uploads are short-circuited before parsing
+set_status: records the outcome (ingested / incomplete / failed), unknown documents are added
+declare_legs / set_leg_status: the legs of a document dispatched to several services, and a leg whose
+             dispatch failed
+record_part: counts one stored part of a leg (ingestion-service reports each), idempotent per part;
+             once every leg is stored, failed or timed out the document becomes ingested, incomplete
+             (failed chunks, or some legs missing) or failed (every leg failed)
+expire_stalled: times out the legs of documents whose parts stopped arriving for parts_timeout_seconds
+put_text / get_text: parsed pages, gzip-compressed, so re-indexing a known file skips extraction
+Calls are blocking (sqlite3), FastAPI runs the sync endpoints in its threadpool.
+'''
+class DocumentRegistry:
+    def __init__(self, path: str = REGISTRY_DB_PATH, claim_ttl_seconds: float = REGISTRY_CLAIM_TTL_SECONDS,
+                 parts_timeout_seconds: float = REGISTRY_PARTS_TIMEOUT_SECONDS, clock=time.time):
+        self.claim_ttl_seconds = claim_ttl_seconds
+        self.parts_timeout_seconds = parts_timeout_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "sha256 TEXT PRIMARY KEY, filename TEXT, size INTEGER, status TEXT NOT NULL, "
+            "parts INTEGER, failed_chunks INTEGER, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, ingested_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parsed_text ("
+            "sha256 TEXT PRIMARY KEY, pages BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS legs ("
+            "sha256 TEXT NOT NULL, leg TEXT NOT NULL, status TEXT NOT NULL, total_parts INTEGER, error TEXT, "
+            "PRIMARY KEY (sha256, leg))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parts ("
+            "sha256 TEXT NOT NULL, leg TEXT NOT NULL, part INTEGER NOT NULL, failed_chunks INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, PRIMARY KEY (sha256, leg, part))"
+        )
+        self._conn.commit()
+        logger.info(f"Document registry opened at {path}")
+
+    def _get(self, sha256: str) -> dict | None:
+        row = self._conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM documents WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        if row is None:
+            return None
+        document = dict(row)
+        document["legs"] = self._legs(sha256)
+        document["parts_stored"] = sum(leg["parts_stored"] for leg in document["legs"])
+        return document
+
+    def _legs(self, sha256: str) -> list[dict]:
+        legs = []
+        for leg in self._conn.execute(
+            "SELECT leg, status, total_parts, error FROM legs WHERE sha256 = ? ORDER BY leg", (sha256,)
+        ).fetchall():
+            stored, failed = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(failed_chunks), 0) FROM parts WHERE sha256 = ? AND leg = ?",
+                (sha256, leg["leg"]),
+            ).fetchone()
+            legs.append({**dict(leg), "parts_stored": stored, "failed_chunks": failed})
+        return legs
+
+    def _ensure(self, sha256: str, filename: str, now: float):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO documents (sha256, filename, status, created_at, updated_at) "
+            "VALUES (?, ?, 'ingesting', ?, ?)",
+            (sha256, filename, now, now),
+        )
+
+    def _settle(self, sha256: str, previous: dict | None, now: float) -> bool:
+        # Derives the document's status from its legs once every leg has an outcome (stored, failed or
+        # timed out); True when this changed the document to ingested / incomplete
+        legs = self._legs(sha256)
+        if not legs:
+            return False
+        outcomes = [leg["status"] for leg in legs]
+        failed_chunks = sum(leg["failed_chunks"] for leg in legs)
+        errors = "; ".join(
+            leg["error"] if leg["leg"] == DEFAULT_LEG else f"{leg['leg']} leg: {leg['error']}"
+            for leg in legs if leg["error"]
+        ) or None
+        if "dispatched" in outcomes:
+            status, errors = "ingesting", None
+        elif all(outcome == "failed" for outcome in outcomes):
+            status = "failed"
+        elif any(outcome != "stored" for outcome in outcomes) or failed_chunks:
+            status = "incomplete"
+        else:
+            status = "ingested"
+
+        completed = status in ("ingested", "incomplete") and (
+            previous is None or (previous["status"], previous["error"]) != (status, errors)
+        )
+        self._conn.execute(
+            "UPDATE documents SET status = ?, parts = ?, failed_chunks = ?, error = ?, updated_at = ?, "
+            "ingested_at = CASE WHEN ? THEN ? ELSE ingested_at END WHERE sha256 = ?",
+            (status, sum(leg["total_parts"] or 0 for leg in legs) or None, failed_chunks,
+             errors if status != "ingesting" else (previous or {}).get("error"), now, completed, now, sha256),
+        )
+        return completed
+
+    def get(self, sha256: str) -> dict | None:
+        with self._lock:
+            return self._get(sha256)
+
+    def claim(self, sha256: str, filename: str = None, size: int = None, force: bool = False) -> tuple[bool, dict]:
+        now = self.clock()
+        with self._lock:
+            document = self._get(sha256)
+            if document and not force:
+                in_progress = document["status"] == "ingesting" and now - document["updated_at"] < self.claim_ttl_seconds
+                if document["status"] == "ingested" or in_progress:
+                    return False, document
+
+            # A new ingestion run counts its legs and parts from zero
+            self._conn.execute("DELETE FROM parts WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM legs WHERE sha256 = ?", (sha256,))
+            self._conn.execute(
+                "INSERT INTO documents (sha256, filename, size, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'ingesting', ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET filename = excluded.filename, size = excluded.size, "
+                "status = 'ingesting', parts = NULL, failed_chunks = NULL, error = NULL, "
+                "updated_at = excluded.updated_at",
+                (sha256, filename, size, now, now),
+            )
+            self._conn.commit()
+            return True, self._get(sha256)
+
+    def set_status(self, sha256: str, status: str, filename: str = None, parts: int = None,
+                   failed_chunks: int = None, error: str = None) -> dict:
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status {status!r}, expected one of {STATUSES}")
+        if status == "ingested" and failed_chunks:
+            status = "incomplete"
+
+        now = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (sha256, filename, status, parts, failed_chunks, error, created_at, updated_at, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET status = excluded.status, "
+                "filename = COALESCE(excluded.filename, filename), parts = COALESCE(excluded.parts, parts), "
+                "failed_chunks = COALESCE(excluded.failed_chunks, failed_chunks), error = excluded.error, "
+                "updated_at = excluded.updated_at, ingested_at = COALESCE(excluded.ingested_at, ingested_at)",
+                (sha256, filename, status, parts, failed_chunks, error, now, now,
+                 now if status in ("ingested", "incomplete") else None),
+            )
+            if status == "failed":
+                # Legs still waiting for parts will not get them, parts already stored still count
+                self._conn.execute(
+                    "UPDATE legs SET status = 'failed', error = ? WHERE sha256 = ? AND status = 'dispatched'",
+                    (error, sha256),
+                )
+            self._conn.commit()
+            return self._get(sha256)
+
+    def declare_legs(self, sha256: str, legs: list[str]) -> dict:
+        # A document dispatched in several legs (a PDF split between text-parser and OCR) has an outcome
+        # only once every leg has one
+        now = self.clock()
+        with self._lock:
+            self._ensure(sha256, None, now)
+            for leg in legs:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO legs (sha256, leg, status) VALUES (?, ?, 'dispatched')", (sha256, leg)
+                )
+            self._conn.execute("UPDATE documents SET updated_at = ? WHERE sha256 = ?", (now, sha256))
+            self._conn.commit()
+            return self._get(sha256)
+
+    def set_leg_status(self, sha256: str, leg: str, status: str, error: str = None) -> dict:
+        # Only a dispatch failure is reported per leg, stored legs follow from their parts
+        if status != "failed":
+            raise ValueError(f"Unknown leg status {status!r}, expected 'failed'")
+        now = self.clock()
+        with self._lock:
+            previous = self._get(sha256)
+            self._ensure(sha256, None, now)
+            self._conn.execute(
+                "INSERT INTO legs (sha256, leg, status, error) VALUES (?, ?, 'failed', ?) "
+                "ON CONFLICT(sha256, leg) DO UPDATE SET status = CASE WHEN status = 'stored' THEN status "
+                "ELSE 'failed' END, error = CASE WHEN status = 'stored' THEN error ELSE excluded.error END",
+                (sha256, leg, error),
+            )
+            self._settle(sha256, previous, now)
+            self._conn.commit()
+            return self._get(sha256)
+
+    def record_part(self, sha256: str, part: int, total_parts: int, failed_chunks: int = 0,
+                    filename: str = None, leg: str = None) -> tuple[bool, dict]:
+        # completed is True only for the report that completes the document: duplicates and parts
+        # arriving after completion update the counts without completing it again
+        leg = leg or DEFAULT_LEG
+        now = self.clock()
+        with self._lock:
+            previous = self._get(sha256)
+            self._ensure(sha256, filename, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parts (sha256, leg, part, failed_chunks, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (sha256, leg, part, failed_chunks, now),
+            )
+            stored = self._conn.execute(
+                "SELECT COUNT(*) FROM parts WHERE sha256 = ? AND leg = ?", (sha256, leg)
+            ).fetchone()[0]
+            # A leg marked failed or timed out earlier is stored once its late parts do all arrive
+            self._conn.execute(
+                "INSERT INTO legs (sha256, leg, status, total_parts) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(sha256, leg) DO UPDATE SET total_parts = excluded.total_parts, "
+                "status = CASE WHEN excluded.status = 'stored' THEN 'stored' ELSE status END, "
+                "error = CASE WHEN excluded.status = 'stored' THEN NULL ELSE error END",
+                (sha256, leg, "stored" if stored >= total_parts else "dispatched", total_parts),
+            )
+            self._conn.execute(
+                "UPDATE documents SET filename = COALESCE(filename, ?) WHERE sha256 = ?", (filename, sha256)
+            )
+            completed = self._settle(sha256, previous, now)
+            self._conn.commit()
+            return completed, self._get(sha256)
+
+    def expire_stalled(self) -> list[str]:
+        # Documents still ingesting whose last part report is older than the timeout, a part was lost
+        # (dead-lettered, rejected) or a leg never reported, and the document would otherwise never complete
+        now = self.clock()
+        with self._lock:
+            stalled = [row[0] for row in self._conn.execute(
+                "SELECT sha256 FROM documents WHERE status = 'ingesting' AND updated_at < ? "
+                "AND EXISTS (SELECT 1 FROM legs WHERE legs.sha256 = documents.sha256)",
+                (now - self.parts_timeout_seconds,),
+            ).fetchall()]
+            for sha256 in stalled:
+                previous = self._get(sha256)
+                for leg in previous["legs"]:
+                    if leg["status"] == "dispatched":
+                        self._conn.execute(
+                            "UPDATE legs SET status = 'timed_out', error = ? WHERE sha256 = ? AND leg = ?",
+                            (f"Timed out with {leg['parts_stored']} of {leg['total_parts'] or '?'} parts stored",
+                             sha256, leg["leg"]),
+                        )
+                self._settle(sha256, previous, now)
+            self._conn.commit()
+        for sha256 in stalled:
+            logger.warning(f"Document {sha256} marked incomplete: parts stopped arriving")
+        return stalled
+
+    def put_text(self, sha256: str, pages: list[str]):
+        blob = gzip.compress(json.dumps(pages).encode("utf-8"), compresslevel=6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parsed_text (sha256, pages, created_at) VALUES (?, ?, ?)",
+                (sha256, blob, self.clock()),
+            )
+            self._conn.commit()
+
+    def get_text(self, sha256: str) -> list[str] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT pages FROM parsed_text WHERE sha256 = ?", (sha256,)).fetchone()
+        return json.loads(gzip.decompress(row["pages"])) if row else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status").fetchall())
+            texts = self._conn.execute("SELECT COUNT(*) FROM parsed_text").fetchone()[0]
+        return {"documents": counts, "parsed_texts": texts}
@@ -0,0 +1,128 @@
+from app.registry import DocumentRegistry
+
+
+def test_claim_short_circuits_known_documents(tmp_path):
+    now = [1000.0]
+    registry = DocumentRegistry(str(tmp_path / "registry.sqlite3"), claim_ttl_seconds=60, clock=lambda: now[0])
+
+    claimed, document = registry.claim("abc", "a.pdf", 10)
+    assert claimed and document["status"] == "ingesting"
+    # Same bytes uploaded again while the first upload is in flight
+    assert registry.claim("abc", "copy.pdf", 10)[0] is False
+
+    registry.set_status("abc", "ingested", parts=3, failed_chunks=0)
+    claimed, document = registry.claim("abc", "copy.pdf", 10)
+    assert not claimed and (document["status"], document["filename"], document["parts"]) == ("ingested", "a.pdf", 3)
+    assert registry.claim("abc", "copy.pdf", 10, force=True)[0] is True
+
+    # Abandoned claims expire, failed or incomplete documents can be re-ingested
+    now[0] += 61
+    assert registry.claim("abc", "a.pdf", 10)[0] is True
+    assert registry.set_status("abc", "ingested", failed_chunks=2)["status"] == "incomplete"
+    assert registry.claim("abc", "a.pdf", 10)[0] is True
+    assert registry.stats() == {"documents": {"ingesting": 1}, "parsed_texts": 0}
+
+
+def test_parsed_text_round_trip(tmp_path):
+    path = str(tmp_path / "registry.sqlite3")
+    DocumentRegistry(path).put_text("abc", ["page one", "", "page three é"])
+
+    reopened = DocumentRegistry(path)
+    assert reopened.get_text("abc") == ["page one", "", "page three é"]
+    assert reopened.get_text("missing") is None
+
+
+def make_registry(tmp_path, now):
+    return DocumentRegistry(str(tmp_path / "registry.sqlite3"), parts_timeout_seconds=600, clock=lambda: now[0])
+
+
+def test_duplicate_parts_are_counted_once(tmp_path):
+    now = [1000.0]
+    registry = make_registry(tmp_path, now)
+    registry.claim("abc", "a.pdf", 10)
+
+    assert registry.record_part("abc", 0, 2)[0] is False
+    # Redelivered report of part 0, with its failed count corrected
+    completed, document = registry.record_part("abc", 0, 2, failed_chunks=1)
+    assert not completed and document["parts_stored"] == 1 and document["status"] == "ingesting"
+
+    completed, document = registry.record_part("abc", 1, 2)
+    assert completed and (document["status"], document["failed_chunks"]) == ("incomplete", 1)
+
+
+def test_part_arriving_after_completion_does_not_complete_again(tmp_path):
+    now = [1000.0]
+    registry = make_registry(tmp_path, now)
+    registry.claim("abc", "a.pdf", 10)
+    registry.record_part("abc", 0, 2)
+    assert registry.record_part("abc", 1, 2)[0] is True
+
+    completed, document = registry.record_part("abc", 1, 2)
+    assert not completed and document["status"] == "ingested" and document["parts_stored"] == 2
+    # Nothing is left waiting for that document
+    now[0] += 3600
+    assert registry.expire_stalled() == []
+
+
+def test_lost_part_marks_the_document_incomplete_after_the_timeout(tmp_path):
+    now = [1000.0]
+    registry = make_registry(tmp_path, now)
+    registry.claim("abc", "a.pdf", 10)
+    registry.record_part("abc", 0, 3)
+    registry.record_part("abc", 2, 3)
+
+    now[0] += 599
+    assert registry.expire_stalled() == []
+    now[0] += 2
+    assert registry.expire_stalled() == ["abc"]
+    document = registry.get("abc")
+    assert (document["status"], document["error"]) == ("incomplete", "Timed out with 2 of 3 parts stored")
+    # Incomplete documents are ingested again on the next upload
+    assert registry.claim("abc", "a.pdf", 10)[0] is True
+    assert registry.get("abc")["parts_stored"] == 0
+
+
+def test_mixed_document_completes_once_both_legs_have_an_outcome(tmp_path):
+    now = [1000.0]
+    registry = make_registry(tmp_path, now)
+    registry.claim("abc", "mixed.pdf", 10)
+    registry.declare_legs("abc", ["text", "ocr"])
+
+    # Every text page stored, nothing from OCR yet
+    assert registry.record_part("abc", 0, 1, leg="text")[0] is False
+    assert registry.get("abc")["status"] == "ingesting"
+
+    completed, document = registry.record_part("abc", 0, 2, leg="ocr")
+    assert not completed
+    completed, document = registry.record_part("abc", 1, 2, leg="ocr")
+    assert completed and (document["status"], document["parts"], document["parts_stored"]) == ("ingested", 3, 3)
+
+
+def test_failed_leg_is_not_overwritten_by_the_other_legs_parts(tmp_path):
+    now = [1000.0]
+    registry = make_registry(tmp_path, now)
+    registry.claim("abc", "mixed.pdf", 10)
+    registry.declare_legs("abc", ["text", "ocr"])
+    assert registry.set_leg_status("abc", "ocr", "failed", "OCR service unavailable")["status"] == "ingesting"
+
+    completed, document = registry.record_part("abc", 0, 1, leg="text")
+    assert completed and (document["status"], document["error"]) == ("incomplete", "ocr leg: OCR service unavailable")
+
+    # Both legs failing fails the document, text parts arriving late still do not make it ingested
+    registry.claim("abc", "mixed.pdf", 10, force=True)
+    registry.declare_legs("abc", ["text", "ocr"])
+    registry.set_status("abc", "failed", error="text-parser and OCR unavailable")
+    assert registry.record_part("abc", 0, 1, leg="text")[1]["status"] == "incomplete"
+
+
+def test_silent_leg_times_out(tmp_path):
+    now = [1000.0]
+    registry = make_registry(tmp_path, now)
+    registry.claim("abc", "mixed.pdf", 10)
+    registry.declare_legs("abc", ["text", "ocr"])
+    registry.record_part("abc", 0, 1, leg="text")
+
+    now[0] += 601
+    assert registry.expire_stalled() == ["abc"]
+    document = registry.get("abc")
+    assert (document["status"], document["error"]) == ("incomplete", "ocr leg: Timed out with 0 of ? parts stored")
@@ -0,0 +1,134 @@
+# ingestion-service/chunker.py
+
+import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Iterator
+
+from shared.embedding_backends import EMBEDDING_MAX_SEQ_LENGTH, EMBEDDING_MODEL
+
+# Chunks are sized in tokens of the embedding model so none are truncated by its sequence length,
+# both follow the shared embedding settings unless overridden
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", EMBEDDING_MODEL)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", EMBEDDING_MAX_SEQ_LENGTH))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 64))
+# Text is tokenized in blocks of roughly this many characters to bound tokenizer memory
+CHUNK_TOKENIZE_BLOCK_CHARS = int(os.getenv("CHUNK_TOKENIZE_BLOCK_CHARS", 16000))
+CHUNK_TOKENIZE_BATCH_BLOCKS = int(os.getenv("CHUNK_TOKENIZE_BATCH_BLOCKS", 4))
+
+# Same priority as the previous RecursiveCharacterTextSplitter configuration
+SEPARATORS = ["\n\n", "\n", "•", "-", "|", ".", " "]
+
+
+'''
+TokenChunker: recursive separator splitting measured in model tokens
+iter_chunks: lazily yields (chunk, start_offset, end_offset) with offsets into the input text
+
+The text is tokenized once (block by block) and only token start offsets are kept, so the
+token count of any span is two bisects instead of a tokenizer call. Spans are split on the
+first separator present, separators stay at the start of the following piece, and pieces are
+merged greedily up to the budget with up to overlap_tokens carried into the next chunk.
+'''
+class TokenChunker:
+    def __init__(self, tokenizer, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 separators: list[str] = SEPARATORS):
+        self.tokenizer = tokenizer
+        # Leave room for the special tokens the model adds around every sequence
+        self.budget = max_tokens - tokenizer.num_special_tokens_to_add()
+        self.overlap = min(overlap_tokens, self.budget // 2)
+        self.separators = separators
+
+    @classmethod
+    def from_pretrained(cls, name: str = CHUNK_TOKENIZER, **kwargs) -> "TokenChunker":
+        from transformers import AutoTokenizer
+
+        return cls(AutoTokenizer.from_pretrained(name), **kwargs)
+
+    def _token_starts(self, text: str) -> array:
+        # Cut blocks on whitespace so no word is tokenized in two halves
+        bounds = []
+        block_start = 0
+        while block_start < len(text):
+            block_end = min(block_start + CHUNK_TOKENIZE_BLOCK_CHARS, len(text))
+            if block_end < len(text):
+                cut = max(text.rfind(" ", block_start, block_end), text.rfind("\n", block_start, block_end))
+                if cut > block_start:
+                    block_end = cut
+            bounds.append((block_start, block_end))
+            block_start = block_end
+
+        starts = array("I")
+        # A few blocks per call lets the fast tokenizer encode them in parallel
+        for i in range(0, len(bounds), CHUNK_TOKENIZE_BATCH_BLOCKS):
+            group = bounds[i:i + CHUNK_TOKENIZE_BATCH_BLOCKS]
+            encoded = self.tokenizer(
+                [text[start:end] for start, end in group],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                verbose=False,
+            )["offset_mapping"]
+            for (block_start, _), offsets in zip(group, encoded):
+                starts.extend(block_start + start for start, end in offsets if end > start)
+        return starts
+
+    def iter_chunks(self, text: str) -> Iterator[tuple[str, int, int]]:
+        starts = self._token_starts(text)
+
+        def count(start: int, end: int) -> int:
+            return bisect_left(starts, end) - bisect_left(starts, start)
+
+        window = deque()
+        for start, end in self._split(text, 0, len(text), self.separators, starts, count):
+            if window and count(window[0][0], end) > self.budget:
+                chunk = self._emit(text, window[0][0], window[-1][1])
+                if chunk:
+                    yield chunk
+                # Keep trailing pieces as overlap while they fit next to the new piece
+                while window and (
+                    count(window[0][0], window[-1][1]) > self.overlap or count(window[0][0], end) > self.budget
+                ):
+                    window.popleft()
+            window.append((start, end))
+
+        if window:
+            chunk = self._emit(text, window[0][0], window[-1][1])
+            if chunk:
+                yield chunk
+
+    def _split(self, text, start, end, separators, starts, count) -> Iterator[tuple[int, int]]:
+        if count(start, end) <= self.budget:
+            yield start, end
+            return
+
+        for i, separator in enumerate(separators):
+            if text.find(separator, start, end) != -1:
+                break
+        else:
+            yield from self._split_tokens(start, end, starts)
+            return
+
+        remaining = separators[i + 1:]
+        pos = start
+        while pos < end:
+            cut = text.find(separator, pos + 1, end)
+            if cut == -1:
+                cut = end
+            yield from self._split(text, pos, cut, remaining, starts, count)
+            pos = cut
+
+    def _split_tokens(self, start, end, starts) -> Iterator[tuple[int, int]]:
+        # No separator left: cut on token boundaries
+        first, last = bisect_left(starts, start), bisect_left(starts, end)
+        for i in range(first, last, self.budget):
+            yield (start if i == first else starts[i]), (end if i + self.budget >= last else starts[i + self.budget])
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start == end:
+            return None
+        return text[start:end], start, end
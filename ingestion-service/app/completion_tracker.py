@@ -0,0 +1,62 @@
+# ingestion-service/completion_tracker.py
+
+import asyncio
+import json
+import os
+import aio_pika
+from loguru import logger
+
+# Every stored document part reports here (single-active-consumer as the queue was first declared,
+# the counting itself is idempotent in the registry)
+PARTS_QUEUE = "ingest_parts_queue"
+# Unacked part reports per consumer, on a channel of their own
+PARTS_PREFETCH_COUNT = int(os.getenv("PARTS_PREFETCH_COUNT", 32))
+# Pause before a report is handed back to the broker while the registry is unreachable
+PART_RETRY_SECONDS = float(os.getenv("PART_RETRY_SECONDS", 5))
+
+
+'''
+CompletionTracker: marks a document fully ingested once every part has been stored
+process_part_message: records one part report with record_part and acks it right away
+record_part: async callback(data) -> {"completed", "document"} keeping the per-document count durably
+             (the db-service registry), None when completion is not tracked
+
+Nothing is held in memory: a duplicate or late report is counted once by the registry, and a document
+whose parts stop arriving (a part was dead-lettered) is marked incomplete there after a timeout.
+A report the registry could not take is requeued after PART_RETRY_SECONDS.
+'''
+class CompletionTracker:
+    def __init__(self, record_part=None):
+        self.record_part = record_part
+
+    async def process_part_message(self, message: aio_pika.IncomingMessage):
+        try:
+            data = json.loads(message.body.decode())
+            doc_id = data["doc_id"]
+        except (ValueError, KeyError) as e:
+            logger.error(f"Invalid part report, dropped: {e}")
+            await message.reject()
+            return
+
+        try:
+            outcome = await self.record_part(data) if self.record_part else None
+        except Exception as e:
+            logger.error(f"Could not record part {data.get('part')} of document {doc_id}, retrying: {e}")
+            await asyncio.sleep(PART_RETRY_SECONDS)
+            await message.nack(requeue=True)
+            return
+        await message.ack()
+
+        if outcome is None:
+            return
+        document = outcome["document"]
+        if not outcome["completed"]:
+            logger.info(f"Document {doc_id}: {document['parts_stored']}/{document['parts']} parts stored")
+        elif document["status"] == "incomplete":
+            # Failed chunks, or a leg of a PDF split between text-parser and OCR that failed / timed out
+            logger.warning(
+                f"Document {doc_id} ({document['filename']}) incomplete: {document['failed_chunks']} failed chunks"
+                f"{', ' + document['error'] if document['error'] else ''}"
+            )
+        else:
+            logger.success(f"Document {doc_id} ({document['filename']}) fully ingested in {document['parts']} parts")
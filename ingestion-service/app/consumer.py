@@ -2,55 +2,97 @@
 
 import aio_pika
 import asyncio
+import gzip
+import hashlib
+import io
 import json
+from contextlib import closing
 from loguru import logger
 import os
 import signal
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from embedding_store import embed_and_store, ensure_schema  
+from chunker import TokenChunker
+from normalizer import TextNormalizer, normalize_text
+from shared.blob_store import blob_store_for
+from completion_tracker import PARTS_PREFETCH_COUNT, PARTS_QUEUE, CompletionTracker
+from registry import record_part
+from embedding_store import embed_and_store, ensure_schema, inference_executor
 
 RABBITMQ_URL = os.getenv("RABBITMQ_URL")
 
+# Prefetch bounds the unacked deliveries per consumer, concurrency bounds the handlers running at once.
+# Keeping prefetch close to concurrency leaves the rest of the backlog to other replicas.
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", 4))
+RAG_PREFETCH_COUNT = int(os.getenv("RAG_PREFETCH_COUNT", RAG_MAX_CONCURRENCY))
+USER_MESSAGE_MAX_CONCURRENCY = int(os.getenv("USER_MESSAGE_MAX_CONCURRENCY", 16))
+USER_MESSAGE_PREFETCH_COUNT = int(os.getenv("USER_MESSAGE_PREFETCH_COUNT", USER_MESSAGE_MAX_CONCURRENCY))
+
+# Fanout exchange announcing stored chunks (rag-service invalidates cached answers with them).
+# Parts with more chunks than INGESTION_EVENT_MAX_VECTORS are announced without vectors, which flushes the caches.
+INGESTION_EVENTS_EXCHANGE = "ingestion_events"
+INGESTION_EVENT_MAX_VECTORS = int(os.getenv("INGESTION_EVENT_MAX_VECTORS", 256))
+
+# Topic exchange for ingestion job progress (routing key job.<job_id>.<stage>), only for parts carrying a job_id
+INGESTION_PROGRESS_EXCHANGE = "ingestion_progress"
+
 # Text Processing Logic
 
 def clean_text(text: str) -> str:
-    # Replace fancy bullets and pipes with clearer separators
-    # text = text.replace("•", "•")
-    # text = text.replace("-", "-")
-    text = text.replace("|", "\n")  # separates inline details into rows
-    return ' '.join(text.split())
+    # Keeps paragraph and line breaks so the chunker splits on "\n\n" / "\n" first,
+    # pipes still separate inline details into rows
+    return normalize_text(text)
 
-def chunk_text_with_langchain(text: str, chunk_size=500, chunk_overlap=100):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", "•", "-", "|", ".", " "]
-    )
-    return splitter.split_text(text)
+# Claim-checked texts are streamed from the blob store in pieces of this many characters
+BLOB_READ_CHARS = int(os.getenv("BLOB_READ_CHARS", 64 * 1024))
+
+def load_claim_checked_text(ref: str) -> str:
+    # Decompress and normalize the blob piece by piece instead of materializing the raw text first
+    normalizer = TextNormalizer()
+    pieces = []
+    with closing(blob_store_for(ref).open(ref)) as raw, gzip.GzipFile(fileobj=raw) as unzipped:
+        reader = io.TextIOWrapper(unzipped, encoding="utf-8")
+        while piece := reader.read(BLOB_READ_CHARS):
+            pieces.append(normalizer.feed(piece))
+    pieces.append(normalizer.finish())
+    return "".join(pieces)
+
+# Token-sized chunker built once from the embedding model's tokenizer, its chunks are embedded as they are yielded
+chunker = TokenChunker.from_pretrained()
 
 
 # Rabbit MQ Logic
 
 '''
-connect: Establish a robust connection and channel
-setup_queues: Declare rag_queue with TTL and dead-letter exchange
-process_message: 
-start_consuming: Consume messages by pass process_message which includes business logic
+connect: Establish a robust connection, a channel for the document queues and one for part reports
+setup_queues: Declare rag_queue with TTL and dead-letter exchange, the parts queue for completion tracking and the events exchange
+process_message: Runs under the queue's concurrency limit, doc messages also wait for embedding capacity
+publish_chunks_stored: Announces stored chunks on the ingestion events exchange
+publish_progress: Reports a part's chunked / embedded / stored / failed stage to its ingestion job
+start_consuming: Set per-consumer prefetch, then consume messages by pass process_message which includes business logic
 shutdown: Handles shutdown
 '''
 class AsyncRabbitMQConsumer:
     def __init__(self):
         self.connection = None
         self.channel = None
+        self.parts_channel = None
         self.rag_queue = None
         self.user_message_queue = None
+        self.parts_queue = None
         self.dlq_queue = None
+        self.events_exchange = None
+        self.progress_exchange = None
         self.running = True
+        self.rag_slots = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+        self.user_message_slots = asyncio.Semaphore(USER_MESSAGE_MAX_CONCURRENCY)
+        # Stored parts are counted in the db-service registry, complete documents are skipped on re-upload
+        self.tracker = CompletionTracker(record_part=record_part)
 
     async def connect(self):
         # Establish a connection and channel
         self.connection = await aio_pika.connect_robust(RABBITMQ_URL)
         self.channel = await self.connection.channel()
+        # Part reports get their own channel: their acks and prefetch never interfere with rag_queue
+        self.parts_channel = await self.connection.channel()
         logger.success("Connected to RabbitMQ")
 
         # Ensure Weaviate schema is ready before consuming
@@ -87,35 +129,145 @@ class AsyncRabbitMQConsumer:
             }
         )
 
+        # Declare ingest_parts_queue (arguments as first declared), consumed on the parts channel
+        self.parts_queue = await self.parts_channel.declare_queue(
+            PARTS_QUEUE,
+            durable=True,
+            arguments={"x-single-active-consumer": True},
+        )
+
+        # Declare ingestion_events, subscribers bind their own queues
+        self.events_exchange = await self.channel.declare_exchange(
+            INGESTION_EVENTS_EXCHANGE, aio_pika.ExchangeType.FANOUT, durable=True
+        )
+
+        # Declare ingestion_progress, api-service follows its jobs there
+        self.progress_exchange = await self.channel.declare_exchange(
+            INGESTION_PROGRESS_EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True
+        )
+
         logger.info("Queues and DLX/DLQ set up")
 
     async def process_doc_message(self, message: aio_pika.IncomingMessage):
-        async with message.process():
-            body = message.body.decode()
-            data = json.loads(body)
-            logger.success("Received document from text-parser")
+        async with self.rag_slots:
+            # Backpressure: while the embedding queue is full the message stays unacked,
+            # the prefetch window fills up and the broker routes new documents to other replicas
+            await inference_executor.wait_for_capacity()
+
+            async with message.process():
+                body = message.body.decode()
+                data = json.loads(body)
+                blob_ref = data.get("blob_ref")
+                part, total_parts = data.get("part", 0), data.get("total_parts", 1)
+                logger.success(
+                    f"Received part {part + 1}/{total_parts} of {data.get('source')} from text-parser"
+                    f"{' (claim check ' + blob_ref + ')' if blob_ref else ''}"
+                )
+
+                progress = {"job_id": data.get("job_id"), "file": data.get("source"), "file_index": data.get("file_index"),
+                            "doc_id": data.get("doc_id"), "leg": data.get("leg"), "part": part, "total_parts": total_parts}
+
+                try:
+                    if blob_ref:
+                        cleaned_text = await asyncio.to_thread(load_claim_checked_text, blob_ref)
+                    else:
+                        cleaned_text = await asyncio.to_thread(clean_text, data["text"])
+
+                    # Older publishers do not send a doc_id, fall back to the hash of the payload text as published
+                    # (not the cleaned text), so re-processed legacy messages keep their chunk UUIDs
+                    fallback_text = data["text"] if data.get("text") is not None else cleaned_text
+                    doc_id = data.get("doc_id") or hashlib.sha256(fallback_text.encode("utf-8")).hexdigest()
+                    progress["doc_id"] = doc_id
+                    stored, failed = await embed_and_store(
+                        chunker.iter_chunks(cleaned_text), doc_id, part,
+                        on_chunked=lambda count: self.publish_progress(progress, "chunked", chunks=count),
+                        on_embedded=lambda: self.publish_progress(progress, "embedded"),
+                    )
+                except Exception as e:
+                    await self.publish_progress(progress, "failed", error=f"part {part}: {e}")
+                    raise
+                await self.publish_progress(progress, "stored", stored=len(stored), failed=len(failed))
+                if stored:
+                    await self.publish_chunks_stored(doc_id, part, stored)
 
-            cleaned_text = clean_text(data["text"])
-            chunks = chunk_text_with_langchain(cleaned_text)
-            logger.info(f"Total chunks created: {len(chunks)}")
+                # The blob is only needed until every chunk is stored, keep it for reprocessing otherwise
+                if blob_ref:
+                    if failed:
+                        logger.warning(f"Keeping claim check {blob_ref}: {len(failed)} chunks failed")
+                    else:
+                        await asyncio.to_thread(blob_store_for(blob_ref).delete, blob_ref)
 
-            for i, chunk in enumerate(chunks[:2]):
-                logger.debug(f"Chunk {i + 1}: {chunk}")
+                # Report the stored part to the completion tracker before this message is acked
+                await self.channel.default_exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(
+                            {
+                                "doc_id": doc_id,
+                                "source": data.get("source"),
+                                "part": part,
+                                "total_parts": total_parts,
+                                "failed": len(failed),
+                                "leg": data.get("leg"),
+                            }
+                        ).encode(),
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    ),
+                    routing_key=PARTS_QUEUE,
+                )
 
-            await embed_and_store(chunks)
+    async def publish_chunks_stored(self, doc_id: str, part: int, stored: list[dict]):
+        ship_vectors = len(stored) <= INGESTION_EVENT_MAX_VECTORS
+        event = {
+            "type": "chunks_stored",
+            "doc_id": doc_id,
+            "part": part,
+            "ids": [obj["id"] for obj in stored] if ship_vectors else None,
+            "vectors": [obj["vector"] for obj in stored] if ship_vectors else None,
+        }
+        # Best effort: a lost event only leaves caches stale until their TTL, it must not fail the ingestion
+        try:
+            await self.events_exchange.publish(aio_pika.Message(body=json.dumps(event).encode()), routing_key="")
+        except Exception as e:
+            logger.error(f"Failed to publish ingestion event for {doc_id} part {part}: {e}")
+
+    async def publish_progress(self, progress: dict, stage: str, **fields):
+        if not progress.get("job_id"):
+            return
+        event = {**progress, "stage": stage, **fields}
+        # Best effort, like the ingestion events: progress reporting must not fail the ingestion
+        try:
+            await self.progress_exchange.publish(
+                aio_pika.Message(body=json.dumps(event).encode()),
+                routing_key=f"job.{event['job_id']}.{stage}",
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish {stage} progress for job {event['job_id']}: {e}")
 
     async def process_user_message(self, message: aio_pika.IncomingMessage):
-        async with message.process():
-            body = message.body.decode()
-            data = json.loads(body)
-            logger.success(f"Received user message: {data}")
-            logger.info(f"User message received: {data['text']}")
+        async with self.user_message_slots:
+            async with message.process():
+                body = message.body.decode()
+                data = json.loads(body)
+                logger.success(f"Received user message: {data}")
+                logger.info(f"User message received: {data['text']}")
 
     async def start_consuming(self):
+        # basic.qos without global applies to consumers started afterwards, so each queue gets its own prefetch
+        await self.channel.set_qos(prefetch_count=RAG_PREFETCH_COUNT)
         await self.rag_queue.consume(self.process_doc_message)
+
+        await self.channel.set_qos(prefetch_count=USER_MESSAGE_PREFETCH_COUNT)
         await self.user_message_queue.consume(self.process_user_message)
+
+        # Part reports are acked as soon as the registry has them
+        await self.parts_channel.set_qos(prefetch_count=PARTS_PREFETCH_COUNT)
+        await self.parts_queue.consume(self.tracker.process_part_message)
         # await self.dlq_queue.consume(self.process_dlq_message)
-        logger.info("Started consuming rag_queue and user_message_queue")
+        logger.info(
+            f"Started consuming rag_queue (prefetch={RAG_PREFETCH_COUNT}, concurrency={RAG_MAX_CONCURRENCY}), "
+            f"user_message_queue (prefetch={USER_MESSAGE_PREFETCH_COUNT}, concurrency={USER_MESSAGE_MAX_CONCURRENCY}) "
+            f"and {PARTS_QUEUE}"
+        )
 
     async def shutdown(self):
         self.running = False
@@ -125,6 +277,8 @@ class AsyncRabbitMQConsumer:
             await self.connection.close()
             logger.success("RabbitMQ connection closed")
 
+        await asyncio.to_thread(inference_executor.shutdown)
+
     async def run(self):
         await self.connect()
         await self.setup_queues()
@@ -0,0 +1,85 @@
+# ingestion-service/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from loguru import logger
+
+# Local SQLite file holding chunk-hash -> vector, set to an empty string to disable the cache
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/data/embedding_cache.sqlite3")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+'''
+EmbeddingCache: persistent content-addressed vector cache
+get_many: returns {chunk_hash: vector} for the hashes already embedded by this model
+put_many: stores new vectors, existing entries are kept
+Vectors are stored as float32 blobs. Calls are blocking, run them with asyncio.to_thread.
+'''
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if not path:
+            logger.info("Embedding cache disabled")
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, chunk_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, chunk_hash))"
+            )
+            self._conn.commit()
+            logger.info(f"Embedding cache opened at {path}")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open embedding cache at {path}, continuing without it: {e}")
+            self._conn = None
+
+    def get_many(self, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        if self._conn is None or not hashes:
+            self.misses += len(hashes)
+            return found
+
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT chunk_hash, vector FROM embeddings WHERE model = ? AND chunk_hash IN ({','.join('?' * len(part))})",
+                    [self.model_name, *part],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+        self.hits += sum(1 for h in hashes if h in found)
+        self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, entries: dict[str, list[float]]):
+        if self._conn is None or not entries:
+            return
+
+        rows = [(self.model_name, key, array("f", vector).tobytes()) for key, vector in entries.items()]
+        with self._lock:
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)", rows)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(rows)} vectors to embedding cache: {e}")
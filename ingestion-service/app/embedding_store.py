@@ -1,17 +1,40 @@
 # ingestion-service/embedding_store.py
 
 import weaviate
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.docstore.document import Document
 from loguru import logger
+import asyncio
 import os
+import threading
+import uuid
+from itertools import islice
+from typing import Iterable
+from shared.embedding_backends import EMBEDDING_BACKEND, EMBEDDING_MODEL, load_embeddings
+from embedding_cache import EMBEDDING_CACHE_PATH, EmbeddingCache, chunk_hash
+from inference import InferenceExecutor
+from micro_batcher import EMBED_BATCH_MAX_SIZE, EmbeddingBatcher
 
-# Initialize HuggingFace embeddings
+# Initialize embeddings (EMBEDDING_BACKEND selects PyTorch or ONNX Runtime, see embedding_backends.py)
 # embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+embeddings = load_embeddings()
+
+# Chunk-hash -> vector cache so re-uploaded content is not embedded twice
+# Keyed per backend too, int8 vectors are close to but not the same as fp32 ones
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}")
+
+# Model forward passes run here so the consumer event loop keeps servicing AMQP
+inference_executor = InferenceExecutor()
+
+# Chunks from concurrently processed messages share embedding calls
+embedding_batcher = EmbeddingBatcher(lambda texts: inference_executor.run(embeddings.embed_documents, texts))
 
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
 
+# Batch import settings (dynamic sizing lets the client adapt batch_size to server latency)
+WEAVIATE_BATCH_SIZE = int(os.getenv("WEAVIATE_BATCH_SIZE", 100))
+WEAVIATE_BATCH_DYNAMIC = os.getenv("WEAVIATE_BATCH_DYNAMIC", "true").lower() == "true"
+WEAVIATE_BATCH_WORKERS = int(os.getenv("WEAVIATE_BATCH_WORKERS", 2))
+
 # Connect to Weaviate instance running locally
 client = weaviate.Client(
     url=WEAVIATE_URL,  
@@ -20,6 +43,12 @@ client = weaviate.Client(
 # Define Weaviate class name for documents
 DOCUMENT_CLASS = "DocumentChunk"
 
+# Namespace for deterministic chunk UUIDs, redeliveries and re-uploads overwrite the same objects
+CHUNK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, f"documind/{DOCUMENT_CLASS}")
+
+# client.batch is shared state, only one import may configure and use it at a time
+_batch_lock = threading.Lock()
+
 # Checks if the required Weaviate collection exists; creates it if missing to ensure proper schema setup.
 def ensure_schema():
     try:
@@ -32,6 +61,10 @@ def ensure_schema():
                 "vectorizer": "none",  # We provide embeddings ourselves
                 "properties": [
                     {"name": "content", "dataType": ["text"]},
+                    {"name": "doc_id", "dataType": ["text"]},
+                    {"name": "part", "dataType": ["int"]},
+                    {"name": "start_offset", "dataType": ["int"]},
+                    {"name": "end_offset", "dataType": ["int"]},
                 ],
             }
             client.schema.create_class(class_obj)
@@ -41,34 +74,135 @@ def ensure_schema():
     except Exception as e:
         logger.error(f"Failed to ensure schema: {e}")
 
-async def embed_and_store(chunks: list[str]):
+def chunk_uuid(doc_id: str, content_hash: str) -> str:
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{doc_id}:{content_hash}"))
+
+# Imports chunks through the Weaviate batch API and returns the objects that failed.
+# Each failure is reported on its own so one bad chunk neither aborts nor silently drops the document.
+# objects: [{"uuid": str, "properties": dict, "vector": list[float]}], an existing uuid is overwritten (upsert).
+def store_chunks_batched(objects: list[dict]) -> list[dict]:
+    failed = []
+
+    def collect_errors(results):
+        for result in results or []:
+            errors = (result.get("result") or {}).get("errors")
+            if errors:
+                failed.append(
+                    {
+                        "id": result.get("id"),
+                        "content": result.get("properties", {}).get("content", ""),
+                        "errors": [err.get("message") for err in errors.get("error", [])],
+                    }
+                )
+
+    with _batch_lock:
+        client.batch.configure(
+            batch_size=WEAVIATE_BATCH_SIZE,
+            dynamic=WEAVIATE_BATCH_DYNAMIC,
+            num_workers=WEAVIATE_BATCH_WORKERS,
+            callback=collect_errors,
+        )
+
+        with client.batch as batch:
+            for obj in objects:
+                batch.add_data_object(
+                    data_object=obj["properties"],
+                    class_name=DOCUMENT_CLASS,
+                    uuid=obj.get("uuid"),
+                    vector=obj["vector"],
+                )
+
+    return failed
+
+# Returns vectors for texts, embedding only the ones missing from the cache
+async def embed_with_cache(texts: list[str], hashes: list[str]) -> list[list[float]]:
+    cached = await asyncio.to_thread(embedding_cache.get_many, hashes)
+
+    missing = list({h: text for h, text in zip(hashes, texts) if h not in cached}.items())
+    if missing:
+        new_vectors = await embedding_batcher.embed([text for _, text in missing])
+        computed = {h: vector for (h, _), vector in zip(missing, new_vectors)}
+        await asyncio.to_thread(embedding_cache.put_many, computed)
+        cached.update(computed)
+
+    logger.info(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} chunks reused")
+    return [cached[h] for h in hashes]
+
+# chunks: (content, start_offset, end_offset) as lazily yielded by the chunker, offsets are within the part.
+# They are pulled in embedding-batch slices (in a thread) and each slice is embedded while the next is chunked.
+# Returns (stored, failed): stored is [{"id", "vector"}] for the chunks now in Weaviate, failed as from store_chunks_batched
+# on_chunked: optional async callback(count) run once the chunker is exhausted; chunker errors are raised
+# on_embedded: optional async callback run once the vectors are computed, before they are stored
+async def embed_and_store(
+    chunks: Iterable[tuple[str, int, int]], doc_id: str, part: int = 0, on_chunked=None, on_embedded=None
+) -> tuple[list[dict], list[dict]]:
+    # Identical chunks within a document collapse to one object, in the order they were first yielded
+    docs, pending, count = {}, [], 0
+    chunks = iter(chunks)
     try:
-        if not chunks:
-            logger.warning("No chunks to embed. Skipping embedding step.")
-            return
+        while batch := await asyncio.to_thread(lambda: list(islice(chunks, EMBED_BATCH_MAX_SIZE))):
+            new = {}
+            for chunk, start, end in batch:
+                if count < 2:
+                    logger.debug(f"Chunk {count + 1} [{start}:{end}]: {chunk}")
+                count += 1
+                h = chunk_hash(chunk)
+                if h not in docs:
+                    docs[h] = new[h] = Document(
+                        page_content=chunk,
+                        metadata={"doc_id": doc_id, "part": part, "start_offset": start, "end_offset": end},
+                    )
+            if new:
+                # Batched with chunks from other in-flight messages
+                pending.append(asyncio.ensure_future(
+                    embed_with_cache([doc.page_content for doc in new.values()], list(new))
+                ))
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise
 
-        # Create Document objects
-        docs = [Document(page_content=chunk) for chunk in chunks]
+    logger.info(f"Total chunks created: {count}")
+    if on_chunked:
+        await on_chunked(count)
 
-        # Get embeddings for all chunks
-        vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    try:
+        if not docs:
+            logger.warning("No chunks to embed. Skipping embedding step.")
+            return [], []
+
+        try:
+            vectors = [vector for vectors in await asyncio.gather(*pending) for vector in vectors]
+        finally:
+            for task in pending:
+                task.cancel()
 
-        for i, (doc, vector) in enumerate(zip(docs, vectors)):
+        for i, vector in enumerate(vectors[:2]):
             logger.debug(f"Embedding chunk {i+1}: len={len(vector)}, preview={vector[:5]}")
 
-            # Prepare the object data with chunk content
-            obj = {
-                "content": doc.page_content,
+        if on_embedded:
+            await on_embedded()
+
+        # Add the objects with own vectors to Weaviate in batches, keyed by document and content
+        objects = [
+            {
+                "uuid": chunk_uuid(doc_id, h),
+                "properties": {"content": doc.page_content, **doc.metadata},
+                "vector": vector,
             }
+            for (h, doc), vector in zip(docs.items(), vectors)
+        ]
+        failed = await asyncio.to_thread(store_chunks_batched, objects)
+
+        for obj in failed:
+            logger.error(f"Failed to store chunk {obj['id']}: {obj['errors']}")
 
-            # Add the object with own vector to Weaviate
-            client.data_object.create(
-                data_object=obj,
-                class_name=DOCUMENT_CLASS,
-                vector=vector,
-            )
+        failed_ids = {obj["id"] for obj in failed}
+        stored = [{"id": obj["uuid"], "vector": obj["vector"]} for obj in objects if obj["uuid"] not in failed_ids]
 
-        logger.success(f"Stored {len(docs)} chunks in Weaviate vector DB")
+        logger.success(f"Stored {len(stored)}/{len(objects)} chunks of {doc_id} in Weaviate vector DB")
+        return stored, failed
 
     except Exception as e:
         logger.error(f"Embedding and storing failed: {e}")
+        return [], [{"id": None, "content": doc.page_content, "errors": [str(e)]} for doc in docs.values()]
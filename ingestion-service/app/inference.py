@@ -0,0 +1,72 @@
+# ingestion-service/inference.py
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+# Worker threads running model forward passes (torch releases the GIL during inference)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 1))
+# Maximum number of inference jobs queued or running before callers have to wait
+EMBEDDING_MAX_PENDING = int(os.getenv("EMBEDDING_MAX_PENDING", 4))
+# Intra-op threads for torch, defaults to every core this process is allowed to run on
+EMBEDDING_TORCH_THREADS = int(os.getenv("EMBEDDING_TORCH_THREADS", len(os.sched_getaffinity(0))))
+
+
+'''
+InferenceExecutor: runs blocking model calls on a dedicated thread pool
+run: awaits a blocking call, waiting for a free slot once max_pending jobs are queued
+depth: number of jobs waiting for a slot, queued or running
+wait_for_capacity: lets consumers hold off new work while the queue is full
+shutdown: waits for running jobs and stops the pool
+'''
+class InferenceExecutor:
+    def __init__(self, max_workers: int = EMBEDDING_WORKERS, max_pending: int = EMBEDDING_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._slots = None
+        self._capacity = None
+        self.depth = 0
+
+        try:
+            import torch
+
+            # Split the cores between workers so concurrent forward passes do not oversubscribe the CPU
+            torch.set_num_threads(max(1, EMBEDDING_TORCH_THREADS // max_workers))
+            logger.info(f"Inference executor: workers={max_workers}, torch threads/worker={torch.get_num_threads()}")
+        except ImportError:
+            logger.warning("torch not available, leaving inference thread settings untouched")
+
+    @property
+    def saturated(self) -> bool:
+        return self.depth >= self.max_pending
+
+    def _ensure_primitives(self):
+        # Created lazily so they bind to the running consumer loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._capacity = asyncio.Condition()
+
+    async def wait_for_capacity(self):
+        self._ensure_primitives()
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: not self.saturated)
+
+    async def run(self, fn, *args, **kwargs):
+        self._ensure_primitives()
+
+        self.depth += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.depth -= 1
+            async with self._capacity:
+                self._capacity.notify_all()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        logger.info("Inference executor stopped")
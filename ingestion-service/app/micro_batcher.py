@@ -0,0 +1,121 @@
+# ingestion-service/micro_batcher.py
+
+import asyncio
+import os
+from loguru import logger
+
+# Upper bound on chunks per embedding call and on how long a chunk may wait for others to join it
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 64))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 50))
+# Log the batch-size distribution every N batches, 0 disables the report
+EMBED_BATCH_REPORT_EVERY = int(os.getenv("EMBED_BATCH_REPORT_EVERY", 100))
+
+
+'''
+BatchSizeHistogram: counts achieved batch sizes in power-of-two buckets
+observe: records one batch
+snapshot: returns bucket counts plus totals, used as the batch-size metric
+'''
+class BatchSizeHistogram:
+    def __init__(self, max_size: int):
+        self.bounds = []
+        bound = 1
+        while bound < max_size:
+            self.bounds.append(bound)
+            bound *= 2
+        self.bounds.append(max_size)
+        self.counts = [0] * len(self.bounds)
+        self.batches = 0
+        self.items = 0
+
+    def observe(self, size: int):
+        self.batches += 1
+        self.items += size
+        for i, bound in enumerate(self.bounds):
+            if size <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean": round(self.items / self.batches, 2) if self.batches else 0,
+            "buckets": {f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)},
+        }
+
+
+'''
+EmbeddingBatcher: gathers chunks from several messages into one embedding call
+embed: queues texts and resolves with their vectors once the batch they joined has run
+A batch is flushed when it reaches max_batch_size or when its oldest texts have waited max_wait_ms.
+'''
+class EmbeddingBatcher:
+    def __init__(self, embed_fn, max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.embed_fn = embed_fn  # async callable: list[str] -> list[vector]
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.histogram = BatchSizeHistogram(max_batch_size)
+        self._pending = []  # (texts, future)
+        self._pending_size = 0
+        self._timer = None
+        self._tasks = set()
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+
+        # Requests bigger than one batch are split so every call respects max_batch_size
+        if len(texts) > self.max_batch_size:
+            parts = await asyncio.gather(
+                *(self.embed(texts[i:i + self.max_batch_size]) for i in range(0, len(texts), self.max_batch_size))
+            )
+            return [vector for part in parts for vector in part]
+
+        loop = asyncio.get_running_loop()
+        if self._pending_size + len(texts) > self.max_batch_size:
+            self._flush()
+
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_size += len(texts)
+
+        if self._pending_size >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        pending, self._pending, self._pending_size = self._pending, [], 0
+        task = asyncio.create_task(self._run_batch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, pending):
+        texts = [text for group, _ in pending for text in group]
+        self.histogram.observe(len(texts))
+        if EMBED_BATCH_REPORT_EVERY > 0 and self.histogram.batches % EMBED_BATCH_REPORT_EVERY == 0:
+            logger.info(f"Embedding batch sizes: {self.histogram.snapshot()}")
+
+        try:
+            vectors = await self.embed_fn(texts)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for group, future in pending:
+            if not future.done():
+                future.set_result(vectors[offset:offset + len(group)])
+            offset += len(group)
@@ -0,0 +1,98 @@
+# ingestion-service/normalizer.py
+
+import re
+
+# Typographic ligatures and invisible characters left behind by PDF text extraction
+LIGATURES = {
+    "\ufb00": "ff",
+    "\ufb01": "fi",
+    "\ufb02": "fl",
+    "\ufb03": "ffi",
+    "\ufb04": "ffl",
+    "\ufb05": "st",
+    "\ufb06": "st",
+    "\u00ad": "",  # soft hyphen
+    "\u200b": "",  # zero-width space
+    "\ufeff": "",  # byte order mark
+}
+
+# One alternation so the text is scanned once:
+#   hyphen: word broken across a line ("exam-\nple"), joined when the next line continues in lowercase
+#   lig:    ligature or invisible character
+#   space:  run of whitespace and pipes, pipes count as line breaks (inline details become rows)
+PATTERN = re.compile(
+    r"(?P<hyphen>(?<=[^\W\d_])-[ \t]*\r?\n[ \t]*(?=[a-z]))"
+    rf"|(?P<lig>[{''.join(LIGATURES)}])"
+    r"|(?P<space>[\s|]+)"
+)
+
+# Characters that may still grow into a whitespace run or a broken hyphenation
+OPEN_TAIL = "|-"
+
+
+'''
+TextNormalizer: single-pass, linear-time cleanup that keeps document structure
+feed: normalizes a piece of a text stream, returns the part that is final
+finish: flushes what feed held back
+
+Paragraph breaks stay "\n\n", line breaks stay "\n", other whitespace collapses to one space.
+feed holds back the tail from the last solid character on, since a whitespace run or a
+hyphenation may continue in the next piece.
+'''
+class TextNormalizer:
+    def __init__(self):
+        self._carry = ""
+        self._at_start = True
+
+    def feed(self, piece: str) -> str:
+        text = self._carry + piece
+        cut = len(text)
+        while cut > 0 and (text[cut - 1].isspace() or text[cut - 1] in OPEN_TAIL):
+            cut -= 1
+        # Hold back the last solid character too, it is the lookbehind of a hyphenation in the next piece
+        cut = max(cut - 1, 0)
+        self._carry = text[cut:]
+        return self._normalize(text, cut)
+
+    def finish(self) -> str:
+        text, self._carry = self._carry, ""
+        return self._normalize(text, len(text), final=True)
+
+    def _normalize(self, text: str, cut: int, final: bool = False) -> str:
+        out = []
+        pos = 0
+        started = not self._at_start
+        for match in PATTERN.finditer(text):
+            if match.start() >= cut:
+                break
+            if match.start() > pos:
+                out.append(text[pos:match.start()])
+                started = True
+            pos = match.end()
+
+            kind = match.lastgroup
+            if kind == "lig":
+                out.append(LIGATURES[match.group()])
+                started = started or bool(out[-1])
+            elif kind == "space":
+                if not started:
+                    # Leading whitespace of the document
+                    continue
+                if final and pos == len(text):
+                    # Trailing whitespace of the document
+                    continue
+                run = match.group()
+                breaks = run.count("\n") or ("|" in run)
+                out.append("\n\n" if breaks > 1 else "\n" if breaks else " ")
+            # hyphen: dropped, the two halves of the word join
+
+        if cut > pos:
+            out.append(text[pos:cut])
+            started = True
+        self._at_start = not started
+        return "".join(out)
+
+
+def normalize_text(text: str) -> str:
+    normalizer = TextNormalizer()
+    return normalizer.feed(text) + normalizer.finish()
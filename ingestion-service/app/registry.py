@@ -0,0 +1,30 @@
+# ingestion-service/registry.py
+
+import os
+import httpx
+
+# db-service document registry, unset disables completion tracking
+DB_SERVICE_URL = os.getenv("DB_SERVICE_URL")
+REGISTRY_TIMEOUT = float(os.getenv("REGISTRY_TIMEOUT", 5))
+
+_client = None
+
+
+async def record_part(data: dict) -> dict | None:
+    # CompletionTracker: counts one stored part in the registry, doc_id is the sha256 of the uploaded file
+    # and leg the share of its pages this part belongs to ("text" / "ocr" for a PDF split between both).
+    # Returns {"completed", "document"}, None without a registry; raises when the registry is unreachable
+    # so the report is redelivered rather than lost.
+    global _client
+    if not DB_SERVICE_URL:
+        return None
+    if _client is None:
+        _client = httpx.AsyncClient(base_url=DB_SERVICE_URL, timeout=REGISTRY_TIMEOUT)
+    response = await _client.post(
+        f"/documents/{data['doc_id']}/parts",
+        json={"part": data["part"], "total_parts": data["total_parts"],
+              "failed_chunks": data.get("failed", 0), "filename": data.get("source"),
+              "leg": data.get("leg")},
+    )
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,121 @@
+# ingestion-service/benchmarks/bench_batch_import.py
+
+'''
+Compares per-object inserts against the batch import path in embedding_store.
+
+A small HTTP server stands in for Weaviate (meta, readiness, objects and batch
+endpoints) and sleeps for --latency-ms on every request to mimic a network round trip.
+
+Usage (from ingestion-service/):
+    python benchmarks/bench_batch_import.py --objects 2000 --latency-ms 2
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WeaviateStandIn(BaseHTTPRequestHandler):
+    latency = 0.0
+    stored = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/meta"):
+            self._reply(200, {"version": "1.31.0", "modules": {}})
+        elif self.path.startswith("/v1/.well-known/ready"):
+            self._reply(200)
+        elif self.path.startswith("/v1/schema"):
+            self._reply(200, {"classes": []})
+        elif self.path.startswith("/v1/nodes"):
+            node = {"name": "stand-in", "status": "HEALTHY", "stats": {"objectCount": self.stored, "shardCount": 1}}
+            self._reply(200, {"nodes": [node]})
+        else:
+            self._reply(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+
+        if self.path.startswith("/v1/batch/objects"):
+            objects = payload.get("objects", [])
+            with self.lock:
+                WeaviateStandIn.stored += len(objects)
+            self._reply(200, [dict(obj, id=obj.get("id") or str(uuid.uuid4()), result={}) for obj in objects])
+        elif self.path.startswith("/v1/objects"):
+            with self.lock:
+                WeaviateStandIn.stored += 1
+            self._reply(200, dict(payload, id=payload.get("id") or str(uuid.uuid4())))
+        else:
+            self._reply(404)
+
+
+def start_stand_in(latency_ms: float) -> ThreadingHTTPServer:
+    WeaviateStandIn.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WeaviateStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = start_stand_in(args.latency_ms)
+    os.environ["WEAVIATE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # embedding_store connects to WEAVIATE_URL at import time
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+    import embedding_store
+
+    texts = [f"chunk {i} " + "lorem ipsum " * 40 for i in range(args.objects)]
+    vectors = [[random.random() for _ in range(args.dim)] for _ in range(args.objects)]
+
+    start = time.perf_counter()
+    for text, vector in zip(texts, vectors):
+        embedding_store.client.data_object.create(
+            data_object={"content": text},
+            class_name=embedding_store.DOCUMENT_CLASS,
+            vector=vector,
+        )
+    per_object = time.perf_counter() - start
+
+    start = time.perf_counter()
+    objects = [{"properties": {"content": text}, "vector": vector} for text, vector in zip(texts, vectors)]
+    failed = embedding_store.store_chunks_batched(objects)
+    batched = time.perf_counter() - start
+
+    print(f"objects={args.objects} dim={args.dim} latency={args.latency_ms}ms "
+          f"batch_size={embedding_store.WEAVIATE_BATCH_SIZE} dynamic={embedding_store.WEAVIATE_BATCH_DYNAMIC} "
+          f"workers={embedding_store.WEAVIATE_BATCH_WORKERS}")
+    print(f"per-object create : {args.objects / per_object:10.1f} objects/sec ({per_object:.2f}s)")
+    print(f"batch import      : {args.objects / batched:10.1f} objects/sec ({batched:.2f}s), failed={len(failed)}")
+    print(f"stand-in stored {WeaviateStandIn.stored} objects")
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# ingestion-service/benchmarks/bench_chunker.py
+
+'''
+Compares TokenChunker with the LangChain RecursiveCharacterTextSplitter on a large synthetic document.
+
+Reports wall time, peak Python heap (tracemalloc, excludes the tokenizer's native buffers)
+and how many chunks exceed the embedding model's token budget.
+
+    langchain-chars  : previous configuration, 500 characters / 100 overlap
+    langchain-tokens : LangChain sized by the same tokenizer (from_huggingface_tokenizer)
+    token-chunker    : chunker.TokenChunker, chunks collected into a list
+    token-streamed   : chunker.TokenChunker, chunks consumed one at a time as the consumer would
+
+Usage (from ingestion-service/):
+    python benchmarks/bench_chunker.py --paragraphs 5000
+'''
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENIZER, SEPARATORS, TokenChunker
+
+WORDS = (
+    "technology society healthcare ethics data privacy model network energy education research policy "
+    "automation infrastructure communication industry analysis system development innovation"
+).split()
+
+
+def make_document(paragraphs: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    blocks = []
+    for _ in range(paragraphs):
+        lines = []
+        for _ in range(rng.randint(1, 4)):
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(6, 18))).capitalize() + "." for _ in range(rng.randint(1, 4))]
+            lines.append(" ".join(sentences))
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def consume(chunks) -> list[str]:
+    # Keep only the first chunk, like a consumer handing each chunk on before taking the next
+    first = []
+    for chunk, _, _ in chunks:
+        if not first:
+            first.append(chunk)
+    return first
+
+
+def measure(name: str, split, text: str, count_tokens, budget: int):
+    start = time.perf_counter()
+    chunks = split(text)
+    elapsed = time.perf_counter() - start
+
+    # Separate pass so tracing overhead does not distort the timing
+    tracemalloc.start()
+    split(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    over = sum(1 for size in sizes if size > budget)
+    print(
+        f"{name:17s} {elapsed:8.2f}s  peak {peak / 2**20:8.1f} MiB  chunks {len(chunks):6d}  "
+        f"mean tokens {sum(sizes) / len(sizes):6.1f}  over budget {over}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--tokenizer", default=CHUNK_TOKENIZER)
+    args = parser.parse_args()
+
+    chunker = TokenChunker.from_pretrained(args.tokenizer, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+    tokenizer = chunker.tokenizer
+    text = make_document(args.paragraphs)
+    print(f"document: {len(text):,} characters, budget {chunker.budget} tokens, overlap {chunker.overlap} tokens")
+
+    def count_tokens(chunk: str) -> int:
+        return len(tokenizer(chunk, add_special_tokens=False, verbose=False)["input_ids"])
+
+    char_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100, separators=SEPARATORS)
+    token_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        tokenizer, chunk_size=chunker.budget, chunk_overlap=chunker.overlap, separators=SEPARATORS
+    )
+
+    measure("langchain-chars", char_splitter.split_text, text, count_tokens, chunker.budget)
+    measure("langchain-tokens", token_splitter.split_text, text, count_tokens, chunker.budget)
+    measure("token-chunker", lambda t: [chunk for chunk, _, _ in chunker.iter_chunks(t)], text, count_tokens, chunker.budget)
+    measure("token-streamed", lambda t: consume(chunker.iter_chunks(t)), text, count_tokens, chunker.budget)
+
+
+if __name__ == "__main__":
+    main()
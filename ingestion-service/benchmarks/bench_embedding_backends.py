@@ -0,0 +1,80 @@
+# ingestion-service/benchmarks/bench_embedding_backends.py
+
+'''
+Compares the embedding backends selectable with EMBEDDING_BACKEND on CPU.
+
+Reports document throughput (sentences/s through embed_documents, as ingestion uses it),
+single-query latency p50/p99 (embed_query, as rag-service uses it) and the cosine similarity
+of each backend's vectors to the torch reference.
+
+    torch     : HuggingFaceEmbeddings (sentence-transformers, eager PyTorch)
+    onnx      : ONNX Runtime, fp32 export of the same transformer
+    onnx-int8 : ONNX Runtime, dynamically quantized int8 weights
+
+Usage (from ingestion-service/):
+    python benchmarks/bench_embedding_backends.py --sentences 512 --queries 200
+'''
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from shared.embedding_backends import EMBEDDING_MODEL, load_embeddings
+
+WORDS = (
+    "technology society healthcare ethics data privacy model network energy education research policy "
+    "automation infrastructure communication industry analysis system development innovation"
+).split()
+
+
+def make_sentences(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(8, 120))).capitalize() + "." for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    sentences = make_sentences(args.sentences)
+    queries = make_sentences(args.queries, seed=11)
+    reference = None
+
+    for backend in args.backends:
+        embeddings = load_embeddings(backend, args.model)
+        embeddings.embed_documents(sentences[:8])  # warm-up (graph optimization, allocator)
+
+        start = time.perf_counter()
+        vectors = np.array(embeddings.embed_documents(sentences))
+        throughput = len(sentences) / (time.perf_counter() - start)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        percentiles = statistics.quantiles(latencies, n=100)
+
+        if reference is None:
+            reference = vectors
+        cosine = (vectors * reference).sum(axis=1)
+        print(
+            f"{backend:10s} {throughput:8.1f} sentences/s  query p50 {percentiles[49]:7.2f} ms  "
+            f"p99 {percentiles[98]:7.2f} ms  cosine vs {args.backends[0]} min {cosine.min():.4f} mean {cosine.mean():.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
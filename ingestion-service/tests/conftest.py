@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The ingestion app is run as a script (python app/consumer.py), so its modules import each other flat
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+# Modules shared between services live in <repo>/shared (PYTHONPATH=/opt/documind in the images)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
@@ -0,0 +1,50 @@
+import pytest
+from shared import blob_store
+from shared.blob_store import LocalBlobStore
+
+
+def test_local_round_trip_and_delete(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+
+    ref = store.put("doc/part-0.txt.gz", b"payload")
+    with store.open(ref) as f:
+        assert f.read() == b"payload"
+
+    store.delete(ref)
+    store.delete(ref)  # already gone is fine
+    assert not (tmp_path / "blobs" / "doc" / "part-0.txt.gz").exists()
+
+
+def test_rejects_references_outside_root(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+
+    with pytest.raises(ValueError):
+        store.open(f"file://{tmp_path}/elsewhere.txt.gz")
+
+
+def test_concurrent_writers_of_one_key_use_separate_temp_files(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    written = []
+    real_replace = blob_store.os.replace
+
+    def replace(src, dst):
+        written.append(src)
+        # A second writer of the same key finishes while the first one is between write and rename
+        if len(written) == 1:
+            store.put("doc/part-0.txt.gz", b"second")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(blob_store.os, "replace", replace)
+    ref = store.put("doc/part-0.txt.gz", b"first")
+    assert written[0] != written[1]
+    with store.open(ref) as f:
+        assert f.read() == b"first"
+
+
+def test_references_must_point_into_the_configured_store(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(blob_store, "_store", store)
+
+    assert blob_store.blob_store_for(f"file://{tmp_path}/blobs/doc/part-0.txt.gz") is store
+    with pytest.raises(ValueError):
+        blob_store.blob_store_for("s3://someone-elses-bucket/doc/part-0.txt.gz")
@@ -0,0 +1,75 @@
+import importlib
+import re
+
+import chunker
+from chunker import TokenChunker
+
+
+class WordTokenizer:
+    # Stand-in for a fast HF tokenizer: one token per word or punctuation mark
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False, verbose=True):
+        return {"offset_mapping": [[m.span() for m in re.finditer(r"\w+|[^\w\s]", text)] for text in texts]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+
+def count_tokens(text):
+    return len(WordTokenizer()([text])["offset_mapping"][0])
+
+
+def test_chunks_fit_budget_and_offsets_point_into_text():
+    text = "\n\n".join(
+        "\n".join(f"Paragraph {p} line {l} has a few words in it." for l in range(6)) for p in range(30)
+    )
+    chunker = TokenChunker(WordTokenizer(), max_tokens=42, overlap_tokens=8)
+
+    chunks = list(chunker.iter_chunks(text))
+
+    assert len(chunks) > 1
+    for chunk, start, end in chunks:
+        assert text[start:end] == chunk
+        assert count_tokens(chunk) <= 40
+    # Every paragraph shows up in some chunk
+    assert all(any(f"Paragraph {p} " in chunk for chunk, _, _ in chunks) for p in range(30))
+
+
+def test_prefers_paragraph_boundaries():
+    paragraphs = [" ".join(["word"] * 10) for _ in range(4)]
+    text = "\n\n".join(paragraphs)
+    chunker = TokenChunker(WordTokenizer(), max_tokens=22, overlap_tokens=0)
+
+    assert [chunk for chunk, _, _ in chunker.iter_chunks(text)] == [
+        paragraphs[0] + "\n\n" + paragraphs[1],
+        paragraphs[2] + "\n\n" + paragraphs[3],
+    ]
+
+
+def test_falls_back_to_token_cuts_without_separators():
+    text = "!?" * 5
+    chunker = TokenChunker(WordTokenizer(), max_tokens=4, overlap_tokens=0)
+
+    assert [chunk for chunk, _, _ in chunker.iter_chunks(text)] == ["!?"] * 5
+
+
+def test_is_lazy():
+    chunker = TokenChunker(WordTokenizer(), max_tokens=12, overlap_tokens=2)
+    chunks = chunker.iter_chunks("one two three. " * 100)
+
+    assert next(chunks)[1] == 0
+
+
+def test_chunks_are_sized_for_the_shared_embedding_model(monkeypatch):
+    monkeypatch.delenv("CHUNK_TOKENIZER", raising=False)
+    monkeypatch.delenv("CHUNK_MAX_TOKENS", raising=False)
+    monkeypatch.setenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    monkeypatch.setenv("EMBEDDING_MAX_SEQ_LENGTH", "256")
+    import shared.embedding_backends
+    try:
+        importlib.reload(shared.embedding_backends)
+        reloaded = importlib.reload(chunker)
+        assert (reloaded.CHUNK_TOKENIZER, reloaded.CHUNK_MAX_TOKENS) == ("sentence-transformers/all-MiniLM-L6-v2", 256)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(shared.embedding_backends)
+        importlib.reload(chunker)
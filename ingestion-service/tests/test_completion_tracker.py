@@ -0,0 +1,56 @@
+import json
+import pytest
+import completion_tracker
+from completion_tracker import CompletionTracker
+
+
+class FakeMessage:
+    def __init__(self, **data):
+        self.body = json.dumps(data).encode()
+        self.outcome = None
+
+    async def ack(self):
+        self.outcome = "ack"
+
+    async def nack(self, requeue=True):
+        self.outcome = "requeue" if requeue else "nack"
+
+    async def reject(self, requeue=False):
+        self.outcome = "reject"
+
+
+def part(n, total=3, failed=0):
+    return FakeMessage(doc_id="doc", source="manual.pdf", part=n, total_parts=total, failed=failed)
+
+
+@pytest.mark.asyncio
+async def test_every_report_is_recorded_and_acked_at_once():
+    recorded = []
+
+    async def record_part(data):
+        recorded.append(data["part"])
+        return {"completed": False, "document": {"parts_stored": len(set(recorded)), "parts": 3}}
+
+    tracker = CompletionTracker(record_part)
+    messages = [part(2), part(0), part(0)]
+    for message in messages:
+        await tracker.process_part_message(message)
+
+    # Nothing waits for the rest of the document, duplicates are the registry's to count once
+    assert recorded == [2, 0, 0]
+    assert [message.outcome for message in messages] == ["ack"] * 3
+
+
+@pytest.mark.asyncio
+async def test_reports_are_requeued_while_the_registry_is_down(monkeypatch):
+    monkeypatch.setattr(completion_tracker, "PART_RETRY_SECONDS", 0)
+
+    async def record_part(data):
+        raise ConnectionError("db-service unreachable")
+
+    tracker = CompletionTracker(record_part)
+    message, invalid = part(0), FakeMessage(part=0)
+    await tracker.process_part_message(message)
+    await tracker.process_part_message(invalid)
+
+    assert (message.outcome, invalid.outcome) == ("requeue", "reject")
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+pytest.importorskip("sentence_transformers")
+
+from shared.embedding_backends import OnnxEmbeddings, load_embeddings
+
+WORDS = "technology society healthcare ethics data privacy model network energy the a is of and to".split()
+TEXTS = [
+    "the technology of society is data",
+    "a",
+    "privacy and ethics of the model network " * 40,  # longer than max_seq_length, exercises truncation
+]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    # Small random MPNet with the Transformer -> Pooling(mean) -> Normalize layout of all-mpnet-base-v2,
+    # built locally so the parity check does not need the hub
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import MPNetConfig, MPNetModel, MPNetTokenizerFast
+
+    root = tmp_path_factory.mktemp("models")
+    raw = root / "raw"
+    raw.mkdir()
+    vocab = raw / "vocab.txt"
+    vocab.write_text("\n".join(["<s>", "<pad>", "</s>", "[UNK]", "<mask>", ".", ","] + WORDS))
+
+    config = MPNetConfig(vocab_size=len(WORDS) + 7, hidden_size=64, num_hidden_layers=2,
+                         num_attention_heads=4, intermediate_size=128)
+    MPNetModel(config).save_pretrained(raw)
+    MPNetTokenizerFast(str(vocab), unk_token="[UNK]").save_pretrained(raw)
+
+    transformer = models.Transformer(str(raw), max_seq_length=384)
+    model = SentenceTransformer(
+        modules=[transformer, models.Pooling(64, "mean"), models.Normalize()]
+    )
+    model.save(str(root / "model"))
+    return str(root / "model")
+
+
+@pytest.mark.parametrize("quantize, min_cosine", [(False, 0.999), (True, 0.98)])
+def test_onnx_matches_torch_backend(model_dir, tmp_path, quantize, min_cosine):
+    reference = np.array(load_embeddings("torch", model_dir).embed_documents(TEXTS))
+    onnx = OnnxEmbeddings(model_dir, quantize=quantize, model_dir=str(tmp_path), batch_size=2)
+
+    vectors = np.array(onnx.embed_documents(TEXTS))
+    assert vectors.shape == reference.shape
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert (vectors * reference).sum(axis=1).min() >= min_cosine
+    # int8 activations are quantized per batch, so a lone query may differ slightly from its batched vector
+    assert np.dot(onnx.embed_query(TEXTS[0]), vectors[0]) >= min_cosine
+
+
+def test_both_backends_truncate_at_the_shared_max_seq_length(model_dir, tmp_path):
+    torch_embeddings = load_embeddings("torch", model_dir, max_seq_length=16)
+    assert torch_embeddings._client.max_seq_length == 16
+    onnx = OnnxEmbeddings(model_dir, model_dir=str(tmp_path), max_seq_length=16)
+
+    # Only the first 16 tokens count: a long text and its longer continuation embed the same
+    long_text, longer_text = TEXTS[2], TEXTS[2] + " technology society"
+    for embeddings in (torch_embeddings, onnx):
+        first, second = embeddings.embed_documents([long_text, longer_text])
+        assert np.dot(first, second) >= 0.9999
+    assert np.dot(torch_embeddings.embed_query(long_text), onnx.embed_query(long_text)) >= 0.999
+    # The export went through a temporary file of its own, nothing is left next to the model
+    assert not [name for root, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")]
@@ -0,0 +1,23 @@
+from embedding_cache import EmbeddingCache, chunk_hash
+
+
+def test_round_trip_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    key = chunk_hash("some chunk")
+
+    cache = EmbeddingCache(path, "model-a")
+    assert cache.get_many([key]) == {}
+    cache.put_many({key: [0.5, -1.25, 2.0]})
+
+    reopened = EmbeddingCache(path, "model-a")
+    assert reopened.get_many([key, chunk_hash("other")]) == {key: [0.5, -1.25, 2.0]}
+    assert (reopened.hits, reopened.misses) == (1, 1)
+
+
+def test_entries_are_scoped_to_the_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    key = chunk_hash("some chunk")
+
+    EmbeddingCache(path, "model-a").put_many({key: [1.0]})
+
+    assert EmbeddingCache(path, "model-b").get_many([key]) == {}
@@ -0,0 +1,30 @@
+import ast
+import os
+
+import pytest
+
+yaml = pytest.importorskip("yaml")
+
+from shared.embedding_backends import VECTOR_SETTINGS
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def test_queries_and_chunks_are_embedded_with_the_same_module_and_settings():
+    # Both services load their model through the one shared module, no service keeps a copy of it
+    for service, path in (("ingestion-service", "app/embedding_store.py"), ("rag-service", "app/services/embedding_store.py")):
+        with open(os.path.join(ROOT, service, path)) as f:
+            imports = {node.module for node in ast.walk(ast.parse(f.read())) if isinstance(node, ast.ImportFrom)}
+        assert "shared.embedding_backends" in imports, service
+        assert not any(name.endswith("embedding_backends.py") for _, _, files in os.walk(os.path.join(ROOT, service, "app"))
+                       for name in files), service
+
+    with open(os.path.join(ROOT, "docker-compose.yml")) as f:
+        services = yaml.safe_load(f)["services"]
+
+    def settings(service):
+        environment = dict(item.split("=", 1) for item in services[service]["environment"])
+        return {name: environment.get(name) for name in VECTOR_SETTINGS}
+
+    assert settings("ingestion-service") == settings("rag-service")
+    assert None not in settings("rag-service").values()
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+import micro_batcher
+from micro_batcher import EmbeddingBatcher
+
+
+def make_batcher(calls, max_batch_size=8, max_wait_ms=20):
+    async def embed_fn(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    return EmbeddingBatcher(embed_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+@pytest.mark.asyncio
+async def test_gathers_messages_into_one_batch():
+    calls = []
+    batcher = make_batcher(calls)
+
+    results = await asyncio.gather(
+        batcher.embed(["a", "bb"]),
+        batcher.embed(["ccc"]),
+        batcher.embed(["dddd", "eeeee"]),
+    )
+
+    assert calls == [["a", "bb", "ccc", "dddd", "eeeee"]]
+    assert results == [[[1.0], [2.0]], [[3.0]], [[4.0], [5.0]]]
+    assert batcher.histogram.snapshot()["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_respects_max_batch_size():
+    calls = []
+    batcher = make_batcher(calls, max_batch_size=4)
+
+    results = await asyncio.gather(
+        batcher.embed(["a"] * 3),
+        batcher.embed(["b"] * 3),
+        batcher.embed(["c"] * 10),
+    )
+
+    assert all(len(call) <= 4 for call in calls)
+    assert [len(result) for result in results] == [3, 3, 10]
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_waiting_message():
+    async def embed_fn(texts):
+        raise RuntimeError("model crashed")
+
+    batcher = EmbeddingBatcher(embed_fn, max_batch_size=8, max_wait_ms=5)
+    results = await asyncio.gather(batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_zero_report_interval_disables_the_report(monkeypatch):
+    monkeypatch.setattr(micro_batcher, "EMBED_BATCH_REPORT_EVERY", 0)
+    calls = []
+    batcher = make_batcher(calls, max_batch_size=2)
+
+    assert await batcher.embed(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+    assert batcher.histogram.snapshot()["batches"] == 2
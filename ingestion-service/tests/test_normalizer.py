@@ -0,0 +1,19 @@
+from normalizer import TextNormalizer, normalize_text
+
+RAW = "  Intro   paraﬁne\n\n\nSecond  para-\ngraph line one\nline two | detail a|detail b\n\n  Last­ly done.  \n"
+EXPECTED = "Intro parafine\n\nSecond paragraph line one\nline two\ndetail a\ndetail b\n\nLastly done."
+
+
+def test_keeps_paragraphs_and_lines():
+    assert normalize_text(RAW) == EXPECTED
+
+
+def test_keeps_real_hyphens():
+    assert normalize_text("state-of-the-art and COVID-\n19") == "state-of-the-art and COVID-\n19"
+
+
+def test_streaming_matches_whole_text_for_any_split():
+    for size in range(1, 12):
+        normalizer = TextNormalizer()
+        pieces = [normalizer.feed(RAW[i:i + size]) for i in range(0, len(RAW), size)]
+        assert "".join(pieces) + normalizer.finish() == EXPECTED
@@ -2,7 +2,9 @@
 
 from fastapi import FastAPI
 from app.routes import rag
-from app.services.embedding_store import instantiate_and_connect
+from app.services.embedding_store import close_connection, instantiate_and_connect, query_log_writer, vector_index
+from app.services.ingestion_events import ingestion_events
+from app.services.llm_service import invalidate_cached_answers
 
 app = FastAPI()
 
@@ -10,9 +12,24 @@ app = FastAPI()
 app.include_router(rag.router, prefix="/rag")
 
 @app.on_event("startup")
-def startup_event():
-    # Connect to Weaviate
-    instantiate_and_connect()
+async def startup_event():
+    # Connect to Weaviate (async client, REST + gRPC, kept open for the app's lifetime)
+    await instantiate_and_connect()
+    # Background writer for the QueryVector log
+    query_log_writer.start()
+    # Newly ingested chunks invalidate cached answers they could change
+    ingestion_events.add_handler(invalidate_cached_answers)
+    # Optional in-process DocumentChunk index (VECTOR_INDEX_ENABLED), fed by the same events
+    ingestion_events.add_handler(vector_index.handle_event)
+    vector_index.start()
+    ingestion_events.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await query_log_writer.stop()
+    await ingestion_events.stop()
+    await vector_index.stop()
+    await close_connection()
 
 @app.get("/")
 async def root():
@@ -1,51 +1,232 @@
 # rag-service\app\routes\rag.py
 
+import asyncio
+import json
+import os
+import time
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from loguru import logger
 
 
-from app.services.embedding_store import embed_query, search_similar_documents
-from app.services.llm_service import generate_response_from_query
+from app.services.embedding_store import (
+    embed_query,
+    get_query_vector,
+    get_query_vectors,
+    query_log_writer,
+    query_vector_cache,
+    search_similar_documents,
+    vector_index,
+)
+from app.services.llm_service import (
+    answer_cache,
+    generate_response_from_query,
+    stream_response_from_query,
+)
+from app.services.metrics import LatencyStats
+from app.services.query_cache import normalize_query
+from app.services.single_flight import SingleFlight
 
 # from app.services.vectorstore import retrieve_relevant_chunks
 
 router = APIRouter()
 
+# Chunks retrieved as context for each answer, the context packer keeps them within CONTEXT_TOKEN_BUDGET
+TOP_K = int(os.getenv("RAG_TOP_K", 3))
+
+# Streaming: request arrival -> first answer token sent, and -> last token sent
+time_to_first_token = LatencyStats()
+stream_duration = LatencyStats()
+
+# Concurrent requests for the same (normalized) query share one pipeline run
+single_flight = SingleFlight()
+
+# Batch endpoints: queries per request, and searches / LLM calls of one batch running at once
+RAG_BATCH_MAX_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", 64))
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", 8))
+
 
 class PromptRequest(BaseModel):
     query: str
 
 
+class BatchPromptRequest(BaseModel):
+    queries: list[str] = Field(..., min_length=1, max_length=RAG_BATCH_MAX_QUERIES)
+
+
+# Embeds the query once (cached) unless its vector is passed in, then either finds a cached answer or
+# retrieves the context. Returns (query_vector, cached_answer, relevant_docs)
+async def retrieve_context(query: str, query_vector: list[float] = None):
+    if query_vector is None and query:
+        query_vector = await get_query_vector(query)
+
+    # A paraphrase of an already answered question skips retrieval and the LLM
+    cached_answer = answer_cache.lookup(query_vector) if query_vector is not None else None
+    if cached_answer is not None:
+        logger.info(f"Answer cache hit for query '{query}'")
+        return query_vector, cached_answer, []
+
+    relevant_docs = await search_similar_documents(query, top_k=TOP_K, query_vector=query_vector)
+    return query_vector, None, relevant_docs
+
+
+# The /reply pipeline for one query, its result is shared by coalesced requests (do not mutate)
+async def answer_query(query: str, query_vector: list[float] = None) -> dict:
+    # Step 1 + 2: Embed the user query once (cached, or batched by the caller), search the vector DB for top-k relevant chunks
+    query_vector, cached_answer, relevant_docs = await retrieve_context(query, query_vector)
+    if cached_answer is not None:
+        return {"query_vector": query_vector, "answer": cached_answer, "cached": True}
+
+    # sample output:
+    """
+    [
+        {
+            "content": "Sentence",
+            "distance": 0.12
+        },
+    ]
+    """
+
+    # Step 3: Generate a response using LLM (OpenAI) with context
+    # The OpenAI client is synchronous, keep it off the event loop
+    response = await asyncio.to_thread(generate_response_from_query, query, relevant_docs)
+
+    logger.info(f"Relevant docs for query '{query}':\n\n {relevant_docs}\n\n")
+
+    # Only grounded, successful answers are reused
+    if relevant_docs and not response.startswith("Error:"):
+        answer_cache.put(query, query_vector, response, relevant_docs, top_k=TOP_K)
+
+    return {"query_vector": query_vector, "answer": response, "cached": False}
+
+
 @router.post("/reply")
 async def get_answer(data: PromptRequest):
     try:
-        # Step 1: Embed the incoming user query (optional but included)
-        embed_result = embed_query(data.query)
-
-        # Step 2: Search the vector DB for top-k relevant document chunks
-        relevant_docs = search_similar_documents(data.query, top_k=3)
-
-        # sample output:
-        """
-        [
-            {
-                "content": "Sentence",
-                "distance": 0.12
-            },
-        ]
-        """
-
-        # Step 3: Generate a response using LLM (OpenAI) with context
-        response = generate_response_from_query(data.query, relevant_docs)
+        result = await single_flight.run(("reply", normalize_query(data.query)), lambda: answer_query(data.query))
 
-        logger.info(f"Relevant docs for query '{data.query}':\n\n {relevant_docs}\n\n")
+        # Every request is logged, coalesced or not
+        embed_result = embed_query(data.query, query_vector=result["query_vector"])
 
         return {
             "embedding_status": embed_result,
             # "relevant_documents": relevant_docs,
-            "answer": response,
+            "answer": result["answer"],
+            "cached": result["cached"],
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Runs fn(query, vector) for every query with bounded concurrency, results in input order.
+# The vectors come from one batched embedding call, and every query is logged like a single request.
+async def run_batch(queries: list[str], fn) -> list:
+    vectors = await get_query_vectors(queries)
+    for query, vector in zip(queries, vectors):
+        embed_query(query, query_vector=vector)
+
+    slots = asyncio.Semaphore(RAG_BATCH_CONCURRENCY)
+
+    async def run_one(query, vector):
+        async with slots:
+            return await fn(query, vector)
+
+    return await asyncio.gather(*(run_one(q, v) for q, v in zip(queries, vectors)), return_exceptions=True)
+
+
+@router.post("/search_batch")
+async def search_batch(data: BatchPromptRequest):
+    results = await run_batch(
+        data.queries,
+        lambda query, vector: search_similar_documents(query, top_k=TOP_K, query_vector=vector, raise_errors=True),
+    )
+    return {
+        "results": [
+            {"query": query, "error": str(result)} if isinstance(result, Exception)
+            else {"query": query, "documents": result}
+            for query, result in zip(data.queries, results)
+        ]
+    }
+
+
+@router.post("/reply_batch")
+async def reply_batch(data: BatchPromptRequest):
+    # Each query is answered with its vector from the batched embedding, never embedded again
+    results = await run_batch(
+        data.queries,
+        lambda query, vector: single_flight.run(("reply", normalize_query(query)), lambda: answer_query(query, vector)),
+    )
+    return {
+        "results": [
+            {"query": query, "error": str(result)} if isinstance(result, Exception)
+            else {"query": query, "answer": result["answer"], "cached": result["cached"]}
+            for query, result in zip(data.queries, results)
+        ]
+    }
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Server-sent events: "token" events carry answer pieces as the LLM produces them,
+# then "done" (with the same status fields as /reply) or "error"
+@router.post("/reply/stream")
+async def stream_answer(data: PromptRequest):
+    started = time.perf_counter()
+    try:
+        # Concurrent streams of the same query share embedding and retrieval, each streams its own completion
+        query_vector, cached_answer, relevant_docs = await single_flight.run(
+            ("retrieve", normalize_query(data.query)), lambda: retrieve_context(data.query)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    embed_result = embed_query(data.query, query_vector=query_vector)
+
+    async def events():
+        if cached_answer is not None:
+            time_to_first_token.observe((time.perf_counter() - started) * 1000)
+            yield sse("token", {"content": cached_answer})
+            yield sse("done", {"embedding_status": embed_result, "cached": True})
+            return
+
+        pieces = []
+        try:
+            async for piece in stream_response_from_query(data.query, relevant_docs):
+                if not pieces:
+                    time_to_first_token.observe((time.perf_counter() - started) * 1000)
+                pieces.append(piece)
+                yield sse("token", {"content": piece})
+        except Exception as e:
+            logger.error(f"Streaming response failed: {e}")
+            yield sse("error", {"detail": str(e)})
+            return
+
+        stream_duration.observe((time.perf_counter() - started) * 1000)
+        answer = "".join(pieces)
+        logger.info(f"Streamed answer for query '{data.query}' ({len(pieces)} pieces)")
+        if relevant_docs:
+            answer_cache.put(data.query, query_vector, answer, relevant_docs, top_k=TOP_K)
+        yield sse("done", {"embedding_status": embed_result, "cached": False})
+
+    # no-cache / X-Accel-Buffering keep proxies from holding the stream back
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return {
+        "query_vector_cache": query_vector_cache.stats(),
+        "query_log": query_log_writer.stats(),
+        "answer_cache": answer_cache.stats(),
+        "stream_time_to_first_token": time_to_first_token.snapshot(),
+        "stream_duration": stream_duration.snapshot(),
+        "request_coalescing": single_flight.stats(),
+        "vector_index": vector_index.stats(),
+    }
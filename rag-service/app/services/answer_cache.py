@@ -0,0 +1,205 @@
+# rag-service/app/services/answer_cache.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from loguru import logger
+
+from app.services.query_cache import normalize_query
+
+# A query reuses a cached answer when its vector is at least this cosine-similar to the cached query
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1000))  # 0 disables the cache
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 24 * 3600))
+# Local SQLite file so answers survive restarts, set to an empty string to keep them in memory only
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "/data/answer_cache.sqlite3")
+# A new chunk invalidates an answer if it scores within this margin of the answer's weakest context chunk,
+# the slack covers paraphrases that were served the answer but retrieve slightly differently
+ANSWER_CACHE_INVALIDATION_MARGIN = float(os.getenv("ANSWER_CACHE_INVALIDATION_MARGIN", 0.05))
+
+
+'''
+SemanticAnswerCache: LLM answers reused for paraphrased queries
+lookup: returns the answer of the most similar cached query above threshold, or None
+put: stores an answer with the similarity of the weakest chunk in its context (the retrieval cutoff)
+invalidate: drops answers whose top-k a set of newly stored chunk vectors could enter, None drops everything
+
+Query vectors are L2-normalized (all-mpnet-base-v2), so cosine similarity is a dot product.
+They live in one preallocated matrix, free rows are zero and never reach the threshold.
+'''
+class SemanticAnswerCache:
+    def __init__(self, path: str = ANSWER_CACHE_PATH, max_size: int = ANSWER_CACHE_SIZE,
+                 threshold: float = ANSWER_CACHE_THRESHOLD, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 margin: float = ANSWER_CACHE_INVALIDATION_MARGIN, clock=time.time):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.margin = margin
+        self.clock = clock  # wall clock, expiry times are persisted
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._entries = OrderedDict()  # normalized query -> entry dict, in LRU order
+        self._vectors = None  # (max_size, dim) float32
+        self._slots = [None] * max(max_size, 0)  # row -> normalized query
+        self._free = []
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if max_size <= 0:
+            logger.info("Answer cache disabled")
+            return
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "query_key TEXT PRIMARY KEY, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "answer TEXT NOT NULL, cutoff REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM answers WHERE expires_at <= ?", (self.clock(),))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT query_key, query, vector, answer, cutoff, expires_at FROM answers ORDER BY expires_at"
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open answer cache at {path}, keeping answers in memory only: {e}")
+            self._conn = None
+            return
+
+        for key, query, blob, answer, cutoff, expires_at in rows[-self.max_size:]:
+            self._insert(key, query, np.frombuffer(blob, dtype=np.float32), answer, cutoff, expires_at)
+        logger.info(f"Answer cache opened at {path} with {len(self._entries)} answers")
+
+    # Returns the least recently used query evicted to make room, if any
+    def _insert(self, key, query, vector, answer, cutoff, expires_at):
+        evicted = None
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+            self._free = list(range(self.max_size - 1, -1, -1))
+        if key in self._entries:
+            slot = self._entries.pop(key)["slot"]
+        else:
+            if not self._free:
+                evicted = self._remove(next(iter(self._entries)))
+            slot = self._free.pop()
+        self._vectors[slot] = vector
+        self._slots[slot] = key
+        self._entries[key] = {"query": query, "answer": answer, "cutoff": cutoff, "expires_at": expires_at, "slot": slot}
+        return evicted
+
+    def _remove(self, key):
+        slot = self._entries.pop(key)["slot"]
+        self._vectors[slot] = 0.0
+        self._slots[slot] = None
+        self._free.append(slot)
+        return key
+
+    def _forget(self, keys: list[str]):
+        if self._conn is None or not keys:
+            return
+        try:
+            self._conn.executemany("DELETE FROM answers WHERE query_key = ?", [(key,) for key in keys])
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to delete {len(keys)} answers from answer cache: {e}")
+
+    def lookup(self, vector: list[float]):
+        if self.max_size <= 0:
+            return None
+
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ np.asarray(vector, dtype=np.float32)
+            slot = int(np.argmax(similarities))
+            key = self._slots[slot]
+            if key is None or similarities[slot] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[key]
+            if entry["expires_at"] <= self.clock():
+                self._forget([self._remove(key)])
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, query: str, vector: list[float], answer: str, documents: list[dict], top_k: int):
+        if self.max_size <= 0:
+            return
+
+        # Similarity of the weakest retrieved chunk (cosine distance = 1 - similarity).
+        # With fewer than top_k hits any new chunk would join the context, so any ingestion invalidates.
+        distances = [doc.get("distance") for doc in documents]
+        if len(documents) < top_k or None in distances:
+            cutoff = -1.0
+        else:
+            cutoff = 1.0 - max(distances)
+
+        key = normalize_query(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        expires_at = self.clock() + self.ttl_seconds
+
+        with self._lock:
+            evicted = self._insert(key, query, vector, answer, cutoff, expires_at)
+            if self._conn is None:
+                return
+            try:
+                if evicted is not None:
+                    self._conn.execute("DELETE FROM answers WHERE query_key = ?", (evicted,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, query, vector.tobytes(), answer, cutoff, expires_at),
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist answer for '{query}': {e}")
+
+    def invalidate(self, chunk_vectors=None) -> int:
+        with self._lock:
+            if not self._entries:
+                return 0
+
+            if chunk_vectors is None:
+                stale = list(self._entries)
+            else:
+                chunks = np.asarray(chunk_vectors, dtype=np.float32)
+                if chunks.size == 0:
+                    return 0
+                best = (self._vectors @ chunks.T).max(axis=1)
+                stale = [key for key, entry in self._entries.items() if best[entry["slot"]] >= entry["cutoff"] - self.margin]
+
+            for key in stale:
+                self._remove(key)
+            self._forget(stale)
+            self.invalidated += len(stale)
+
+        if stale:
+            logger.info(f"Answer cache: invalidated {len(stale)} answers")
+        return len(stale)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidated": self.invalidated,
+        }
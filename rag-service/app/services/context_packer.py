@@ -0,0 +1,183 @@
+# rag-service/app/services/context_packer.py
+
+import os
+import re
+from loguru import logger
+
+# Upper bound on context tokens sent to the LLM (measured with the model's tokenizer)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+CONTEXT_MODEL = os.getenv("CONTEXT_MODEL", "gpt-3.5-turbo")
+# Chunks whose word-trigram Jaccard similarity reaches this are treated as the same text
+CONTEXT_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_NEAR_DUPLICATE_THRESHOLD", 0.8))
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Normalized text has at most "\n\n" between two chunks, a larger gap means other text lies between them
+ADJACENT_GAP_CHARS = 2
+# Without offsets, chunks are merged when one ends with at least this much of the other's beginning
+MIN_TEXT_OVERLAP_CHARS = 20
+
+_WORD = re.compile(r"\w+")
+
+
+class LengthEstimateEncoding:
+    # Stand-in with the tiktoken encode/decode interface, one "token" per 4 characters
+    def encode(self, text: str) -> list[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+def load_encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken missing or its encoding file not downloadable
+        logger.warning(f"No tokenizer for {model} ({e}), estimating context tokens from length")
+        return LengthEstimateEncoding()
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return set(zip(words, words[1:], words[2:]))
+
+
+def _text_overlap(first: str, second: str) -> int:
+    # Length of the longest suffix of first that is a prefix of second (0 if shorter than the minimum)
+    probe = second[:MIN_TEXT_OVERLAP_CHARS]
+    if len(probe) < MIN_TEXT_OVERLAP_CHARS:
+        return 0
+    pos = first.find(probe, max(0, len(first) - len(second)))
+    while pos != -1:
+        if second.startswith(first[pos:]):
+            return len(first) - pos
+        pos = first.find(probe, pos + 1)
+    return 0
+
+
+'''
+ContextPacker: turns retrieved chunks (most relevant first) into the LLM context
+pack: merges overlapping or adjacent chunks of the same document part, drops near-duplicates,
+      then takes the merged passages in order of relevance while they fit the token budget
+
+Chunks carry doc_id/part/start_offset/end_offset (offsets into the same normalized part text),
+so overlaps are cut exactly. Chunks stored without them fall back to matching a suffix of one
+chunk against the beginning of the other.
+'''
+class ContextPacker:
+    def __init__(self, model: str = CONTEXT_MODEL, budget: int = CONTEXT_TOKEN_BUDGET,
+                 near_duplicate_threshold: float = CONTEXT_NEAR_DUPLICATE_THRESHOLD, encoding=None):
+        self.budget = budget
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.encoding = encoding or load_encoding(model)
+        self.separator_tokens = self.count_tokens(CONTEXT_SEPARATOR)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        return self.encoding.decode(self.encoding.encode(text)[:tokens])
+
+    def _merge(self, documents: list[dict]) -> list[dict]:
+        # passages keep the rank of their most relevant chunk
+        passages = []
+        for rank, doc in enumerate(documents):
+            content = doc.get("content") or ""
+            if not content.strip():
+                continue
+            chunk = {
+                "key": (doc.get("doc_id"), doc.get("part")),
+                "start": doc.get("start_offset"),
+                "end": doc.get("end_offset"),
+                "content": content,
+                "rank": rank,
+            }
+            for passage in passages:
+                if self._absorb(passage, chunk):
+                    self._absorb_neighbours(passage, passages)
+                    break
+            else:
+                passages.append(chunk)
+        return passages
+
+    def _absorb_neighbours(self, passage: dict, passages: list[dict]):
+        # A grown passage may now reach passages it did not touch before
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(passages):
+                if other is not passage and self._absorb(passage, other):
+                    passage["rank"] = min(passage["rank"], other["rank"])
+                    del passages[i]
+                    merged = True
+                    break
+
+    def _absorb(self, passage: dict, chunk: dict) -> bool:
+        has_offsets = None not in (passage["start"], chunk["start"], passage["key"][0])
+        if has_offsets and passage["key"] == chunk["key"]:
+            first, second = sorted((passage, chunk), key=lambda c: c["start"])
+            if second["start"] > first["end"] + ADJACENT_GAP_CHARS:
+                return False
+            if second["end"] <= first["end"]:
+                content = first["content"]
+            elif second["start"] < first["end"]:
+                content = first["content"] + second["content"][first["end"] - second["start"]:]
+            else:
+                content = first["content"] + "\n" + second["content"]
+            passage.update(start=first["start"], end=max(first["end"], second["end"]), content=content)
+            return True
+
+        # Text fallback: containment or a shared suffix/prefix
+        a, b = passage["content"], chunk["content"]
+        if b in a:
+            return True
+        if a in b:
+            passage["content"] = b
+            return True
+        overlap = _text_overlap(a, b)
+        if overlap:
+            passage["content"] = a + b[overlap:]
+            return True
+        overlap = _text_overlap(b, a)
+        if overlap:
+            passage["content"] = b + a[overlap:]
+            return True
+        return False
+
+    def pack(self, documents: list[dict]) -> list[str]:
+        passages = sorted(self._merge(documents), key=lambda p: p["rank"])
+
+        packed, kept_shingles, used = [], [], 0
+        for passage in passages:
+            shingles = _shingles(passage["content"])
+            if any(
+                len(shingles & other) / len(shingles | other) >= self.near_duplicate_threshold
+                for other in kept_shingles
+            ):
+                continue
+
+            tokens = self.count_tokens(passage["content"])
+            cost = tokens + (self.separator_tokens if packed else 0)
+            if used + cost > self.budget:
+                # Skip what does not fit, a later (smaller) passage may still fit
+                continue
+            packed.append(passage["content"])
+            kept_shingles.append(shingles)
+            used += cost
+
+        if not packed and passages:
+            # Even the most relevant passage is over budget: send its beginning rather than nothing
+            packed.append(self.truncate(passages[0]["content"], self.budget))
+            used = self.budget
+
+        logger.info(
+            f"Context packed: {len(documents)} chunks -> {len(packed)} passages, {used}/{self.budget} tokens"
+        )
+        return packed
@@ -1,99 +1,249 @@
 # rag-service/app/services/embedding_store.py
+import asyncio
 import os
+from urllib.parse import urlparse
 import weaviate
 
-# import weaviate.classes.config as wvcc
-# from weaviate.connect import ConnectionParams
-# from weaviate import WeaviateAsyncClient
-# from weaviate.classes.config import Configure, Property, DataType
-# from weaviate.classes.init import AdditionalConfig
-from langchain_huggingface import HuggingFaceEmbeddings
+from weaviate import WeaviateAsyncClient
+from weaviate.classes.config import Configure, DataType, Property
+from weaviate.classes.data import DataObject
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.classes.query import Filter, MetadataQuery
+from weaviate.config import ConnectionConfig
 from langchain.docstore.document import Document
 from loguru import logger
+from shared.embedding_backends import load_embeddings
+from app.services.query_cache import QueryVectorCache
+from app.services.query_log_writer import QueryLogWriter
+from app.services.vector_index import VectorIndexMirror
 
 # Constants (Collection)
 DOCUMENT_CLASS = "DocumentChunk"
 QUERY_CLASS = "QueryVector"
 
-# Define Weaviate URL
+# Chunk properties returned by searches (doc_id/part/offsets are absent on older objects)
+CHUNK_PROPERTIES = ["content", "doc_id", "part", "start_offset", "end_offset"]
+# Page size when reading chunks back for the local vector index
+CHUNK_FETCH_PAGE_SIZE = 500
+
+# Define Weaviate URL (REST), searches and inserts go over gRPC on the same host
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
+WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", 50051))
 
-# client: WeaviateAsyncClient = None
-# WEAVIATE_HOST = os.getenv("WEAVIATE_HOST", "weaviate")
-# WEAVIATE_HTTP_PORT = int(os.getenv("WEAVIATE_HTTP_PORT", 8080))
-# WEAVIATE_GRPC_PORT = int(os.getenv("WEAVIATE_GRPC_PORT", 50052))
+# Connection pool of the long-lived client (REST keep-alive sessions; gRPC multiplexes one channel)
+WEAVIATE_POOL_CONNECTIONS = int(os.getenv("WEAVIATE_POOL_CONNECTIONS", 20))
+WEAVIATE_POOL_MAXSIZE = int(os.getenv("WEAVIATE_POOL_MAXSIZE", 100))
+WEAVIATE_QUERY_TIMEOUT = float(os.getenv("WEAVIATE_QUERY_TIMEOUT", 30))
+WEAVIATE_INSERT_TIMEOUT = float(os.getenv("WEAVIATE_INSERT_TIMEOUT", 90))
 
-# Embedding model
+# Embedding model (EMBEDDING_BACKEND selects PyTorch or ONNX Runtime, must match ingestion-service)
 # embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+embeddings = load_embeddings()
+
+# Query vectors for repeated questions
+query_vector_cache = QueryVectorCache()
 
 
-# Global client
-client = None
+# Global client, opened once at startup and shared by every request
+client: WeaviateAsyncClient = None
 
 # === Connection ===
 
 
-def instantiate_and_connect() -> weaviate.Client:
+async def instantiate_and_connect() -> WeaviateAsyncClient:
     global client
-    client = weaviate.Client(WEAVIATE_URL)
-
-    if client.is_ready():
-        logger.success("Connected to Weaviate.")
+    url = urlparse(WEAVIATE_URL)
+    secure = url.scheme == "https"
+    client = weaviate.use_async_with_custom(
+        http_host=url.hostname,
+        http_port=url.port or (443 if secure else 80),
+        http_secure=secure,
+        grpc_host=url.hostname,
+        grpc_port=WEAVIATE_GRPC_PORT,
+        grpc_secure=secure,
+        additional_config=AdditionalConfig(
+            connection=ConnectionConfig(
+                session_pool_connections=WEAVIATE_POOL_CONNECTIONS,
+                session_pool_maxsize=WEAVIATE_POOL_MAXSIZE,
+            ),
+            timeout=Timeout(query=WEAVIATE_QUERY_TIMEOUT, insert=WEAVIATE_INSERT_TIMEOUT),
+        ),
+    )
+    await client.connect()
+
+    if await client.is_ready():
+        logger.success(f"Connected to Weaviate (REST {WEAVIATE_URL}, gRPC port {WEAVIATE_GRPC_PORT}).")
     else:
         raise RuntimeError("Failed to connect to Weaviate.")
 
+    await ensure_query_collection()
     return client
 
 
+async def close_connection():
+    if client is not None:
+        await client.close()
+        logger.info("Weaviate connection closed.")
+
+
+# QueryVector is written with gRPC batches, create it up front instead of relying on auto-schema
+async def ensure_query_collection():
+    try:
+        if not await client.collections.exists(QUERY_CLASS):
+            await client.collections.create(
+                QUERY_CLASS,
+                vectorizer_config=Configure.Vectorizer.none(),
+                properties=[Property(name="content", data_type=DataType.TEXT)],
+            )
+            logger.info(f"Created Weaviate collection '{QUERY_CLASS}'")
+    except Exception as e:
+        logger.error(f"Failed to ensure collection '{QUERY_CLASS}': {e}")
+
+
+# === Query Vector (one forward pass per distinct query) ===
+async def get_query_vector(query: str) -> list[float]:
+    vector = query_vector_cache.get(query)
+    if vector is None:
+        # The forward pass is CPU bound, keep it off the event loop
+        vector = await asyncio.to_thread(embeddings.embed_query, query)
+        query_vector_cache.put(query, vector)
+    return vector
+
+
+# Vectors for many queries: cache hits are reused, the misses share one batched forward pass
+async def get_query_vectors(queries: list[str]) -> list[list[float]]:
+    vectors = [query_vector_cache.get(query) for query in queries]
+    missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+    if missing:
+        computed = dict(zip(missing, await asyncio.to_thread(embeddings.embed_documents, missing)))
+        for query, vector in computed.items():
+            query_vector_cache.put(query, vector)
+        vectors = [vector if vector is not None else computed[query] for query, vector in zip(queries, vectors)]
+    return vectors
+
+
+# === Query Logging (QueryVector class, written in the background) ===
+# Writes one batch of logged queries and returns how many failed
+async def store_query_vectors(items: list[dict]) -> int:
+    collection = client.collections.get(QUERY_CLASS)
+    result = await collection.data.insert_many(
+        [DataObject(properties={"content": item["content"]}, vector=item["vector"]) for item in items]
+    )
+
+    if result.has_errors:
+        logger.warning(f"{len(result.errors)}/{len(items)} logged queries failed to store")
+    return len(result.errors)
+
+
+query_log_writer = QueryLogWriter(store_query_vectors)
+
+
 # === Query Embedding (optional) ===
-def embed_query(query: str) -> str:
+def embed_query(query: str, query_vector: list[float] = None) -> str:
     if not query:
         logger.warning("No query provided for embedding.")
         return "No query"
 
     try:
         document = Document(page_content=query)
-        vector = embeddings.embed_query(document.page_content)
+        vector = query_vector if query_vector is not None else embeddings.embed_query(document.page_content)
         logger.debug(f"Embedding query: len={len(vector)}, preview={vector[:5]}")
 
-        # Insert Query into the class
-        client.data_object.create(
-            data_object={"content": document.page_content},
-            class_name=QUERY_CLASS,
-            vector=vector,
-        )
-
-        return "Query embedded and added to Weaviate"
+        # Queue the query for the QueryVector class, never waits on Weaviate
+        if query_log_writer.submit({"content": document.page_content, "vector": vector}):
+            return "Query embedded and queued for Weaviate"
+        return "Query embedded, logging skipped (buffer full)"
     except Exception as e:
         logger.error(f"Embedding failed: {e}")
         return f"Embedding error: {e}"
 
 
+# === Document Chunks for the local vector index ===
+def _chunk_row(obj) -> dict:
+    vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+    return {"id": str(obj.uuid), "vector": vector, **{name: obj.properties.get(name) for name in CHUNK_PROPERTIES}}
+
+
+async def iter_document_chunks():
+    collection = client.collections.get(DOCUMENT_CLASS)
+    async for obj in collection.iterator(
+        include_vector=True, return_properties=CHUNK_PROPERTIES, cache_size=CHUNK_FETCH_PAGE_SIZE
+    ):
+        yield _chunk_row(obj)
+
+
+# Chunks by id, or every chunk of one document part
+async def fetch_document_chunks(ids: list[str] = None, doc_id: str = None, part: int = None) -> list[dict]:
+    if ids:
+        filters = Filter.by_id().contains_any(ids)
+    else:
+        filters = Filter.by_property("doc_id").equal(doc_id) & Filter.by_property("part").equal(part)
+
+    collection = client.collections.get(DOCUMENT_CLASS)
+    rows, offset = [], 0
+    while True:
+        response = await collection.query.fetch_objects(
+            filters=filters,
+            limit=CHUNK_FETCH_PAGE_SIZE,
+            offset=offset,
+            include_vector=True,
+            return_properties=CHUNK_PROPERTIES,
+        )
+        rows.extend(_chunk_row(obj) for obj in response.objects)
+        if len(response.objects) < CHUNK_FETCH_PAGE_SIZE:
+            return rows
+        offset += CHUNK_FETCH_PAGE_SIZE
+
+
+async def count_document_chunks() -> int:
+    response = await client.collections.get(DOCUMENT_CLASS).aggregate.over_all(total_count=True)
+    return response.total_count
+
+
+# In-process mirror of DocumentChunk (VECTOR_INDEX_ENABLED), kept current by ingestion events
+vector_index = VectorIndexMirror(iter_document_chunks, fetch_document_chunks, count_document_chunks)
+
+
 # === Semantic Search in Document Chunks ===
-def search_similar_documents(query: str, top_k: int = 3):
+# raise_errors: let embedding / Weaviate failures propagate instead of answering [] (batch endpoints
+# report them per query, "no results" would be indistinguishable from an empty collection)
+async def search_similar_documents(query: str, top_k: int = 3, query_vector: list[float] = None,
+                                   raise_errors: bool = False):
     if not query:
         logger.warning("No query provided for search.")
         return []
 
     try:
-        query_vector = embeddings.embed_query(query)
-
-        response = (
-            client.query.get(DOCUMENT_CLASS, ["content"])
-            .with_near_vector({"vector": query_vector})
-            .with_additional(["distance"])
-            .with_limit(top_k)
-            .do()
+        if query_vector is None:
+            query_vector = await get_query_vector(query)
+
+        if vector_index.ready:
+            try:
+                documents = await asyncio.to_thread(vector_index.search, query_vector, top_k)
+                logger.info(f"Found {len(documents)} similar documents in the local index for query: '{query}'")
+                return documents
+            except Exception as e:
+                logger.warning(f"Local vector index search failed, querying Weaviate: {e}")
+
+        collection = client.collections.get(DOCUMENT_CLASS)
+        response = await collection.query.near_vector(
+            near_vector=query_vector,
+            limit=top_k,
+            return_metadata=MetadataQuery(distance=True),
+            return_properties=CHUNK_PROPERTIES,
         )
 
-        results = response["data"]["Get"].get(DOCUMENT_CLASS, [])
+        # doc_id/part/offsets let the context packer merge overlapping chunks
         documents = [
             {
-                "content": obj.get("content", ""),
-                "distance": obj.get("_additional", {}).get("distance", None),
+                "content": obj.properties.get("content", ""),
+                "distance": obj.metadata.distance,
+                "doc_id": obj.properties.get("doc_id"),
+                "part": obj.properties.get("part"),
+                "start_offset": obj.properties.get("start_offset"),
+                "end_offset": obj.properties.get("end_offset"),
             }
-            for obj in results
+            for obj in response.objects
         ]
 
         logger.info(f"Found {len(documents)} similar documents for query: '{query}'")
@@ -101,82 +251,6 @@ def search_similar_documents(query: str, top_k: int = 3):
 
     except Exception as e:
         logger.error(f"Semantic search failed: {e}")
+        if raise_errors:
+            raise
         return []
-
-
-# async def instantiate_and_connect() -> WeaviateAsyncClient:
-#     global client
-#     client = weaviate.Client(url=WEAVIATE_URL)
-#     await client.connect()
-#     ready = await client.is_ready()
-#     logger.info(f"Connected to Weaviate: {ready}")
-#     return client
-
-
-# client = weaviate.WeaviateAsyncClient(
-#     connection_params=ConnectionParams.from_params(
-#         http_host=WEAVIATE_HOST,
-#         http_port=WEAVIATE_HTTP_PORT,
-#         http_secure=False,
-#         grpc_host=WEAVIATE_HOST,
-#         grpc_port=WEAVIATE_GRPC_PORT,
-#         grpc_secure=False,
-#     ),
-#     additional_config=AdditionalConfig(grpc_timeout=10)  # Optional timeout
-# )
-# await client.connect()
-# ready = await client.is_ready()
-# logger.info(f"Connected to Weaviate: {ready}")
-# return client
-
-# # === Query Embedding (optional) ===
-# async def embed_query(query: str) -> str:
-#     if not query:
-#         logger.warning("No query provided for embedding.")
-#         return "No query"
-
-#     try:
-#         document = Document(page_content=query)
-#         vector = embeddings.embed_query(document.page_content)
-#         logger.debug(f"Embedding query: len={len(vector)}, preview={vector[:5]}")
-
-#         # Get Collection class in Weaviate (Query Class)
-#         collection = client.collections.get(QUERY_CLASS)
-#         # Insert Query into Collection class (Query Class)
-#         await collection.data.insert(
-#             properties={"content": document.page_content},
-#             vector=vector
-#         )
-#         return "Query embedded and added to Weaviate"
-#     except Exception as e:
-#         logger.error(f"Embedding failed: {e}")
-#         return f"Embedding error: {e}"
-
-# # === Semantic Search in Document Chunks ===
-# async def search_similar_documents(query: str, top_k: int = 3):
-#     if not query:
-#         logger.warning("No query provided for search.")
-#         return []
-
-#     try:
-#         query_vector = embeddings.embed_query(query)
-#         collection = client.collections.get(DOCUMENT_CLASS)
-
-#         results = await collection.query.near_vector(query_vector)\
-#                                      .with_limit(top_k)\
-#                                      .with_additional(['distance'])\
-#                                      .do()
-
-#         documents = [
-#             {
-#                 "content": obj.properties.get("content", ""),
-#                 "distance": obj.additional.get("distance", None)
-#             }
-#             for obj in results.objects
-#         ]
-
-#         logger.info(f"Found {len(documents)} similar documents for query: '{query}'")
-#         return documents
-#     except Exception as e:
-#         logger.error(f"Semantic search failed: {e}")
-#         return []
@@ -0,0 +1,95 @@
+# rag-service/app/services/ingestion_events.py
+
+import asyncio
+import json
+import os
+import aio_pika
+from loguru import logger
+
+RABBITMQ_URL = os.getenv("RABBITMQ_URL")
+
+# Fanout exchange the ingestion service publishes to after storing chunks, every rag worker gets every event
+INGESTION_EVENTS_EXCHANGE = "ingestion_events"
+INGESTION_EVENTS_RETRY_SECONDS = float(os.getenv("INGESTION_EVENTS_RETRY_SECONDS", 10))
+
+
+'''
+IngestionEventSubscriber: consumes ingestion events through a private, auto-deleted queue
+add_handler: registers a callable(event) run for every event
+start: connects in the background (retrying until RabbitMQ is reachable) so the service starts without it
+stop: closes the connection
+
+Events:
+    {"type": "chunks_stored", "doc_id", "part", "ids": [...], "vectors": [...]}
+    vectors (and ids) are null when the part had too many chunks to ship them
+    {"type": "resync"} is raised locally once subscribed and after a reconnect: chunks stored before the
+    queue was bound (while this service was down or starting) or while disconnected sent it no event
+'''
+class IngestionEventSubscriber:
+    def __init__(self, url: str = RABBITMQ_URL):
+        self.url = url
+        self.handlers = []
+        self.received = 0
+        self.connection = None
+        self._task = None
+
+    def add_handler(self, handler):
+        self.handlers.append(handler)
+
+    def start(self):
+        if not self.url:
+            logger.warning("RABBITMQ_URL not set, ingestion events disabled")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._connect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def _connect(self):
+        while True:
+            try:
+                self.connection = await aio_pika.connect_robust(self.url)
+                break
+            except Exception as e:
+                logger.warning(f"Ingestion events: RabbitMQ unavailable ({e}), retrying in {INGESTION_EVENTS_RETRY_SECONDS}s")
+                await asyncio.sleep(INGESTION_EVENTS_RETRY_SECONDS)
+
+        channel = await self.connection.channel()
+        exchange = await channel.declare_exchange(INGESTION_EVENTS_EXCHANGE, aio_pika.ExchangeType.FANOUT, durable=True)
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange)
+        await queue.consume(self._on_message, no_ack=True)
+        self.connection.reconnect_callbacks.add(self._on_reconnect)
+        logger.success(f"Subscribed to {INGESTION_EVENTS_EXCHANGE}, resyncing")
+        # Answers persisted before a restart were never invalidated by what was ingested meanwhile
+        self._dispatch({"type": "resync"})
+
+    def _on_reconnect(self, *_):
+        logger.warning("Ingestion events: reconnected, resyncing")
+        self._dispatch({"type": "resync"})
+
+    async def _on_message(self, message: aio_pika.IncomingMessage):
+        try:
+            event = json.loads(message.body.decode())
+        except ValueError as e:
+            logger.error(f"Ingestion events: invalid message: {e}")
+            return
+        self.received += 1
+        self._dispatch(event)
+
+    def _dispatch(self, event: dict):
+        for handler in self.handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Ingestion event handler {getattr(handler, '__name__', handler)} failed: {e}")
+
+
+# Process-wide subscriber, started and stopped with the app
+ingestion_events = IngestionEventSubscriber()
@@ -1,8 +1,10 @@
 # rag-service\app\services\llm_service
 
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from loguru import logger
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.context_packer import CONTEXT_SEPARATOR, ContextPacker
 
 # from app.services.embedding_store import (
 #     search_similar_documents,
@@ -12,13 +14,30 @@ from loguru import logger
 # OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Used by the streaming endpoint, deltas are forwarded as they arrive
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Answers reused for paraphrased queries until new chunks could change their context
+answer_cache = SemanticAnswerCache()
+
+
+def invalidate_cached_answers(event: dict):
+    # Ingestion event handler: newly stored chunks may enter the context of cached answers
+    if event.get("type") == "chunks_stored":
+        answer_cache.invalidate(event.get("vectors"))
+    elif event.get("type") == "resync":
+        answer_cache.invalidate()
+
+
+# Merges overlapping chunks, drops near-duplicates and caps the context at CONTEXT_TOKEN_BUDGET tokens
+context_packer = ContextPacker()
 
 
 def construct_prompt(query: str, documents: list) -> str:
 
     # Construct a prompt for the LLM combining user query and retrieved docs.
 
-    context_text = "\n\n---\n\n".join([doc["content"] for doc in documents])
+    context_text = CONTEXT_SEPARATOR.join(context_packer.pack(documents))
 
     prompt = (
         "You are an AI assistant. Use the following context to answer the question below. "
@@ -59,3 +78,31 @@ def generate_response_from_query(
     except Exception as e:
         logger.error(f"Failed to generate response from OpenAI: {e}")
         return f"Error: {e}"
+
+
+async def stream_response_from_query(
+    query: str, documents: list, model: str = "gpt-3.5-turbo", max_tokens: int = 512
+):
+    # Same prompt as generate_response_from_query, yields the answer piece by piece
+    if not query:
+        logger.warning("No query provided to LLM service.")
+        yield "Please provide a valid query."
+        return
+
+    if not documents:
+        logger.info("No relevant documents found for query. LLM call denied.")
+        yield "No relevant documents found to answer the question."
+        return
+
+    prompt = construct_prompt(query, documents)
+
+    stream = await async_client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=0.7,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
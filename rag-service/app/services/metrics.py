@@ -0,0 +1,42 @@
+# rag-service/app/services/metrics.py
+
+import os
+import threading
+from collections import deque
+
+# Percentiles are computed over this many most recent samples
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", 1000))
+
+
+'''
+LatencyStats: latency distribution over a sliding window of recent samples
+observe: records one duration in milliseconds
+snapshot: count since start plus mean/p50/p95/p99 over the window, for /rag/metrics
+'''
+class LatencyStats:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.count = 0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.count += 1
+            self._samples.append(ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 2)
+
+        return {
+            "count": self.count,
+            "mean_ms": round(sum(samples) / len(samples), 2),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+        }
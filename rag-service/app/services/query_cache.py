@@ -0,0 +1,69 @@
+# rag-service/app/services/query_cache.py
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Query text -> embedding cache, repeated questions skip the model entirely
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 2048))  # 0 disables the cache
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", 3600))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    # Case and spacing do not change what is asked, so they share one entry
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+'''
+QueryVectorCache: bounded LRU of query vectors with a time to live
+get: returns the cached vector for a query or None, refreshing its recency
+put: stores a vector, evicting the least recently used entry beyond max_size
+stats: hit/miss counters for the metrics endpoint
+'''
+class QueryVectorCache:
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # normalized query -> (expires_at, vector)
+        self._lock = threading.Lock()
+
+    def get(self, query: str):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query: str, vector: list[float]):
+        if self.max_size <= 0:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,100 @@
+# rag-service/app/services/query_log_writer.py
+
+import asyncio
+import os
+from loguru import logger
+
+# Queries waiting to be written to QueryVector, beyond this new ones are dropped instead of blocking /rag/reply
+QUERY_LOG_BUFFER_SIZE = int(os.getenv("QUERY_LOG_BUFFER_SIZE", 1000))
+# A batch is written once it holds QUERY_LOG_BATCH_SIZE queries or its oldest query waited QUERY_LOG_FLUSH_MS
+QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", 50))
+QUERY_LOG_FLUSH_MS = float(os.getenv("QUERY_LOG_FLUSH_MS", 1000))
+
+
+'''
+QueryLogWriter: bounded buffer drained by one background task that writes in batches
+submit: queues one item without waiting, returns False (and counts a drop) when the buffer is full
+start / stop: run the writer task, stop flushes what is still buffered
+flush_fn: async callable(list[item]) -> number of failed items
+'''
+class QueryLogWriter:
+    def __init__(self, flush_fn, buffer_size: int = QUERY_LOG_BUFFER_SIZE, batch_size: int = QUERY_LOG_BATCH_SIZE,
+                 flush_ms: float = QUERY_LOG_FLUSH_MS):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._task = None
+
+    def submit(self, item) -> bool:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Query log buffer full, {self.dropped} queries dropped so far")
+            return False
+        self.submitted += 1
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Write whatever is left so a clean shutdown loses nothing
+        while not self.queue.empty():
+            await self._write(self._take(self.batch_size))
+
+    def _take(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                batch.extend(self._take(self.batch_size - len(batch)))
+            await self._write(batch)
+
+    async def _write(self, batch: list):
+        if not batch:
+            return
+        try:
+            failed = await self.flush_fn(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} logged queries: {e}")
+            failed = len(batch)
+        self.failed += failed
+        self.written += len(batch) - failed
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self.queue.qsize(),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
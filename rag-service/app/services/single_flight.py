@@ -0,0 +1,41 @@
+# rag-service/app/services/single_flight.py
+
+import asyncio
+
+
+'''
+SingleFlight: concurrent calls with the same key share one execution
+run: starts fn() for a new key, or waits for the execution already in flight for it
+
+The execution runs as its own task, so a caller that disconnects does not cancel it for the
+others. Every caller gets the same result object (treat it as read-only) or the same exception.
+'''
+class SingleFlight:
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def run(self, key, fn):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _release(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        requests = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / requests if requests else 0.0,
+        }
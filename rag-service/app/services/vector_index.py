@@ -0,0 +1,420 @@
+# rag-service/app/services/vector_index.py
+
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from loguru import logger
+
+try:
+    import hnswlib
+except ImportError:  # exact search only
+    hnswlib = None
+
+# Serve DocumentChunk searches from an in-process mirror instead of Weaviate (Weaviate stays the fallback)
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() == "true"
+# Snapshot directory, shared by the workers and replicas that mount it
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "/data/vector_index")
+# From this many chunks on the mirror is searched with HNSW (when hnswlib is installed), below it exactly
+VECTOR_INDEX_HNSW_THRESHOLD = int(os.getenv("VECTOR_INDEX_HNSW_THRESHOLD", 50000))
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", 16))
+VECTOR_INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_INDEX_HNSW_EF_CONSTRUCTION", 200))
+VECTOR_INDEX_HNSW_EF = int(os.getenv("VECTOR_INDEX_HNSW_EF", 128))
+# An updated mirror is written back at most this often, so new replicas start from a recent snapshot
+VECTOR_INDEX_SAVE_SECONDS = float(os.getenv("VECTOR_INDEX_SAVE_SECONDS", 300))
+VECTOR_INDEX_RETRY_SECONDS = float(os.getenv("VECTOR_INDEX_RETRY_SECONDS", 30))
+
+# Snapshot generations kept on disk, the current one and the one before it
+VECTOR_INDEX_KEEP_GENERATIONS = 2
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "lock"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _RecordFile:
+    # Chunk properties of a snapshot: one JSON line per row, offsets[row]:offsets[row + 1] into the mapped file
+    def __init__(self, path: str, offsets: np.ndarray):
+        self.offsets = offsets
+        with open(path, "rb") as f:
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+
+    def __getitem__(self, row: int) -> dict:
+        return json.loads(self.blob[self.offsets[row]:self.offsets[row + 1]])
+
+
+'''
+VectorIndex: DocumentChunk vectors and properties, searched by cosine distance (as Weaviate does)
+build: index over rows fetched from Weaviate [{"id", "vector", "content", "doc_id", "part", "start_offset", "end_offset"}]
+load / save: snapshot directory, vectors, ids and properties are memory-mapped so workers share the pages
+upsert: adds chunks, a known id replaces its previous row (the old row is only marked dead)
+search: top_k rows as search_similar_documents returns them
+
+Rows are never removed, so HNSW labels stay valid across saves; a full rebuild compacts them.
+Small corpora are searched exactly with one matrix-vector product, HNSW is chosen when the index
+is built or loaded with at least hnsw_threshold live rows.
+'''
+class VectorIndex:
+    def __init__(self, vectors: np.ndarray, ids: list[str], records, dead: np.ndarray = None,
+                 hnsw_threshold: int = VECTOR_INDEX_HNSW_THRESHOLD):
+        self.dim = vectors.shape[1]
+        self.hnsw_threshold = hnsw_threshold
+        self._base = vectors
+        self._base_records = records
+        self._n_base = len(vectors)
+        self._ids = list(ids)
+        self._delta = np.empty((0, self.dim), dtype=np.float32)
+        self._delta_records = []
+        self._dead = np.zeros(self._n_base, dtype=bool) if dead is None else np.array(dead, dtype=bool)
+        self._rows = {id_: row for row, id_ in enumerate(self._ids) if not self._dead[row]}
+        self.live = len(self._rows)
+        self._hnsw = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._n_base + len(self._delta_records)
+
+    @property
+    def backend(self) -> str:
+        return "hnsw" if self._hnsw is not None else "exact"
+
+    @classmethod
+    def build(cls, rows: list[dict], hnsw_threshold: int = VECTOR_INDEX_HNSW_THRESHOLD) -> "VectorIndex":
+        dim = len(rows[0]["vector"]) if rows else 0
+        vectors = _normalize(np.asarray([row["vector"] for row in rows], dtype=np.float32).reshape(len(rows), dim))
+        records = [{key: value for key, value in row.items() if key != "vector"} for row in rows]
+        # Duplicate ids (an object updated during the fetch) keep their last row
+        dead = np.zeros(len(rows), dtype=bool)
+        seen = {}
+        for row, record in enumerate(records):
+            if record["id"] in seen:
+                dead[seen[record["id"]]] = True
+            seen[record["id"]] = row
+        index = cls(vectors, [record["id"] for record in records], records, dead, hnsw_threshold)
+        index._ensure_hnsw()
+        return index
+
+    @classmethod
+    def load(cls, path: str, hnsw_threshold: int = VECTOR_INDEX_HNSW_THRESHOLD):
+        # None when there is no snapshot yet
+        try:
+            with open(os.path.join(path, CURRENT_FILE)) as f:
+                directory = os.path.join(path, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        ids = [id_.decode() for id_ in np.load(os.path.join(directory, "ids.npy"))]
+        offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        records = _RecordFile(os.path.join(directory, "records.jsonl"), offsets)
+        dead = np.load(os.path.join(directory, "dead.npy"))
+        index = cls(vectors, ids, records, dead, hnsw_threshold)
+
+        hnsw_path = os.path.join(directory, "hnsw.bin")
+        if hnswlib is not None and os.path.exists(hnsw_path):
+            hnsw = hnswlib.Index(space="ip", dim=index.dim)
+            hnsw.load_index(hnsw_path, max_elements=max(index.size, 1))
+            hnsw.set_ef(VECTOR_INDEX_HNSW_EF)
+            index._hnsw = hnsw
+        index._ensure_hnsw()
+        logger.info(f"Vector index loaded from {directory}: {index.live} chunks ({index.backend})")
+        return index
+
+    def _ensure_hnsw(self):
+        if self._hnsw is not None or self.live < self.hnsw_threshold:
+            return
+        if hnswlib is None:
+            logger.warning(f"Vector index has {self.live} chunks but hnswlib is not installed, searching exactly")
+            return
+        start = time.perf_counter()
+        hnsw = hnswlib.Index(space="ip", dim=self.dim)
+        hnsw.init_index(max_elements=self.size, M=VECTOR_INDEX_HNSW_M, ef_construction=VECTOR_INDEX_HNSW_EF_CONSTRUCTION)
+        hnsw.add_items(self._base, np.arange(self._n_base))
+        for row in np.flatnonzero(self._dead):
+            hnsw.mark_deleted(int(row))
+        hnsw.set_ef(VECTOR_INDEX_HNSW_EF)
+        self._hnsw = hnsw
+        logger.info(f"Built HNSW over {self.live} chunks in {time.perf_counter() - start:.1f}s")
+
+    def _record(self, row: int, delta_records: list) -> dict:
+        if row < self._n_base:
+            return self._base_records[row]
+        return delta_records[row - self._n_base]
+
+    def upsert(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        vectors = _normalize(np.asarray([row["vector"] for row in rows], dtype=np.float32))
+        records = [{key: value for key, value in row.items() if key != "vector"} for row in rows]
+
+        with self._lock:
+            if self.size == 0:
+                # An index built from an empty collection takes the dimension of its first chunks
+                self.dim = vectors.shape[1]
+                self._base = np.empty((0, self.dim), dtype=np.float32)
+                self._delta = np.empty((0, self.dim), dtype=np.float32)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            first = self.size
+            # Copy on write: a search running in another thread keeps the arrays it started with
+            dead = np.concatenate((self._dead, np.zeros(len(rows), dtype=bool)))
+            for offset, record in enumerate(records):
+                previous = self._rows.get(record["id"])
+                if previous is not None:
+                    dead[previous] = True
+                    self.live -= 1
+                    if self._hnsw is not None and previous < first:
+                        self._hnsw.mark_deleted(previous)
+                self._rows[record["id"]] = first + offset
+                self.live += 1
+
+            if self._hnsw is not None:
+                if self._hnsw.get_max_elements() < first + len(rows):
+                    self._hnsw.resize_index(max(2 * self._hnsw.get_max_elements(), first + len(rows)))
+                self._hnsw.add_items(vectors, np.arange(first, first + len(rows)))
+                # Duplicates inside this batch are marked once they exist in the graph
+                for row in np.flatnonzero(dead[first:]):
+                    self._hnsw.mark_deleted(int(first + row))
+
+            self._ids = self._ids + [record["id"] for record in records]
+            self._delta = np.vstack((self._delta, vectors))
+            self._delta_records = self._delta_records + records
+            self._dead = dead
+        return len(rows)
+
+    def search(self, vector: list[float], top_k: int = 3) -> list[dict]:
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+
+        with self._lock:
+            k = min(top_k, self.live)
+            if k == 0:
+                return []
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Query dimension {query.shape[0]} does not match index dimension {self.dim}")
+            # One consistent snapshot: upsert swaps these arrays (and the base of an empty index) under the lock
+            base, delta, delta_records, dead, hnsw = self._base, self._delta, self._delta_records, self._dead, self._hnsw
+            if hnsw is not None:
+                labels, distances = hnsw.knn_query(query, k=k)
+                rows, distances = labels[0], distances[0]
+
+        if hnsw is None:
+            scores = np.concatenate((base @ query, delta @ query))
+            scores[dead] = -np.inf
+            rows = np.argpartition(-scores, k - 1)[:k]
+            rows = rows[np.argsort(-scores[rows])]
+            distances = 1.0 - scores[rows]
+
+        documents = []
+        for row, distance in zip(rows, distances):
+            record = self._record(int(row), delta_records)
+            documents.append({
+                "content": record.get("content", ""),
+                "distance": float(distance),
+                "doc_id": record.get("doc_id"),
+                "part": record.get("part"),
+                "start_offset": record.get("start_offset"),
+                "end_offset": record.get("end_offset"),
+            })
+        return documents
+
+    def save(self, path: str) -> str:
+        with self._lock:
+            size, ids, base, delta, delta_records, dead = (
+                self.size, self._ids, self._base, self._delta, self._delta_records, self._dead
+            )
+            live, dim = self.live, self.dim
+            name = f"gen-{time.time_ns()}"
+            directory = os.path.join(path, name)
+            staging = directory + ".tmp"
+            os.makedirs(staging)
+            # hnswlib must not be written while items are added
+            if self._hnsw is not None:
+                self._hnsw.save_index(os.path.join(staging, "hnsw.bin"))
+
+        np.save(os.path.join(staging, "vectors.npy"), np.vstack((base, delta)).astype(np.float32, copy=False))
+        np.save(os.path.join(staging, "ids.npy"), np.array(ids, dtype="S"))
+        np.save(os.path.join(staging, "dead.npy"), dead)
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        with open(os.path.join(staging, "records.jsonl"), "wb") as f:
+            for row in range(size):
+                line = json.dumps(self._record(row, delta_records)).encode() + b"\n"
+                f.write(line)
+                offsets[row + 1] = offsets[row] + len(line)
+        np.save(os.path.join(staging, "offsets.npy"), offsets)
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump({"rows": size, "live": live, "dim": dim, "saved_at": time.time()}, f)
+
+        # Publish atomically: rename the directory, then switch CURRENT to it
+        os.rename(staging, directory)
+        with open(os.path.join(path, CURRENT_FILE + ".tmp"), "w") as f:
+            f.write(name)
+        os.replace(os.path.join(path, CURRENT_FILE + ".tmp"), os.path.join(path, CURRENT_FILE))
+
+        # The previous generation stays: a worker may still be loading it or not have reloaded yet.
+        # Older ones go, with staging directories older than what is kept (a crashed save's leftovers).
+        def generation(entry: str) -> int:
+            return int(entry[len("gen-"):].removesuffix(".tmp"))
+
+        entries = [entry for entry in os.listdir(path) if entry.startswith("gen-")]
+        published = sorted((entry for entry in entries if not entry.endswith(".tmp")), key=generation)
+        oldest_kept = generation(published[-VECTOR_INDEX_KEEP_GENERATIONS:][0])
+        for entry in entries:
+            if generation(entry) < oldest_kept:
+                shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+        logger.info(f"Vector index snapshot saved to {directory}: {live} chunks")
+        return directory
+
+
+'''
+VectorIndexMirror: keeps a VectorIndex in step with the DocumentChunk collection
+start: loads the shared snapshot (or builds it from Weaviate) in the background, then applies ingestion events
+handle_event: ingestion event handler, queues the event for the background task
+search: VectorIndex.search, only valid once ready
+stop: saves pending updates
+
+Functions passed in:
+    fetch_all() -> async iterator over every chunk row
+    fetch_chunks(ids=None, doc_id=None, part=None) -> chunk rows by id, or of one document part
+    count() -> number of chunks in Weaviate
+
+A snapshot whose chunk count differs from Weaviate's is rebuilt. Loads and rebuilds hold a file
+lock, so one worker builds while the others wait and then map its snapshot.
+'''
+class VectorIndexMirror:
+    def __init__(self, fetch_all, fetch_chunks, count, path: str = VECTOR_INDEX_PATH,
+                 enabled: bool = VECTOR_INDEX_ENABLED, hnsw_threshold: int = VECTOR_INDEX_HNSW_THRESHOLD):
+        self.fetch_all = fetch_all
+        self.fetch_chunks = fetch_chunks
+        self.count = count
+        self.path = path
+        self.enabled = enabled
+        self.hnsw_threshold = hnsw_threshold
+        self.index = None
+        self.applied = 0
+        self.rebuilds = 0
+        self._events = asyncio.Queue()
+        self._task = None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    def search(self, vector: list[float], top_k: int = 3) -> list[dict]:
+        return self.index.search(vector, top_k)
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self._task is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._dirty:
+            await asyncio.to_thread(self._save)
+
+    def handle_event(self, event: dict):
+        if self._task is not None and event.get("type") in ("chunks_stored", "resync"):
+            self._events.put_nowait(event)
+
+    async def _run(self):
+        while self.index is None:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Vector index unavailable, searching Weaviate: {e}")
+                await asyncio.sleep(VECTOR_INDEX_RETRY_SECONDS)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(self._events.get(), timeout=VECTOR_INDEX_SAVE_SECONDS)
+            except asyncio.TimeoutError:
+                event = None
+            try:
+                if event is None:
+                    pass
+                elif event["type"] == "chunks_stored":
+                    await self.apply(event)
+                else:
+                    await self.sync()
+                if self._dirty and time.monotonic() - self._saved_at >= VECTOR_INDEX_SAVE_SECONDS:
+                    await asyncio.to_thread(self._save)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The mirror may now miss chunks: reconcile with Weaviate once it is reachable again
+                logger.error(f"Vector index update failed, resyncing: {e}")
+                await asyncio.sleep(VECTOR_INDEX_RETRY_SECONDS)
+                self._events.put_nowait({"type": "resync"})
+
+    async def apply(self, event: dict):
+        # Events carry vectors but not the chunk text, the rows are read back from Weaviate
+        if event.get("ids"):
+            rows = await self.fetch_chunks(ids=event["ids"])
+        else:
+            rows = await self.fetch_chunks(doc_id=event.get("doc_id"), part=event.get("part"))
+        if rows:
+            self.applied += await asyncio.to_thread(self.index.upsert, rows)
+            self._dirty = True
+
+    async def sync(self):
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+            await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+            try:
+                expected = await self.count()
+                index = self.index
+                if index is None or index.live != expected:
+                    index = await asyncio.to_thread(VectorIndex.load, self.path, self.hnsw_threshold)
+                if index is None or index.live != expected:
+                    logger.info(f"Building vector index from Weaviate ({expected} chunks)")
+                    rows = [row async for row in self.fetch_all()]
+                    index = await asyncio.to_thread(VectorIndex.build, rows, self.hnsw_threshold)
+                    await asyncio.to_thread(index.save, self.path)
+                    self.rebuilds += 1
+                self.index = index
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        # Every worker applies the same events, whichever gets the lock writes the snapshot
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            try:
+                self.index.save(self.path)
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        stats = {"enabled": self.enabled, "ready": self.ready}
+        if self.index is not None:
+            stats.update(
+                backend=self.index.backend,
+                chunks=self.index.live,
+                rows=self.index.size,
+                pending_events=self._events.qsize(),
+                applied=self.applied,
+                rebuilds=self.rebuilds,
+            )
+        return stats
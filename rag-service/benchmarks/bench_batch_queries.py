@@ -0,0 +1,99 @@
+# rag-service/benchmarks/bench_batch_queries.py
+
+'''
+Compares the batch endpoints with looping over the single-query endpoint.
+
+    http      : against a running rag-service
+                single       POST /rag/reply once per query, one after another (what evaluation jobs did)
+                reply_batch  POST /rag/reply_batch in batches of --batch-size
+                search_batch POST /rag/search_batch in batches of --batch-size (retrieval only)
+    embedding : in-process, the embedding part alone
+                single       embed_query once per query
+                batched      one embed_documents call
+
+Every mode gets its own query set, so the query and answer caches do not favour the later runs.
+
+Usage (from rag-service/):
+    python benchmarks/bench_batch_queries.py http --url http://localhost:8003 --queries 200
+    python benchmarks/bench_batch_queries.py embedding --queries 200
+'''
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+WORDS = (
+    "technology society healthcare ethics data privacy model network energy education research policy "
+    "automation infrastructure communication industry analysis system development innovation"
+).split()
+TEMPLATES = ["What is the role of {} in {}?", "How does {} affect {}?", "Why is {} important for {}?"]
+
+
+def make_queries(count: int, tag: str) -> list[str]:
+    rng = random.Random(tag)
+    return [f"{rng.choice(TEMPLATES).format(*rng.sample(WORDS, 2))} ({tag} {i})" for i in range(count)]
+
+
+def report(name: str, count: int, elapsed: float):
+    print(f"{name:13s} {elapsed:8.2f}s  {count / elapsed:8.1f} queries/s")
+
+
+async def bench_http(args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        queries = make_queries(args.queries, "single")
+        start = time.perf_counter()
+        for query in queries:
+            (await client.post("/rag/reply", json={"query": query})).raise_for_status()
+        report("single", len(queries), time.perf_counter() - start)
+
+        for endpoint in ("reply_batch", "search_batch"):
+            queries = make_queries(args.queries, endpoint)
+            start = time.perf_counter()
+            for i in range(0, len(queries), args.batch_size):
+                batch = queries[i:i + args.batch_size]
+                (await client.post(f"/rag/{endpoint}", json={"queries": batch})).raise_for_status()
+            report(endpoint, len(queries), time.perf_counter() - start)
+
+
+def bench_embedding(args):
+    from shared.embedding_backends import load_embeddings
+
+    embeddings = load_embeddings()
+    embeddings.embed_documents(make_queries(8, "warmup"))
+
+    queries = make_queries(args.queries, "single")
+    start = time.perf_counter()
+    for query in queries:
+        embeddings.embed_query(query)
+    report("single", len(queries), time.perf_counter() - start)
+
+    queries = make_queries(args.queries, "batched")
+    start = time.perf_counter()
+    embeddings.embed_documents(queries)
+    report("batched", len(queries), time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["http", "embedding"])
+    parser.add_argument("--url", default="http://localhost:8003")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.mode == "http":
+        asyncio.run(bench_http(args))
+    else:
+        bench_embedding(args)
+
+
+if __name__ == "__main__":
+    main()
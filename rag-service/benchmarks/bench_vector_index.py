@@ -0,0 +1,69 @@
+# rag-service/benchmarks/bench_vector_index.py
+
+'''
+Local vector index on synthetic unit vectors: build time, snapshot load time (memory-mapped),
+search latency and recall@k of HNSW against exact search.
+
+Usage (from rag-service/):
+    python benchmarks/bench_vector_index.py --chunks 100000 --dim 768 --queries 500
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.vector_index import VectorIndex  # noqa: E402
+
+
+def latency(index, queries, top_k):
+    samples, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([doc["content"] for doc in index.search(query, top_k)])
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)], results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.chunks, args.dim)).astype(np.float32)
+    rows = [{"id": str(i), "vector": vector, "content": str(i)} for i, vector in enumerate(vectors)]
+    queries = vectors[rng.integers(0, args.chunks, args.queries)] + rng.normal(scale=0.5, size=(args.queries, args.dim))
+
+    exact_results = None
+    for name, threshold in (("exact", args.chunks + 1), ("hnsw", 0)):
+        start = time.perf_counter()
+        index = VectorIndex.build(rows, hnsw_threshold=threshold)
+        built = time.perf_counter() - start
+        if index.backend != name:
+            print(f"{name:6s} skipped (hnswlib not installed)")
+            continue
+
+        with tempfile.TemporaryDirectory() as path:
+            index.save(path)
+            start = time.perf_counter()
+            index = VectorIndex.load(path, hnsw_threshold=threshold)
+            loaded = time.perf_counter() - start
+            p50, p99, results = latency(index, queries, args.top_k)
+
+        exact_results = exact_results or results
+        recall = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(results, exact_results)])
+        print(f"{name:6s} build {built:6.1f}s  load {loaded:6.2f}s  search p50 {p50:6.2f}ms  p99 {p99:6.2f}ms  "
+              f"recall@{args.top_k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
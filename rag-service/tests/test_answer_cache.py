@@ -0,0 +1,96 @@
+import asyncio
+
+import numpy as np
+
+from app.services import ingestion_events
+from app.services.answer_cache import SemanticAnswerCache
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+DOCS = [{"content": "a", "distance": 0.1}, {"content": "b", "distance": 0.3}]
+
+
+def test_paraphrase_hits_and_survives_reopen(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    cache = SemanticAnswerCache(path, max_size=4, threshold=0.95)
+    cache.put("what is rag", unit(1, 0, 0), "retrieval augmented generation", DOCS, top_k=2)
+
+    assert cache.lookup(unit(1, 0.1, 0)) == "retrieval augmented generation"
+    assert cache.lookup(unit(0, 1, 0)) is None
+
+    reopened = SemanticAnswerCache(path, max_size=4, threshold=0.95)
+    assert reopened.lookup(unit(1, 0.1, 0)) == "retrieval augmented generation"
+
+
+def test_new_chunks_invalidate_only_answers_they_could_change():
+    cache = SemanticAnswerCache("", max_size=4, threshold=0.95, margin=0.0)
+    # Weakest context chunk has similarity 0.7
+    cache.put("x", unit(1, 0, 0), "about x", DOCS, top_k=2)
+    cache.put("y", unit(0, 1, 0), "about y", DOCS, top_k=2)
+
+    # Similar to x (0.8 >= 0.7) but not to y
+    assert cache.invalidate([unit(0.8, 0, 0.6)]) == 1
+    assert cache.lookup(unit(1, 0, 0)) is None
+    assert cache.lookup(unit(0, 1, 0)) == "about y"
+
+    assert cache.invalidate(None) == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_evicts_least_recently_used_and_expires():
+    now = [0.0]
+    cache = SemanticAnswerCache("", max_size=2, threshold=0.95, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("x", unit(1, 0, 0), "x", DOCS, top_k=2)
+    cache.put("y", unit(0, 1, 0), "y", DOCS, top_k=2)
+    cache.lookup(unit(1, 0, 0))
+    cache.put("z", unit(0, 0, 1), "z", DOCS, top_k=2)
+
+    assert cache.lookup(unit(0, 1, 0)) is None
+    assert cache.lookup(unit(1, 0, 0)) == "x"
+
+    now[0] = 11
+    assert cache.lookup(unit(0, 0, 1)) is None
+
+
+def test_restart_drops_persisted_answers_once_subscribed(tmp_path, monkeypatch):
+    path = str(tmp_path / "answers.sqlite3")
+    SemanticAnswerCache(path, max_size=4, threshold=0.95).put("what is rag", unit(1, 0, 0), "stale", DOCS, top_k=2)
+
+    class FakeQueue:
+        async def bind(self, exchange):
+            pass
+
+        async def consume(self, callback, no_ack=False):
+            pass
+
+    class FakeChannel:
+        async def declare_exchange(self, *args, **kwargs):
+            return None
+
+        async def declare_queue(self, *args, **kwargs):
+            return FakeQueue()
+
+    class FakeConnection:
+        reconnect_callbacks = set()
+
+        async def channel(self):
+            return FakeChannel()
+
+    async def connect_robust(url):
+        return FakeConnection()
+
+    monkeypatch.setattr(ingestion_events.aio_pika, "connect_robust", connect_robust)
+
+    # Restarted with the SQLite file of the previous run: chunks may have been stored meanwhile
+    reopened = SemanticAnswerCache(path, max_size=4, threshold=0.95)
+    assert reopened.stats()["size"] == 1
+    subscriber = ingestion_events.IngestionEventSubscriber("amqp://rabbitmq")
+    subscriber.add_handler(lambda event: event["type"] == "resync" and reopened.invalidate())
+    asyncio.run(subscriber._connect())
+
+    assert reopened.lookup(unit(1, 0, 0)) is None
+    assert SemanticAnswerCache(path, max_size=4, threshold=0.95).stats()["size"] == 0
@@ -0,0 +1,36 @@
+from app.services.context_packer import ContextPacker, LengthEstimateEncoding
+
+PART = "Alpha beta gamma delta. Epsilon zeta eta theta. Iota kappa lambda mu. Nu xi omicron pi."
+
+
+def chunk(start, end, doc_id="doc", part=0, **extra):
+    return {"content": PART[start:end], "doc_id": doc_id, "part": part, "start_offset": start, "end_offset": end, **extra}
+
+
+def packer(budget=1000):
+    return ContextPacker(budget=budget, encoding=LengthEstimateEncoding())
+
+
+def test_overlapping_and_adjacent_chunks_merge_into_one_passage():
+    # Most relevant first: the middle chunk, then one overlapping it, then one adjacent to the first
+    documents = [chunk(24, 48), chunk(40, 69), chunk(0, 23)]
+
+    assert packer().pack(documents) == [PART[0:23] + "\n" + PART[24:69]]
+
+
+def test_text_fallback_and_near_duplicates_from_other_documents():
+    documents = [
+        {"content": PART[0:48]},
+        {"content": PART[30:69]},  # overlaps the first one, no offsets
+        chunk(0, 69, doc_id="copy"),  # the same text uploaded as another document
+    ]
+
+    assert packer().pack(documents) == [PART[0:69]]
+
+
+def test_budget_takes_passages_by_relevance_and_truncates_the_first_if_needed():
+    documents = [chunk(0, 23, doc_id="a"), chunk(48, 88, doc_id="b"), chunk(24, 40, doc_id="c")]
+
+    # 6 + 2 (separator) + 4 tokens fit, the 10-token passage does not
+    assert packer(budget=14).pack(documents) == [PART[0:23], PART[24:40]]
+    assert packer(budget=2).pack(documents) == [PART[0:8]]
@@ -0,0 +1,13 @@
+from app.services.metrics import LatencyStats
+
+
+def test_percentiles_cover_only_the_recent_window():
+    stats = LatencyStats(window=100)
+    for ms in range(1000, 1010):
+        stats.observe(ms)
+    for ms in range(1, 101):
+        stats.observe(ms)
+
+    snapshot = stats.snapshot()
+    assert snapshot["count"] == 110
+    assert (snapshot["p50_ms"], snapshot["p99_ms"]) == (51, 100)
@@ -0,0 +1,34 @@
+from app.services.query_cache import QueryVectorCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lookup_ignores_case_and_spacing():
+    cache = QueryVectorCache(max_size=4, ttl_seconds=60)
+    cache.put("What is  RAG?", [1.0, 2.0])
+
+    assert cache.get("  what is rag? ") == [1.0, 2.0]
+    assert cache.get("what is a rag?") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_and_expired_entries():
+    clock = FakeClock()
+    cache = QueryVectorCache(max_size=2, ttl_seconds=10, clock=clock)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+
+    clock.now = 11
+    assert cache.get("c") is None
+    assert cache.stats()["size"] == 1
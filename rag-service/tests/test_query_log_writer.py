@@ -0,0 +1,43 @@
+import asyncio
+
+from app.services.query_log_writer import QueryLogWriter
+
+
+def test_drops_when_full_and_writes_in_batches():
+    batches = []
+
+    async def flush(batch):
+        batches.append(batch)
+        return 0
+
+    async def scenario():
+        writer = QueryLogWriter(flush, buffer_size=5, batch_size=2, flush_ms=10)
+        accepted = [writer.submit(i) for i in range(7)]
+        writer.start()
+        await asyncio.sleep(0.1)
+        await writer.stop()
+        return writer, accepted
+
+    writer, accepted = asyncio.run(scenario())
+
+    assert accepted == [True] * 5 + [False] * 2
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert writer.stats() == {"buffered": 0, "submitted": 5, "dropped": 2, "written": 5, "failed": 0}
+
+
+def test_stop_flushes_buffered_items():
+    batches = []
+
+    async def flush(batch):
+        batches.append(batch)
+        return 0
+
+    async def scenario():
+        writer = QueryLogWriter(flush, buffer_size=10, batch_size=4, flush_ms=60_000)
+        for i in range(6):
+            writer.submit(i)
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert batches == [[0, 1, 2, 3], [4, 5]]
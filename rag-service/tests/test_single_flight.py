@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return {"answer": value}
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            flight.run("q", lambda: work(1)),
+            flight.run("q", lambda: work(2)),
+            flight.run("other", lambda: work(3)),
+        )
+        # Finished keys start a new execution
+        again = await flight.run("q", lambda: work(4))
+        return flight, results, again
+
+    flight, results, again = asyncio.run(scenario())
+
+    assert calls == [1, 3, 4]
+    assert results[0] is results[1]
+    assert again == {"answer": 4}
+    assert flight.stats() == {"in_flight": 0, "executions": 3, "coalesced": 1, "coalesced_rate": 0.25}
+
+
+def test_failure_reaches_every_caller_and_cancelling_one_spares_the_rest():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run("q", fail))
+        second = asyncio.ensure_future(flight.run("q", fail))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(ValueError):
+            await second
+
+    asyncio.run(scenario())
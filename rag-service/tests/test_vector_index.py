@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from app.services.vector_index import VectorIndex, VectorIndexMirror
+
+
+def make_rows(count, dim=16, seed=0, prefix="chunk"):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": f"{prefix}-{i}", "vector": rng.normal(size=dim).tolist(), "content": f"text {i}",
+         "doc_id": "doc", "part": 0, "start_offset": i * 10, "end_offset": i * 10 + 9}
+        for i in range(count)
+    ]
+
+
+def exact_top(rows, query, k):
+    vectors = np.array([row["vector"] for row in rows])
+    scores = vectors @ query / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+    return [rows[i]["content"] for i in np.argsort(-scores)[:k]]
+
+
+def test_exact_search_upsert_and_snapshot_round_trip(tmp_path):
+    rows = make_rows(50)
+    index = VectorIndex.build(rows, hnsw_threshold=10**6)
+    query = np.array(rows[7]["vector"]) + 0.01
+
+    found = index.search(query, top_k=3)
+    assert index.backend == "exact"
+    assert [doc["content"] for doc in found] == exact_top(rows, query, 3)
+    assert found[0]["distance"] == pytest.approx(0.0, abs=1e-3)
+    assert found[0]["start_offset"] == 70
+
+    # Re-storing an id replaces its row instead of adding a second one
+    index.upsert([dict(rows[7], vector=(-np.array(rows[7]["vector"])).tolist(), content="moved")])
+    index.upsert(make_rows(2, seed=1, prefix="new"))
+    assert index.live == 52
+    assert "moved" not in [doc["content"] for doc in index.search(query, top_k=3)]
+
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path), hnsw_threshold=10**6)
+    assert isinstance(loaded._base, np.memmap)
+    assert loaded.live == 52
+    assert loaded.search(query, top_k=3) == index.search(query, top_k=3)
+    assert VectorIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_save_keeps_the_previous_generation(tmp_path):
+    rows = make_rows(20)
+    index = VectorIndex.build(rows, hnsw_threshold=10**6)
+    first = index.save(str(tmp_path))
+    second = index.save(str(tmp_path))
+    # A worker that mapped the second generation and has not reloaded yet
+    mapped = VectorIndex.load(str(tmp_path), hnsw_threshold=10**6)
+
+    index.upsert(make_rows(1, seed=1, prefix="new"))
+    third = index.save(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(second), os.path.basename(third), "CURRENT"])
+    assert not os.path.exists(first)
+    assert mapped.search(rows[3]["vector"], top_k=1)[0]["content"] == rows[3]["content"]
+    assert VectorIndex.load(str(tmp_path), hnsw_threshold=10**6).live == 21
+
+
+def test_hnsw_matches_exact_search(tmp_path):
+    pytest.importorskip("hnswlib")
+    rows = make_rows(500)
+    index = VectorIndex.build(rows, hnsw_threshold=100)
+    assert index.backend == "hnsw"
+
+    query = np.random.default_rng(3).normal(size=16)
+    assert [doc["content"] for doc in index.search(query, top_k=5)] == exact_top(rows, query, 5)
+
+    index.upsert([dict(rows[0], vector=query.tolist())])
+    assert index.search(query, top_k=1)[0]["content"] == "text 0"
+
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path), hnsw_threshold=100)
+    assert loaded.backend == "hnsw"
+    assert loaded.search(query, top_k=5) == index.search(query, top_k=5)
+
+
+def test_mirror_builds_once_and_applies_events(tmp_path):
+    stored = make_rows(20)
+    fetch_all_calls = []
+
+    async def fetch_all():
+        fetch_all_calls.append(1)
+        for row in stored:
+            yield row
+
+    async def fetch_chunks(ids=None, doc_id=None, part=None):
+        return [row for row in stored if row["id"] in ids] if ids else [row for row in stored if row["doc_id"] == doc_id]
+
+    async def count():
+        return len(stored)
+
+    async def scenario():
+        mirror = VectorIndexMirror(fetch_all, fetch_chunks, count, path=str(tmp_path), enabled=True)
+        await mirror.sync()
+        stored.extend(make_rows(3, seed=2, prefix="late"))
+        await mirror.apply({"type": "chunks_stored", "doc_id": "doc", "part": 0, "ids": ["late-0", "late-1", "late-2"]})
+
+        # A second worker maps the snapshot instead of fetching everything again
+        other = VectorIndexMirror(fetch_all, fetch_chunks, lambda: asyncio.sleep(0, 20), path=str(tmp_path), enabled=True)
+        await other.sync()
+        return mirror, other
+
+    mirror, other = asyncio.run(scenario())
+
+    assert len(fetch_all_calls) == 1
+    assert mirror.index.live == 23
+    assert mirror.stats()["applied"] == 3
+    assert other.index.live == 20
+    assert mirror.search(stored[-1]["vector"], top_k=1)[0]["content"] == stored[-1]["content"]
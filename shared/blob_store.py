@@ -0,0 +1,113 @@
+# shared/blob_store.py (used by text-parser-service and ingestion-service)
+
+import os
+import uuid
+from urllib.parse import urlparse
+from loguru import logger
+
+# Where claim-checked payloads are written: file:///blobs or s3://bucket/prefix
+BLOB_STORE_URL = os.getenv("BLOB_STORE_URL", "file:///blobs")
+# S3-compatible endpoint, e.g. http://minio:9000 for a local stand-in (unset means AWS)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+
+
+'''
+LocalBlobStore: blobs as files under a directory shared by producer and consumer (a volume)
+S3BlobStore: blobs as objects in an S3-compatible bucket
+put: stores bytes under key and returns a reference (URI) to publish instead of the payload
+open: returns a binary file-like object to stream the blob back
+delete: removes the blob once the consumer is done with it
+'''
+class LocalBlobStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, ref: str) -> str:
+        path = os.path.realpath(urlparse(ref).path)
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Blob reference outside of store root: {ref}")
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a consumer never sees a partial blob; concurrent writers get their own temp file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return f"file://{path}"
+
+    def open(self, ref: str):
+        return open(self._path(ref), "rb")
+
+    def delete(self, ref: str):
+        try:
+            os.remove(self._path(ref))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = S3_ENDPOINT_URL):
+        import boto3  # only needed when the S3 backend is configured
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, ref: str) -> str:
+        parsed = urlparse(ref)
+        key = parsed.path.lstrip("/")
+        if parsed.netloc != self.bucket or (self.prefix and not key.startswith(self.prefix + "/")):
+            raise ValueError(f"Blob reference outside of store bucket/prefix: {ref}")
+        return key
+
+    def put(self, key: str, data: bytes) -> str:
+        key = f"{self.prefix}/{key}" if self.prefix else key
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+        except self.client.exceptions.NoSuchBucket:
+            # Fresh local stand-ins (e.g. MinIO) start without buckets
+            self.client.create_bucket(Bucket=self.bucket)
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+        return f"s3://{self.bucket}/{key}"
+
+    def open(self, ref: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(ref))["Body"]
+
+    def delete(self, ref: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(ref))
+
+
+def _create_store(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return LocalBlobStore(parsed.path)
+    if parsed.scheme == "s3":
+        return S3BlobStore(parsed.netloc, parsed.path)
+    raise ValueError(f"Unsupported blob store: {url}")
+
+
+_store = None
+
+
+def get_blob_store():
+    global _store
+    if _store is None:
+        _store = _create_store(BLOB_STORE_URL)
+        logger.info(f"Blob store ready: {BLOB_STORE_URL}")
+    return _store
+
+
+def blob_store_for(ref: str):
+    # References are only read from the configured store: under the local root (a shared volume)
+    # or in the configured bucket, never from a location named by the message alone
+    parsed = urlparse(ref)
+    store = get_blob_store()
+    if parsed.scheme == "file" and isinstance(store, LocalBlobStore):
+        return store
+    if parsed.scheme == "s3" and isinstance(store, S3BlobStore) and parsed.netloc == store.bucket:
+        return store
+    raise ValueError(f"Blob reference outside of the configured store {BLOB_STORE_URL}: {ref}")
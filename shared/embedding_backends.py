@@ -0,0 +1,151 @@
+# shared/embedding_backends.py (used by rag-service for queries and ingestion-service for chunks)
+
+import inspect
+import os
+import tempfile
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+# torch: HuggingFaceEmbeddings (eager PyTorch), onnx: ONNX Runtime fp32, onnx-int8: dynamically quantized weights
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Exported models are written here once and reused on later starts
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/data/onnx")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", 0))  # 0 lets ONNX Runtime use every core
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", 384))  # all-mpnet-base-v2 max_seq_length
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+# Settings that change the vectors: query (rag-service) and chunk (ingestion-service) embeddings must agree on them
+VECTOR_SETTINGS = ("EMBEDDING_MODEL", "EMBEDDING_BACKEND", "EMBEDDING_MAX_SEQ_LENGTH")
+
+
+def _temp_path(target_dir: str, suffix: str) -> str:
+    # Unique per writer: replicas sharing the model volume may export the same model at once, the last
+    # os.replace wins and each one swaps in a complete file
+    fd, path = tempfile.mkstemp(dir=target_dir, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def export_onnx(model_name: str, tokenizer, target_dir: str, quantize: bool) -> str:
+    # Exports the transformer once (fp32), the int8 variant is derived from it with dynamic quantization
+    os.makedirs(target_dir, exist_ok=True)
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    int8_path = os.path.join(target_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel
+
+        logger.info(f"Exporting {model_name} to ONNX at {fp32_path}")
+        model = AutoModel.from_pretrained(model_name)
+        model.config.return_dict = False
+        model.eval()
+
+        dummy = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        # Newer torch defaults to the dynamo exporter, keep the TorchScript one for a stable graph
+        legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+        tmp_path = _temp_path(target_dir, ".onnx.tmp")
+        try:
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    tuple(dummy[name] for name in input_names),
+                    tmp_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=17,
+                    **legacy,
+                )
+            os.replace(tmp_path, fp32_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {fp32_path} to int8 at {int8_path}")
+        tmp_path = _temp_path(target_dir, ".int8.onnx.tmp")
+        try:
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return int8_path
+
+
+'''
+OnnxEmbeddings: sentence-transformers style embeddings served by ONNX Runtime
+Runs the exported transformer, then mean pooling over the attention mask and L2 normalization,
+matching the Transformer -> Pooling(mean) -> Normalize pipeline of all-mpnet-base-v2.
+'''
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model_name: str = EMBEDDING_MODEL, quantize: bool = False, model_dir: str = ONNX_MODEL_DIR,
+                 max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH, batch_size: int = EMBEDDING_BATCH_SIZE):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_seq_length = max_seq_length
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        target_dir = os.path.join(model_dir, model_name.strip("/").replace("/", "__"))
+        path = export_onnx(model_name, self.tokenizer, target_dir, quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        logger.info(f"ONNX Runtime embeddings ready: {path}")
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        hidden = self.session.run(None, {name: encoded[name].astype(np.int64) for name in self.input_names})[0]
+
+        mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        # Sorting by length keeps padding low inside each batch
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors.extend(zip(batch, self._embed([texts[i] for i in batch]).tolist()))
+        return [vector for _, vector in sorted(vectors, key=lambda item: item[0])]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text])[0].tolist()
+
+
+def load_embeddings(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL,
+                    max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH) -> Embeddings:
+    # Every backend truncates at max_seq_length, it is one of the VECTOR_SETTINGS both services share
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        embeddings = HuggingFaceEmbeddings(model_name=model_name)
+        # The SentenceTransformer behind it (a private attribute in newer langchain-huggingface releases)
+        model = getattr(embeddings, "_client", None) or getattr(embeddings, "client")
+        model.max_seq_length = max_seq_length
+        return embeddings
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(model_name, quantize=backend == "onnx-int8", max_seq_length=max_seq_length)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
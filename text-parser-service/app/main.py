@@ -4,46 +4,148 @@ from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 import pdfplumber
 from loguru import logger
 from datetime import datetime
-# import os
+import os
+import asyncio
+import gzip
+import hashlib
 import io
+import uuid
 
+from shared.blob_store import get_blob_store
 from .publisher import AsyncRabbitMQPublisher, MessageModel
+from .registry import ParsedTextCache
 
 app = FastAPI()
 
 publisher = AsyncRabbitMQPublisher()
 
+# Pages already extracted from the same bytes (db-service registry), skips pdfplumber on a re-index
+text_cache = ParsedTextCache()
+
+# Claim check: large texts go to the blob store and only a reference is published to rag_queue
+CLAIM_CHECK_ENABLED = os.getenv("CLAIM_CHECK_ENABLED", "false").lower() == "true"
+CLAIM_CHECK_THRESHOLD_BYTES = int(os.getenv("CLAIM_CHECK_THRESHOLD_BYTES", 256 * 1024))
+
+
+# Pages per fan-out message, so ingestion replicas can embed parts of one document in parallel
+PAGES_PER_PART = int(os.getenv("PAGES_PER_PART", 20))
+
+
+def split_into_parts(pages: list[str], pages_per_part: int = PAGES_PER_PART) -> list[tuple[int, int, str]]:
+    # (first_page, last_page, text) with 1-based page numbers, parts without text are skipped
+    parts = []
+    for start in range(0, len(pages), pages_per_part):
+        group = pages[start:start + pages_per_part]
+        text = "\n".join(group)
+        if text.strip():
+            parts.append((start + 1, start + len(group), text))
+    return parts
+
+
+def parse_page_ranges(value: str | None) -> set[int] | None:
+    # "1-3,7" -> {1, 2, 3, 7} (1-based), None selects every page
+    if not value:
+        return None
+    pages = set()
+    for item in value.split(","):
+        first, _, last = item.strip().partition("-")
+        first, last = int(first), int(last or first)
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range {item!r}")
+        pages.update(range(first, last + 1))
+    return pages
+
+
+def claim_check_key(doc_id: str, part: int) -> str:
+    # Unique per message: concurrent uploads of the same bytes must not share (and delete) each other's blob
+    return f"{doc_id}/{part}-{uuid.uuid4().hex}.txt.gz"
+
+
+def store_claim_check(key: str, text: str) -> str:
+    return get_blob_store().put(key, gzip.compress(text.encode("utf-8"), compresslevel=6))
+
 @app.post("/parse")
 async def parse(
     file: UploadFile = File(...), 
-    user_id: str = Query("anonymous", description="ID of the user uploading the file")
+    user_id: str = Query("anonymous", description="ID of the user uploading the file"),
+    job_id: str = Query(None, description="Ingestion job (api-service /jobs) to report progress to"),
+    file_index: int = Query(None, description="Index of the file in its job's upload, identifies it in the progress"),
+    pages: str = Query(None, description="Page ranges to extract, e.g. 1-3,7 (api-service sends scanned pages to OCR)"),
+    leg: str = Query(None, description="Leg of a document split between services, its parts are counted apart"),
     ):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
+    try:
+        selected = parse_page_ranges(pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     contents = await file.read()
+    doc_id = hashlib.sha256(contents).hexdigest()
 
-    try:
-        with pdfplumber.open(io.BytesIO(contents)) as pdf:
-            full_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse PDF: {e}")
+    # Pages outside the selection stay empty, so part page numbers remain those of the whole document
+    texts = await text_cache.get(doc_id)
+    if texts is None:
+        try:
+            with pdfplumber.open(io.BytesIO(contents)) as pdf:
+                texts = [
+                    (page.extract_text() or "") if selected is None or page.page_number in selected else ""
+                    for page in pdf.pages
+                ]
 
-    if not full_text.strip():
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to parse PDF: {e}")
+
+        # Only complete extractions are cached
+        if selected is None:
+            await text_cache.put(doc_id, texts)
+    else:
+        logger.info(f"Using cached text of {file.filename} ({len(texts)} pages)")
+        if selected is not None:
+            texts = [text if number in selected else "" for number, text in enumerate(texts, start=1)]
+
+    parts = split_into_parts(texts)
+    if not parts:
         raise HTTPException(status_code=400, detail="No text extracted from PDF.")
 
-    # Define the message payload
-    message = MessageModel(
-        text=full_text,
-        source=file.filename,
-        # user_id=user_id,
-        # timestamp=datetime.utcnow().isoformat()
-    )
+    # One message per page range, all carrying the document id and the part count
+    messages = []
+    for part, (page_start, page_end, text) in enumerate(parts):
+        message = MessageModel(
+            text=text,
+            source=file.filename,
+            doc_id=doc_id,
+            part=part,
+            total_parts=len(parts),
+            page_start=page_start,
+            page_end=page_end,
+            job_id=job_id,
+            file_index=file_index,
+            leg=leg,
+            # user_id=user_id,
+            # timestamp=datetime.utcnow().isoformat()
+        )
+
+        if CLAIM_CHECK_ENABLED and len(text.encode("utf-8")) > CLAIM_CHECK_THRESHOLD_BYTES:
+            try:
+                message.blob_ref = await asyncio.to_thread(store_claim_check, claim_check_key(doc_id, part), text)
+                message.text = None
+            except Exception as e:
+                # Fall back to the inline payload rather than failing the upload
+                logger.error(f"Failed to store claim check for {file.filename} part {part}, publishing inline: {e}")
+
+        messages.append(message)
 
     try:
-        await publisher.publish(message)
-        logger.info(f"Published parsed text from {file.filename} for user {user_id}")
+        for message in messages:
+            await publisher.publish(message)
+        logger.info(f"Published parsed text from {file.filename} in {len(messages)} parts for user {user_id}")
+        if job_id:
+            await publisher.publish_progress(
+                {"job_id": job_id, "file": file.filename, "file_index": file_index, "stage": "parsed", "doc_id": doc_id,
+                 "leg": leg, "total_parts": len(messages)}
+            )
     
     except Exception as e:
         logger.error(f"Failed to publish message: {e}")
@@ -51,15 +153,14 @@ async def parse(
 
     result = {
     "filename": file.filename,
+    "doc_id": doc_id,
+    "parts": len(messages),
     "status": "Text parsed and published successfully"
     }
     
     logger.info(f"Returning response: {result}")
 
-    return {
-        "filename": file.filename,
-        "status": "Text parsed and published successfully"
-    }
+    return result
     
 
 @app.get("/")
@@ -1,13 +1,27 @@
 #text-parser-service/publisher.py
 
 import aio_pika                      # Async RabbitMQ client
+import json
+from typing import Optional
 from pydantic import BaseModel       # For message schema
 from loguru import logger            # For logging
 import os                            # For env variables
 
+# Topic exchange for ingestion job progress, routing key job.<job_id>.<stage>
+INGESTION_PROGRESS_EXCHANGE = "ingestion_progress"
+
 class MessageModel(BaseModel):
-    text: str
+    text: Optional[str] = None      # extracted text, unset when the text travels by claim check
     source: str            # filename or document source
+    doc_id: Optional[str] = None  # sha256 of the uploaded file, stable across re-uploads
+    blob_ref: Optional[str] = None  # reference to the gzip-compressed text in the blob store
+    part: int = 0                   # sequence number of this page range within the document
+    total_parts: int = 1            # number of parts published for the document
+    page_start: Optional[int] = None  # first page (1-based) covered by this part
+    page_end: Optional[int] = None    # last page (1-based) covered by this part
+    job_id: Optional[str] = None      # api-service ingestion job the document belongs to
+    file_index: Optional[int] = None  # position of the file in that job's upload
+    leg: Optional[str] = None         # "text" when the document's scanned pages went to OCR separately
     # user_id: Optional[str] = "anonymous"  # optional user ID
     # timestamp: Optional[str] = None        # ISO timestamp
 
@@ -15,11 +29,15 @@ class AsyncRabbitMQPublisher:
     def __init__(self):
         self.connection = None
         self.channel = None
+        self.progress_exchange = None
         self.rabbitmq_url = os.getenv("RABBITMQ_URL")
 
     async def connect(self):
         self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
         self.channel = await self.connection.channel()
+        self.progress_exchange = await self.channel.declare_exchange(
+            INGESTION_PROGRESS_EXCHANGE, aio_pika.ExchangeType.TOPIC, durable=True
+        )
         logger.success("Connected to RabbitMQ")
 
     async def publish(self, message: MessageModel):
@@ -32,10 +50,23 @@ class AsyncRabbitMQPublisher:
             ),
             routing_key="rag_queue"
         )
-        logger.info(f"Published message: {message.json()}")
+        logger.info(f"Published part {message.part + 1}/{message.total_parts} of {message.source} ({'blob ' + message.blob_ref if message.blob_ref else f'{len(message.text)} chars'})")
+
+    async def publish_progress(self, event: dict):
+        # Best effort: progress is informational, it must not fail the parse
+        try:
+            if not self.connection:
+                await self.connect()
+            await self.progress_exchange.publish(
+                aio_pika.Message(body=json.dumps(event).encode()),
+                routing_key=f"job.{event['job_id']}.{event['stage']}",
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish progress for job {event['job_id']}: {e}")
 
     async def close(self):
         if self.connection:
             await self.connection.close()
             self.connection = None
             self.channel = None
+            self.progress_exchange = None
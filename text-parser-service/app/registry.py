@@ -0,0 +1,54 @@
+# text-parser-service/registry.py
+
+import os
+import httpx
+from loguru import logger
+
+# db-service document registry, unset disables the parsed-text cache
+DB_SERVICE_URL = os.getenv("DB_SERVICE_URL")
+REGISTRY_TIMEOUT = float(os.getenv("REGISTRY_TIMEOUT", 5))
+
+
+'''
+ParsedTextCache: pages extracted from a PDF, kept in the db-service registry under the file's sha256
+get: cached pages, None when unknown (or the registry is unset / unreachable)
+put: stores the pages after an extraction, so a forced re-index of the same bytes skips pdfplumber
+Both are best effort: a cache failure never fails a parse.
+'''
+class ParsedTextCache:
+    def __init__(self, base_url: str = DB_SERVICE_URL, timeout: float = REGISTRY_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.client = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        return self.client
+
+    async def get(self, sha256: str) -> list[str] | None:
+        if not self.base_url:
+            return None
+        try:
+            response = await self._client().get(f"/documents/{sha256}/text")
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()["pages"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.error(f"Parsed text cache lookup failed for {sha256}: {e}")
+            return None
+
+    async def put(self, sha256: str, pages: list[str]):
+        if not self.base_url:
+            return
+        try:
+            response = await self._client().put(f"/documents/{sha256}/text", json={"pages": pages})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to cache parsed text for {sha256}: {e}")
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules shared between services live in <repo>/shared (PYTHONPATH=/opt/documind in the images)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
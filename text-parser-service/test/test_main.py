@@ -0,0 +1,17 @@
+import pytest
+
+from app.main import parse_page_ranges, split_into_parts
+
+
+def test_split_into_parts_groups_pages_and_skips_empty_ranges():
+    pages = ["one", "two", "", "", "five"]
+
+    assert split_into_parts(pages, pages_per_part=2) == [(1, 2, "one\ntwo"), (5, 5, "five")]
+
+
+def test_parse_page_ranges():
+    assert parse_page_ranges(None) is None
+    assert parse_page_ranges("1-3,7, 9-9") == {1, 2, 3, 7, 9}
+    for invalid in ("0-2", "5-3", "a"):
+        with pytest.raises(ValueError):
+            parse_page_ranges(invalid)